@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""
+Benchmark the Jira key detection of `jira_keys.py`.
+
+Runs the per-text API and the batch API of `JiraKeyMatcher` over a corpus
+of pull request titles and commit messages and compares them to the
+per-call regular expressions used before.
+"""
+
+import argparse
+import re
+import sys
+import timeit
+
+from jira_keys import JiraKeyMatcher
+from utils import format_help_as_md
+
+# pull request titles and commit messages as they appear in our repositories
+CORPUS = [
+    "HMS-5279: add support for the new image type",
+    "osbuild-composer: bump the images library (COMPOSER-2345)",
+    "distro/rhel10: enable FIPS for the edge installer (RHEL-56714)",
+    "cloudapi: allow setting the partitioning mode (HMS-8123)",
+    "Revert \"test: update the schutzfile to the latest RHEL-9.6 nightly\"",
+    "Update dependency golang.org/x/crypto to v0.31.0",
+    "build(deps): bump github.com/aws/aws-sdk-go from 1.55.5 to 1.55.6",
+    "tests: use the SHA-256 checksum for the downloaded images",
+    "worker: encode job results as UTF-8 before uploading",
+    "manifest: add rhel-9.4 and rhel-9.5 to the list of known distros",
+    "HMS-4912 blueprint: validate the kernel customizations",
+    "README: link to the /jira-epic documentation",
+    "pkg/osbuild: add the org.osbuild.ostree.deploy.container stage\n\n"
+    "This adds the new stage needed by the bootc installer.\n\nJIRA: HMS-7001",
+    "Add the new image type for Azure\n\nFixes: COMPOSER-2210\nRelates-to: RHEL-12345",
+    "schutzbot: terraform sha update\n\nSigned-off-by: schutzbot <schutzbot@gmail.com>",
+    "cmd/image-builder: add --output-dir option (HMS-6011)\n\n"
+    "The option allows to set where the generated artifacts end up.\n"
+    "See also HMS-6010 and HMS-6012 for the follow-ups.",
+    "ci: run the unit tests on Fedora 41 and CentOS Stream 10",
+    "internal/remotefile: retry downloads on HTTP 503 (HMS-3999)",
+    "disk: fix the partition table for aarch64 images with LVM",
+    "images: drop support for RHEL-8.6 as it reached EUS end of life",
+]
+
+
+def legacy_find_all(texts):
+    jira_pattern = re.compile(r"\b[A-Z]+-\d+\b")
+    return [re.findall(jira_pattern, text) for text in texts]
+
+
+def matcher_find_all(texts):
+    matcher = JiraKeyMatcher()
+    return [matcher.find_all(text) for text in texts]
+
+
+def matcher_scan(texts):
+    return JiraKeyMatcher().scan(texts)
+
+
+def matcher_scan_allow_list(texts):
+    return JiraKeyMatcher(["HMS", "COMPOSER"]).scan(texts)
+
+
+def main():
+    """Benchmark the Jira key detection over a corpus of titles and commit messages"""
+    parser = argparse.ArgumentParser(allow_abbrev=False, description=__doc__)
+    parser.add_argument("--scale", type=int, default=500,
+                        help="Repeat the corpus this many times (default: 500)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of timing runs, the best is reported (default: 5)")
+    parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
+
+    if "--help-md" in sys.argv:
+        print(format_help_as_md(parser))
+        sys.exit(0)
+
+    args = parser.parse_args()
+
+    texts = CORPUS * args.scale
+    print(f"Corpus: {len(texts)} texts, {sum(len(t) for t in texts)} characters")
+
+    for name, function in [
+        ("legacy re.findall per text", legacy_find_all),
+        ("JiraKeyMatcher.find_all per text", matcher_find_all),
+        ("JiraKeyMatcher.scan (batch)", matcher_scan),
+        ("JiraKeyMatcher.scan (batch, allow-list)", matcher_scan_allow_list),
+    ]:
+        best = min(timeit.repeat(lambda: function(texts), number=1, repeat=args.repeat))
+        found = sum(len(keys) for keys in function(texts))
+        print(f"{name:45} {best * 1000:8.2f} ms  {found:6} keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Circuit breakers for the endpoints of the GitHub and Jira APIs.
+
+Every endpoint (e.g. `jira GET /rest/api/2/search`) has its own breaker:
+after `CIRCUIT_FAILURE_THRESHOLD` (default: 5) consecutive failures
+(connection errors, timeouts, 429 and 5xx responses) it opens and requests
+fail right away with `CircuitOpenError` instead of retrying and backing off.
+After `CIRCUIT_RESET_SECONDS` (default: 30) one probe request is let through
+(half open), its success closes the breaker, its failure opens it again.
+
+The breakers are kept per process, so a warm AWS Lambda container remembers
+a bad period between invocations.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+from metrics import endpoint_name
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_outage(status):
+    """
+    Return whether a response with `status` (None: no response at all) counts as a failure of the endpoint
+    """
+    return status is None or status == 429 or status >= 500
+
+
+def _status_of(error):
+    """
+    Return the status of the response an exception was raised for, None if there was none
+    """
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "status_code", None)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """
+        Return whether requests currently fail fast, e.g. to use cached data right away
+        """
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def before_request(self):
+        """
+        Raise `CircuitOpenError` unless a request may be sent, in the half open state only one probe may
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                remaining = self.opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(f"{self.name} failed {self.failures} times, "
+                                           f"not trying again for {remaining:.0f}s")
+                self.state = HALF_OPEN
+                self._probing = False
+            if self._probing:
+                raise CircuitOpenError(f"{self.name} is being probed")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit of {self.name} closed again")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit of {self.name} opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def record(self, status):
+        """
+        Record the outcome of a request by the status of its response, see `is_outage`
+        """
+        if is_outage(status):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    @contextmanager
+    def guard(self):
+        """
+        Run a request within the `with` block, its exception decides whether it failed
+        """
+        self.before_request()
+        try:
+            yield
+        except Exception as e:
+            self.record(_status_of(e))
+            raise
+        self.record_success()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get(name):
+    """
+    Return the breaker of the endpoint `name`, the same one for the whole process
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def reset():
+    """
+    Forget all breakers, e.g. between tests
+    """
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def endpoint(service, method, url):
+    """
+    Return the name of the endpoint of a request, the same as in `metrics` prefixed by `service`
+    """
+    return f"{service} {endpoint_name(method, url)}"
+
+
+def wrap(request, service):
+    """
+    Return `request` (e.g. `session.request`) guarded by the breakers of the endpoints of `service`
+    """
+    @functools.wraps(request)
+    def wrapped(method, url, *args, **kwargs):
+        breaker = get(endpoint(service, method, url))
+        breaker.before_request()
+        try:
+            response = request(method, url, *args, **kwargs)
+        except Exception as e:
+            breaker.record(_status_of(e))
+            raise
+        # sessions return error responses without raising
+        breaker.record(response.status_code)
+        return response
+    return wrapped
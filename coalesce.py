@@ -0,0 +1,94 @@
+"""
+Coalescing of duplicate slash commands.
+
+When the same command (e.g. `/pr2jira` for the same GitHub and Jira user)
+is sent again while it is still being processed, it attaches to the
+running job instead of starting another one. The worker answers all
+attached `response_url`s when it's done.
+
+Jobs are kept in the state store, a job older than
+`COALESCE_WINDOW_SECONDS` (default: 300) is considered lost (e.g. the worker
+crashed) and doesn't get new requests attached.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from state_store import open_store
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW_SECONDS = int(os.getenv("COALESCE_WINDOW_SECONDS", "300"))
+
+
+def job_id(*parts):
+    """
+    Return the ID of the job for a command and its arguments
+    """
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class RequestCoalescer:
+    def __init__(self, store, window=None, prefix="coalesce"):
+        """
+        `store` is a store of `state_store.py`
+        """
+        self.store = store
+        self.window = COALESCE_WINDOW_SECONDS if window is None else window
+        self.prefix = prefix
+
+    def _job_key(self, job):
+        return f"{self.prefix}/{job}/job"
+
+    def _waiters_prefix(self, job):
+        return f"{self.prefix}/{job}/waiters/"
+
+    def claim(self, job, response_url):
+        """
+        Return True if the caller has to run `job` or False if the request
+        was attached to the same job which is already running.
+        """
+        job_key = self._job_key(job)
+        for _ in range(2):
+            if self.store.put_json_if_absent(job_key, {"started_at": time.time()}):
+                return True
+
+            running = self.store.get_json(job_key)
+            if running is None or time.time() - running["started_at"] > self.window:
+                # finished in the meantime or lost
+                self.store.delete(job_key)
+                continue
+
+            waiter_key = self._waiters_prefix(job) + uuid.uuid4().hex
+            self.store.put_json(waiter_key, {"response_url": response_url})
+            # the job could have finished before seeing the waiter
+            if self.store.get_json(job_key) is not None:
+                logger.info(f"Attached to the running job {job}")
+                return False
+            self.store.delete(waiter_key)
+        return True
+
+    def finish(self, job):
+        """
+        Mark `job` as done and return the `response_url`s of the attached requests
+        """
+        self.store.delete(self._job_key(job))
+        response_urls = []
+        for waiter_key in self.store.list_keys(self._waiters_prefix(job)):
+            waiter = self.store.get_json(waiter_key)
+            if waiter:
+                response_urls.append(waiter["response_url"])
+            self.store.delete(waiter_key)
+        return response_urls
+
+
+def open_coalescer():
+    """
+    Return a `RequestCoalescer` if a state store is configured or None
+    """
+    store = open_store()
+    return RequestCoalescer(store) if store is not None else None
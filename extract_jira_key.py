@@ -1,14 +1,13 @@
 import sys
-import re
+
+from jira_keys import JIRA_EPIC_COMMAND_RE
 
 def extract_jira_issue_key(text):
     """
     Extracts a Jira issue key from the input text following the /jira-epic pattern.
     """
-    # regular expression to match the /jira-epic command and extract the issuekey
-    pattern = r"/jira-epic (\b[A-Z]+-\d+\b)"
-    # Search for the pattern in the text
-    match = re.search(pattern, text, re.IGNORECASE)
+    # Search for the /jira-epic command and extract the issuekey
+    match = JIRA_EPIC_COMMAND_RE.search(text)
     # Return the captured group if a match is found
     return match.group(1).upper() if match else None
 
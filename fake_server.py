@@ -0,0 +1,473 @@
+#!/usr/bin/python3
+
+"""
+Local stand-in for the GitHub and Jira REST APIs with synthetic data.
+
+Covers the endpoints used by `DataProcessor` and `JiraDataProcessor`
+(GitHub search, pulls, commits and repositories, Jira server info, search
+and agile board configuration). Every request is counted per endpoint,
+latency and rate limiting (429) can be injected.
+
+It can be started standalone for manual tests, e.g. with
+`GITHUB_API_URL=http://localhost:8080 JIRA_HOST=http://localhost:8080`
+set for the scripts, or used from python via `FakeServer`.
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from utils import format_help_as_md
+
+FAKE_ORG = "osbuild"
+FAKE_PROJECT = "HMS"
+FAKE_USERS = ["schuellerf", "ondrejbudai", "bcl", "ochosi", "achilleas-k", "thozza"]
+FAKE_BOARD_ID = "1"
+FAKE_BACKLOG_FILTER_ID = "4711"
+FAKE_TIMESTAMP = "2026-01-01T00:00:00Z"
+
+# the board columns and their statuses
+FAKE_COLUMNS = [
+    ("To Do", [("1", "New"), ("2", "To Do")]),
+    ("In Progress", [("3", "In Progress")]),
+    ("Review", [("4", "Review")]),
+    ("Done", [("5", "Closed")]),
+]
+
+FAKE_SPRINT = ("com.atlassian.greenhopper.service.sprint.Sprint@1[id=100,rapidViewId=1,state=ACTIVE,"
+               "name=Sprint 100,startDate=2026-01-01T00:00:00.000Z,endDate=2026-01-15T00:00:00.000Z,"
+               "completeDate=<null>,activatedDate=2026-01-01T00:00:00.000Z,sequence=100,goal=,"
+               "synced=false,autoStartStop=false,incompleteIssuesDestinationId=<null>]")
+
+
+class FakeData:
+    """
+    Deterministic synthetic pull requests and Jira issues.
+
+    A pull request is created every 6 hours before `FAKE_TIMESTAMP`.
+    Every second pull request references a Jira issue in its title,
+    the first half of those issues is in the active sprint,
+    the rest is in the backlog. With `epics` the issues belong to that many
+    epics in turns, linked as parent or with the "Epic Link" field.
+    """
+
+    def __init__(self, pull_requests=100, repos=10, commits_per_pull_request=3, description_size=2000,
+                 archived_repos=0, epics=0):
+        self.repos = [f"repo-{i}" for i in range(repos)]
+        self.archived_repos = set(self.repos[repos - archived_repos:]) if archived_repos else set()
+        self.pull_requests = []
+        self.issues = {}
+
+        with_jira = range(0, pull_requests, 2)
+        sprint_limit = len(with_jira) // 2
+        for number in range(1, pull_requests + 1):
+            author = FAKE_USERS[(number // 2) % len(FAKE_USERS)]
+            repo = self.repos[number % repos]
+            title = f"component: change number {number}"
+            if (number - 1) % 2 == 0:
+                key = f"{FAKE_PROJECT}-{number}"
+                title = f"{key}: change number {number}"
+                in_sprint = len(self.issues) < sprint_limit
+                status_id = str(1 + number % 4) if in_sprint else "2"
+                self.issues[key] = {
+                    "key": key,
+                    "summary": f"Issue for change number {number}",
+                    "assignee": author,
+                    "status_id": status_id,
+                    "in_sprint": in_sprint,
+                    "updated": 0,
+                }
+                if epics:
+                    self.issues[key]["epic"] = f"{FAKE_PROJECT}-{pull_requests + 1 + len(self.issues) % epics}"
+            self.pull_requests.append({
+                "number": number,
+                "repo": repo,
+                "title": title,
+                "author": author,
+                "created_at": (datetime.strptime(FAKE_TIMESTAMP, "%Y-%m-%dT%H:%M:%SZ")
+                               - timedelta(hours=6 * number)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "body": ("Description of the change. " * (description_size // 27 + 1))[:description_size],
+                "commits": [f"commit {c} of change {number}" for c in range(commits_per_pull_request)],
+            })
+
+        for number in range(pull_requests + 1, pull_requests + 1 + epics):
+            key = f"{FAKE_PROJECT}-{number}"
+            self.issues[key] = {"key": key, "summary": f"Epic number {number}", "assignee": FAKE_USERS[0],
+                                "status_id": "2", "in_sprint": False, "updated": 0, "issue_type": "Epic"}
+
+    def update_issue(self, key, **changes):
+        """
+        Change (or create) an issue like a Jira user would, updating its `updated` time
+        """
+        issue = self.issues.setdefault(key, {"key": key, "summary": f"Issue {key}", "assignee": FAKE_USERS[0],
+                                             "status_id": "2", "in_sprint": False})
+        issue.update(changes, updated=time.time())
+        return issue
+
+    def status(self, status_id):
+        for _, statuses in FAKE_COLUMNS:
+            for sid, name in statuses:
+                if sid == status_id:
+                    return {"id": sid, "name": name}
+        return None
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are sent separately, without this every keep-alive request waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    # (regex, endpoint name, handler method name)
+    ROUTES = [
+        (r"/search/issues", "GET /search/issues", "_github_search"),
+        (r"/orgs/(?P<org>[^/]+)/repos", "GET /orgs/{org}/repos", "_github_repos"),
+        (r"/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<number>\d+)/commits",
+         "GET /repos/{owner}/{repo}/pulls/{number}/commits", "_github_commits"),
+        (r"/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<number>\d+)",
+         "GET /repos/{owner}/{repo}/pulls/{number}", "_github_pull_request"),
+        (r"/rest/api/2/serverInfo", "GET /rest/api/2/serverInfo", "_jira_server_info"),
+        (r"/rest/api/2/field", "GET /rest/api/2/field", "_jira_fields"),
+        (r"/rest/api/2/myself", "GET /rest/api/2/myself", "_jira_myself"),
+        (r"/rest/api/2/search", "GET /rest/api/2/search", "_jira_search"),
+        (r"/rest/agile/1.0/board/(?P<board_id>[^/]+)/configuration",
+         "GET /rest/agile/1.0/board/{board_id}/configuration", "_jira_board_configuration"),
+        (r"/browse/(?P<key>[^/]+)", "HEAD /browse/{key}", "_jira_browse"),
+    ]
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        try:
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up waiting, e.g. at its deadline
+            pass
+
+    def _handle(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for pattern, endpoint, method in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if match:
+                break
+        else:
+            self.server.fake.count(f"{self.command} {url.path}")
+            self._send_json({"message": "Not Found"}, 404)
+            return
+
+        fake = self.server.fake
+        request_number = fake.count(endpoint)
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fake.rate_limit_every and request_number % fake.rate_limit_every == 0:
+            fake.count("429")
+            self._send_json({"message": "API rate limit exceeded"}, 429,
+                            {"Retry-After": str(fake.retry_after)})
+            return
+        if fake.fail_every and request_number % fake.fail_every == 1 % fake.fail_every:
+            fake.count("503")
+            self._send_json({"message": "Service Unavailable"}, 503)
+            return
+
+        data = getattr(self, method)(query, **match.groupdict())
+        if isinstance(data, tuple):
+            self._send_json(*data)
+        else:
+            self._send_json(data)
+
+    do_GET = _handle
+    do_HEAD = _handle
+
+    # GitHub
+
+    def _base_url(self):
+        return f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+    def _github_user(self, login):
+        return {"login": login, "id": FAKE_USERS.index(login) + 1, "type": "User"}
+
+    def _github_search_item(self, pull_request):
+        base = self._base_url()
+        return {
+            "number": pull_request["number"],
+            "title": pull_request["title"],
+            "html_url": f"https://github.com/{FAKE_ORG}/{pull_request['repo']}/pull/{pull_request['number']}",
+            "repository_url": f"{base}/repos/{FAKE_ORG}/{pull_request['repo']}",
+            "user": self._github_user(pull_request["author"]),
+            "state": "open",
+            "created_at": pull_request["created_at"],
+            "updated_at": FAKE_TIMESTAMP,
+            "body": pull_request["body"],
+            "pull_request": {"url": f"{base}/repos/{FAKE_ORG}/{pull_request['repo']}/pulls/{pull_request['number']}"},
+        }
+
+    def _github_search(self, query):
+        terms = query.get("q", "").split()
+        author = next((t.split(":", 1)[1] for t in terms if t.startswith("author:")), None)
+        repo = next((t.split("/", 1)[1] for t in terms if t.startswith("repo:")), None)
+        archived = self.server.fake.data.archived_repos if "archived:false" in terms else set()
+        created = next((t.split(":", 1)[1].split("..") for t in terms if t.startswith("created:")), None)
+        per_page = int(query.get("per_page", 30))
+        page = int(query.get("page", 1))
+
+        pull_requests = [pr for pr in self.server.fake.data.pull_requests
+                         if (author is None or pr["author"] == author) and (repo is None or pr["repo"] == repo)
+                         and pr["repo"] not in archived
+                         and (created is None or created[0] <= pr["created_at"][:10] <= created[1])]
+        start = (page - 1) * per_page
+        if start >= 1000:
+            # same as GitHub
+            return {"message": "Only the first 1000 search results are available"}, 422
+        items = pull_requests[start:start + per_page]
+        return {
+            "total_count": len(pull_requests),
+            "incomplete_results": False,
+            "items": [self._github_search_item(pr) for pr in items],
+        }
+
+    def _github_repos(self, query, org):
+        data = self.server.fake.data
+        per_page = int(query.get("per_page", 30))
+        start = (int(query.get("page", 1)) - 1) * per_page
+        return [{"name": repo, "archived": repo in data.archived_repos, "disabled": False}
+                for repo in data.repos[start:start + per_page]]
+
+    def _find_pull_request(self, repo, number):
+        data = self.server.fake.data
+        pull_request = data.pull_requests[int(number) - 1] if 0 < int(number) <= len(data.pull_requests) else None
+        if pull_request is None or pull_request["repo"] != repo:
+            return None
+        return pull_request
+
+    def _github_pull_request(self, query, owner, repo, number):
+        pull_request = self._find_pull_request(repo, number)
+        if pull_request is None:
+            return {"message": "Not Found"}, 404
+        ret = self._github_search_item(pull_request)
+        ret.update({
+            "requested_reviewers": [self._github_user(FAKE_USERS[0])],
+            "additions": 10 * pull_request["number"],
+            "deletions": pull_request["number"],
+            "draft": False,
+            "mergeable": True,
+            "rebaseable": True,
+            "mergeable_state": "clean",
+        })
+        return ret
+
+    def _github_commits(self, query, owner, repo, number):
+        pull_request = self._find_pull_request(repo, number)
+        if pull_request is None:
+            return {"message": "Not Found"}, 404
+        return [{"sha": f"{pull_request['number']:08x}{i:032x}", "commit": {"message": message}}
+                for i, message in enumerate(pull_request["commits"])]
+
+    # Jira
+
+    def _jira_server_info(self, query):
+        return {"baseUrl": self._base_url(), "version": "9.12.0", "versionNumbers": [9, 12, 0],
+                "deploymentType": "Server", "serverTitle": "Fake Jira"}
+
+    def _jira_fields(self, query):
+        return [{"id": name, "name": name.capitalize(), "clauseNames": [name], "custom": False}
+                for name in ("summary", "description", "assignee", "status", "resolution", "issuetype", "parent")] + [
+                {"id": "customfield_12310940", "name": "Sprint", "clauseNames": ["sprint"], "custom": True},
+                {"id": "customfield_12311140", "name": "Epic Link", "clauseNames": ["cf[12311140]"], "custom": True}]
+
+    def _jira_myself(self, query):
+        # every token is a user of its own
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        return {"name": token, "key": token, "displayName": token.capitalize()}
+
+    def _jira_issue(self, issue):
+        base = self._base_url()
+        ret = {
+            "id": issue["key"].split("-")[1],
+            "key": issue["key"],
+            "self": f"{base}/rest/api/2/issue/{issue['key']}",
+            "fields": {
+                "summary": issue["summary"],
+                "description": f"Description of {issue['key']}",
+                "assignee": {"name": issue["assignee"], "displayName": issue["assignee"].capitalize()},
+                "status": self.server.fake.data.status(issue["status_id"]),
+                "resolution": None,
+                "issuetype": {"name": issue.get("issue_type", "Task")},
+                "customfield_12310940": [FAKE_SPRINT] if issue["in_sprint"] else None,
+            },
+        }
+        epic = issue.get("epic")
+        if epic and int(issue["key"].split("-")[1]) % 4 == 1:
+            ret["fields"]["parent"] = {"key": epic, "fields": {"issuetype": {"name": "Epic"}}}
+        elif epic:
+            ret["fields"]["customfield_12311140"] = epic
+        return ret
+
+    def _filter_issues(self, jql, issues):
+        """
+        Return the issues matching `jql`, only the few clauses used by the scripts are known
+        """
+        negated = re.search(r" and not \((.*)\)$", jql)
+        if negated:
+            excluded = {i["key"] for i in self._filter_issues(negated.group(1), issues)}
+            issues = [i for i in issues if i["key"] not in excluded]
+            jql = jql[:negated.start()]
+
+        updated = re.search(r'updated >= "-(\d+)m"', jql)
+        if updated:
+            since = time.time() - 60 * int(updated.group(1))
+            issues = [i for i in issues if i.get("updated", 0) >= since]
+        projects = re.search(r"project in \(([^)]*)\)", jql)
+        if projects:
+            wanted = {p.strip() for p in projects.group(1).split(",")}
+            issues = [i for i in issues if i["key"].rsplit("-", 1)[0] in wanted]
+        keys = re.search(r"key (?:=|in) \(?([^)]*)\)?", jql)
+        if keys:
+            wanted = {k.strip() for k in keys.group(1).split(",")}
+            issues = [i for i in issues if i["key"] in wanted]
+        if "issuetype != 'EPIC'" in jql:
+            issues = [i for i in issues if i.get("issue_type") != "Epic"]
+        if "openSprints()" in jql:
+            issues = [i for i in issues if i["in_sprint"]]
+        elif "filter =" in jql:
+            issues = [i for i in issues if not i["in_sprint"]]
+        assignee = re.search(r"assignee = '([^']*)'", jql)
+        if assignee:
+            issues = [i for i in issues if i["assignee"] == assignee.group(1)]
+        return issues
+
+    def _jira_search(self, query):
+        issues = self._filter_issues(query.get("jql", ""), list(self.server.fake.data.issues.values()))
+
+        start_at = int(query.get("startAt", 0))
+        max_results = min(int(query.get("maxResults", 50)), 100)
+        return {
+            "startAt": start_at,
+            "maxResults": max_results,
+            "total": len(issues),
+            "issues": [self._jira_issue(i) for i in issues[start_at:start_at + max_results]],
+        }
+
+    def _jira_board_configuration(self, query, board_id):
+        return {
+            "id": board_id,
+            "name": "Fake board",
+            "filter": {"id": FAKE_BACKLOG_FILTER_ID},
+            "columnConfig": {"columns": [
+                {"name": name, "statuses": [{"id": sid} for sid, _ in statuses]}
+                for name, statuses in FAKE_COLUMNS
+            ]},
+        }
+
+    def _jira_browse(self, query, key):
+        if key in self.server.fake.data.issues:
+            return {}
+        return {}, 404
+
+
+class FakeServer:
+    """
+    Run the fake APIs in a background thread.
+
+    :param data: the `FakeData` to serve
+    :param latency: seconds to wait before answering each request
+    :param rate_limit_every: answer every n-th request of an endpoint with 429
+    :param retry_after: value of the `Retry-After` header of 429 answers
+    :param fail_every: answer every n-th request of an endpoint with 503, starting with the first
+    """
+
+    def __init__(self, data=None, latency=0, rate_limit_every=0, retry_after=0, port=0, fail_every=0):
+        self.data = data or FakeData()
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.fail_every = fail_every
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), FakeRequestHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint):
+        """
+        Count a request, returns the number of requests of that endpoint so far.
+        """
+        with self._lock:
+            self.requests[endpoint] += 1
+            return self.requests[endpoint]
+
+    def total_requests(self):
+        return sum(v for k, v in self.requests.items() if k not in ("429", "503"))
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """Serve fake GitHub and Jira APIs with synthetic data"""
+    parser = argparse.ArgumentParser(allow_abbrev=False, description=__doc__)
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("--pull-requests", type=int, default=100,
+                        help="Number of synthetic pull requests (default: 100)")
+    parser.add_argument("--epics", type=int, default=0, help="Number of epics of the issues (default: 0)")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds to wait per request (default: 0)")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every n-th request of an endpoint with 429 (default: never)")
+    parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
+
+    if "--help-md" in sys.argv:
+        print(format_help_as_md(parser))
+        sys.exit(0)
+
+    args = parser.parse_args()
+
+    server = FakeServer(FakeData(args.pull_requests, epics=args.epics), args.latency, args.rate_limit_every, port=args.port)
+    print(f"Serving fake GitHub and Jira APIs on {server.url} (board {FAKE_BOARD_ID}, org {FAKE_ORG})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(dict(server.requests), indent=2))
+
+
+if __name__ == "__main__":
+    main()
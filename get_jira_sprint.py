@@ -4,6 +4,8 @@
 Script to query Jira issues for the current sprint.
 
 Saves a `current_sprint_issues.json` to be used with following scripts.
+With `--output-format jsonl` a `current_sprint_issues.jsonl` is written instead,
+one issue per line as soon as its section is fetched.
 Alternatively the class `JiraDataProcessor` can be used to get the data
 from within python.
 
@@ -14,11 +16,20 @@ import logging
 import os
 import re
 import sys
-import json
-import time
 
-from utils import format_help_as_md, Cache
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import (add_profile_argument, format_help_as_md, start_profiling, split_list, Cache, Deadline,
+                   JsonLinesWriter, RateBudget, write_json)
+from records import Issue, Sprint
+from metrics import metrics
+import http_transport
+import circuit_breaker
+from circuit_breaker import CircuitOpenError
+from jira_issue_store import JiraIssueStore
+from state_store import open_store
 from jira import JIRA, JIRAError
+from requests import ConnectionError as RequestsConnectionError, Timeout
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +41,8 @@ JIRA_HOST = os.getenv("JIRA_HOST", "https://issues.redhat.com")
 JIRA_TOKEN = os.getenv("JIRA_TOKEN")
 
 doc_epilog += """The environment variable `JIRA_BOARD_ID` will
-be used to get the underlying issue filter and sprint information.
+be used to get the underlying issue filter and sprint information,
+several boards can be given comma separated.
 """
 JIRA_BOARD_ID = os.getenv("JIRA_BOARD_ID")
 
@@ -40,57 +52,109 @@ When not set Jira's `currentUser()` will be used instead.
 """
 JIRA_USERNAME = os.getenv("JIRA_USERNAME")
 
+doc_epilog += """With the environment variable `STATE_STORE` (e.g. a local directory)
+the issues are kept there and only the changes are fetched from Jira.
+"""
+
+# number of keys per `key in (…)` query
+JIRA_KEYS_PER_QUERY = 100
+
+# the last configuration of every board, used while Jira fails fast (see `circuit_breaker.py`)
+board_configurations = {}
+
+# "Epic Link" of issues in Jira Server, Jira Cloud uses the parent instead
+EPIC_LINK_FIELD = "customfield_12311140"
+
 class JiraDataProcessor:
-    def __init__(self, jira_token, jira_username=None, jira_board_id=None, jira_backlog_filter_id=None):
+    def __init__(self, jira_token, jira_username=None, jira_board_id=None, jira_backlog_filter_id=None,
+                 any_assignee=False, issue_store=None, rate_budget=None, deadline=None):
+        """
+        `jira_board_id` is a board or a list of them, several boards are fetched
+        concurrently within `rate_budget` (default: a new `utils.RateBudget`)
+        and every issue is only listed once.
+        With `any_assignee` the sprint and backlog issues of all assignees are fetched,
+        e.g. to be partitioned per user afterwards.
+        With a `jira_issue_store.JiraIssueStore` as `issue_store` the sprint and
+        backlog issues are kept there and only refreshed incrementally.
+        With a `utils.Deadline` as `deadline` requests and backoffs which would
+        outlast it raise `utils.DeadlineExceeded` instead.
+        While the circuit breaker of an endpoint is open its requests raise
+        `CircuitOpenError` and the sprint and backlog issues are taken from `issue_store`.
+        """
         self.jira_token = jira_token
-        self.jira = JIRA(JIRA_HOST, token_auth=self.jira_token)
-        self.jira_board_id = jira_board_id
+        self.issue_store = issue_store
+        self.deadline = deadline or Deadline()
+        server_info = circuit_breaker.endpoint("jira", "GET", "/rest/api/2/serverInfo")
+
+        def connect():
+            with metrics.stage("connect"), circuit_breaker.get(server_info).guard():
+                # no retries with sleeps in the session, `_retry_on_rate_limit` retries within the deadline
+                return JIRA(JIRA_HOST, token_auth=self.jira_token, max_retries=0,
+                            timeout=self.deadline.timeout(http_transport.HTTP_TIMEOUT, "connecting to Jira"))
+
+        self.jira = self._retry_on_rate_limit("the Jira server", connect)
+        metrics.instrument_session(http_transport.share_connections(self.jira._session))
+        self.jira._session.request = circuit_breaker.wrap(self.jira._session.request, "jira")
+        if isinstance(jira_board_id, (list, tuple)):
+            self.jira_board_ids = list(jira_board_id)
+        else:
+            self.jira_board_ids = [jira_board_id]
+        self.jira_board_id = self.jira_board_ids[0]
+        if rate_budget is None and len(self.jira_board_ids) > 1:
+            rate_budget = RateBudget()
+        if rate_budget is not None:
+            self.jira._session.request = rate_budget.wrap(self.jira._session.request)
+        if deadline is not None:
+            # every request waits at most until the deadline
+            self.jira._session.send = deadline.wrap(self.jira._session.send, timeout=http_transport.HTTP_TIMEOUT)
         self.backlog_filter_id = jira_backlog_filter_id
+        self.any_assignee = any_assignee
 
         if jira_username:
             self.jira_username = f"'{jira_username}'"
         else:
             self.jira_username = "currentUser()"
+        # the stored issues of `currentUser()` are kept by the account of the token
+        self.current_account = None
+        if issue_store is not None and not jira_username and not any_assignee:
+            myself = self._retry_on_rate_limit("the current user", self.jira.myself)
+            self.current_account = myself.get("accountId") or myself.get("name")
 
-        board_data = self.fetch_board(self.jira_board_id)
-        self.board_data = board_data
+        with metrics.stage("board"):
+            self.boards = dict(zip(self.jira_board_ids, self._for_all_boards(self.fetch_board)))
+        self.board_data = self.boards[self.jira_board_id]
 
+    def _for_all_boards(self, function):
+        """
+        Return `function(board_id)` for all boards, called concurrently for several boards.
+        """
+        if len(self.jira_board_ids) == 1:
+            return [function(self.jira_board_id)]
+        with ThreadPoolExecutor(max_workers=len(self.jira_board_ids)) as executor:
+            return list(executor.map(function, self.jira_board_ids))
 
-    def fetch_sprints(self, board_id, max_retries=5):
+    def _merge_boards(self, function):
         """
-        Fetch all sprints for a given board ID.
+        Return the issues `function(board_id)` returns for all boards, every issue only once.
+        """
+        issues = {}
+        for board_issues in self._for_all_boards(function):
+            for issue in board_issues:
+                issues.setdefault(issue["key"], issue)
+        return list(issues.values())
+
+    def _retry_on_rate_limit(self, what, function, max_retries=5):
+        """
+        Return `function()`, retrying it up to `max_retries` times after 429 responses
+        (after `Retry-After`), 5xx responses, connection errors and timeouts (after 2, 4, 8… seconds).
         """
-        start_at = 0
-        max_results = 50
-        all_sprints = []
         attempt = 0
         while True:
             attempt += 1
             try:
-                while True:
-                    sprints = self.jira.sprints(board_id, startAt=start_at, maxResults=max_results)
-                    # .sprints() seems to return all sprints
-                    # so we'll filter them by BOARD_ID
-                    all_sprints.extend([sprint for sprint in sprints if getattr(sprint, 'originBoardId', None) == board_id])
-
-                    if len(sprints) < max_results:
-                        break
-                    start_at += max_results
-
-                sprints_filtered = [sprint for sprint in all_sprints if getattr(sprint, 'originBoardId', None)]
-                ret = []
-                for sprint in sprints_filtered:
-                    ret.append({
-                        'id': sprint.id,
-                        'originBoardId': sprint.originBoardId,
-                        'name': sprint.name,
-                        'state': sprint.state,
-                        'startDate': sprint.startDate,
-                        'endDate': sprint.endDate
-                    })
-                return ret
-            except JIRAError as e:
-                status = getattr(e.response, 'status_code', None)
+                return function()
+            except (JIRAError, RequestsConnectionError, Timeout) as e:
+                status = getattr(e.response, 'status_code', None) if isinstance(e, JIRAError) else None
                 # Handle rate limit (429)
                 if status == 429 and attempt <= max_retries:
                     retry_after = e.response.headers.get("Retry-After")
@@ -103,15 +167,63 @@ class JiraDataProcessor:
                         f"Rate limit exceeded (attempt {attempt}/{max_retries}). "
                         f"Waiting {wait}s before retrying..."
                     )
-                    time.sleep(wait)
+                    self.deadline.sleep(wait, what)
+                    metrics.record_backoff(wait)
+                    continue
+
+                # Jira is failing or the connection dropped
+                # a timeout at the deadline ends here as there is no time to wait
+                failing = isinstance(e, (RequestsConnectionError, Timeout)) or (status or 0) >= 500
+                if failing and attempt <= max_retries:
+                    wait = min(2 ** attempt, 60)
+                    logger.warning(
+                        f"Failed to fetch {what} (status={status}, attempt {attempt}/{max_retries}). "
+                        f"Waiting {wait}s before retrying..."
+                    )
+                    self.deadline.sleep(wait, what)
+                    metrics.record_backoff(wait)
                     continue
 
                 # If we've retried too many times or it's a different error:
                 logger.error(
-                    f"Failed to fetch sprints for board ID {board_id} "
+                    f"Failed to fetch {what} "
                     f"(status={status}) after {attempt} attempts: {e}"
                 )
-                raise e
+                raise
+
+
+    def fetch_sprints(self, board_id, max_retries=5):
+        """
+        Fetch all sprints for a given board ID.
+        """
+        def fetch():
+            start_at = 0
+            max_results = 50
+            all_sprints = []
+            while True:
+                sprints = self.jira.sprints(board_id, startAt=start_at, maxResults=max_results)
+                # .sprints() seems to return all sprints
+                # so we'll filter them by BOARD_ID
+                all_sprints.extend([sprint for sprint in sprints if getattr(sprint, 'originBoardId', None) == board_id])
+
+                if len(sprints) < max_results:
+                    break
+                start_at += max_results
+            return all_sprints
+
+        all_sprints = self._retry_on_rate_limit(f"sprints for board ID {board_id}", fetch, max_retries)
+        sprints_filtered = [sprint for sprint in all_sprints if getattr(sprint, 'originBoardId', None)]
+        ret = []
+        for sprint in sprints_filtered:
+            ret.append(Sprint(
+                id=sprint.id,
+                originBoardId=sprint.originBoardId,
+                name=sprint.name,
+                state=sprint.state,
+                startDate=sprint.startDate,
+                endDate=sprint.endDate
+            ))
+        return ret
 
 
     def fetch_board(self, board_id, max_retries=5):
@@ -122,41 +234,26 @@ class JiraDataProcessor:
         :param max_retries: Maximum number of times to retry after 429 responses.
         :return: Parsed JSON configuration of the board.
         :raises SystemExit: If non-429 error occurs or retries are exhausted.
+        :raises CircuitOpenError: If Jira fails fast and the board was never fetched before.
         """
         url = f"{JIRA_HOST}/rest/agile/1.0/board/{board_id}/configuration"
-        attempt = 0
-
-        while True:
-            attempt += 1
-            try:
-                resp = self.jira._session.get(url)
-                # raise_for_status will raise HTTPError for 4xx/5xx
-                resp.raise_for_status()
-                return resp.json()
 
-            except JIRAError as e:
-                status = getattr(e.response, 'status_code', None)
-                # Handle rate limit (429)
-                if status == 429 and attempt <= max_retries:
-                    retry_after = e.response.headers.get("Retry-After")
-                    try:
-                        wait = max(int(retry_after),2)
-                    except (TypeError, ValueError):
-                        # Fallback to a default backoff if header missing or invalid
-                        wait = 60
-                    logger.warning(
-                        f"Rate limit exceeded (attempt {attempt}/{max_retries}). "
-                        f"Waiting {wait}s before retrying..."
-                    )
-                    time.sleep(wait)
-                    continue
-
-                # If we've retried too many times or it's a different error:
-                logger.error(
-                    f"Failed to fetch board configuration for board ID {board_id} "
-                    f"(status={status}) after {attempt} attempts: {e}"
-                )
-                sys.exit(1)
+        def fetch():
+            resp = self.jira._session.get(url)
+            # raise_for_status will raise HTTPError for 4xx/5xx
+            resp.raise_for_status()
+            return resp.json()
+
+        try:
+            board_configurations[board_id] = self._retry_on_rate_limit(
+                f"board configuration for board ID {board_id}", fetch, max_retries)
+        except CircuitOpenError:
+            if board_id not in board_configurations:
+                raise
+            logger.warning(f"Using the last configuration of board ID {board_id}, Jira fails fast.")
+        except JIRAError:
+            sys.exit(1)
+        return board_configurations[board_id]
 
     def _extract_sprint_info(self, sprint_string):
         """
@@ -178,7 +275,7 @@ class JiraDataProcessor:
             'incompleteIssuesDestinationId': r'incompleteIssuesDestinationId=(-?\d+)[],]'
         }
 
-        sprint_info = {}
+        sprint_info = Sprint()
         for key, pattern in patterns.items():
             match = re.search(pattern, sprint_string)
             if match:
@@ -202,12 +299,13 @@ class JiraDataProcessor:
             return []
 
 
-    def _get_column(self, status_id):
+    def _get_column(self, status_id, board_id=None):
         """
-        Get the column name for a given status ID.
+        Get the column name for a given status ID on the board (default: the first one).
         """
+        board_data = self.boards[board_id] if board_id is not None else self.board_data
         col_sort_id = 0
-        for column in self.board_data['columnConfig']['columns']:
+        for column in board_data['columnConfig']['columns']:
             col_sort_id += 1
             if column['statuses']:
                 for status in column['statuses']:
@@ -216,143 +314,175 @@ class JiraDataProcessor:
                                 , "sort_id": col_sort_id}
         return None
 
-    def _process_issues(self, issues):
+    def _get_assignee_id(self, assignee):
+        """
+        Return the ID of the assignee as used in `usermap.yaml`,
+        the accountId in Jira Cloud, the user name in Jira Server.
+        """
+        if not assignee:
+            return None
+        return getattr(assignee, 'accountId', None) or getattr(assignee, 'name', None)
+
+    def _get_epic_key(self, issue):
+        """
+        Return the key of the epic the issue belongs to or None.
+        """
+        parent = getattr(issue.fields, 'parent', None)
+        if parent is not None:
+            parent_type = getattr(getattr(getattr(parent, 'fields', None), 'issuetype', None), 'name', '')
+            if parent_type.lower() == 'epic':
+                return parent.key
+        return getattr(issue.fields, EPIC_LINK_FIELD, None) or None
+
+    def _assignee_clause(self):
+        if self.any_assignee:
+            return ""
+        return f" and assignee = {self.jira_username}"
+
+    def _process_issues(self, issues, board_id=None):
         """
         Internal method to process fetched issues and return structured data.
         """
         processed_issues = []
         for issue in issues:
-            processed_issues.append({
-                'key': issue.key,
-                'url': f"{JIRA_HOST}/browse/{issue.key}",
-                'summary': issue.fields.summary,
-                'assignee': issue.fields.assignee.displayName if issue.fields.assignee else "None",
-                'description': issue.fields.description,
-                'status': issue.fields.status.name,
-                'sprint': self._extract_sprint(issue),
-                'sprint_column': self._get_column(issue.fields.status.id),
-            })
+            processed_issues.append(Issue(
+                key=issue.key,
+                url=f"{JIRA_HOST}/browse/{issue.key}",
+                summary=issue.fields.summary,
+                assignee=issue.fields.assignee.displayName if issue.fields.assignee else "None",
+                assignee_id=self._get_assignee_id(issue.fields.assignee),
+                description=issue.fields.description,
+                status=issue.fields.status.name,
+                resolution=issue.fields.resolution.name if getattr(issue.fields, 'resolution', None) else None,
+                sprint=self._extract_sprint(issue),
+                sprint_column=self._get_column(issue.fields.status.id, board_id),
+                issue_type=issue.fields.issuetype.name if getattr(issue.fields, 'issuetype', None) else None,
+                epic=self._get_epic_key(issue),
+            ))
         return processed_issues
 
-    def fetch_current_sprint_issues(self):
+    def _search(self, scope, jql, max_retries=5, full_sync=False, board_id=None):
+        """
+        Return the processed issues of `jql`, synced with the issue store if there is one.
+        """
+        if board_id is None:
+            board_id = self.jira_board_id
+
+        def fetch_issues(query):
+            issues = self._retry_on_rate_limit(
+                f"issues for the {scope}",
+                lambda: self.jira.search_issues(jql_str=query, maxResults=False),
+                max_retries)
+            return self._process_issues(issues, board_id)
+
+        def fetch_keys(query):
+            issues = self._retry_on_rate_limit(
+                f"issues for the {scope}",
+                lambda: self.jira.search_issues(jql_str=query, maxResults=False, fields="key"),
+                max_retries)
+            return [issue.key for issue in issues]
+
+        if self.issue_store is None:
+            return fetch_issues(jql)
+
+        assignee = "any" if self.any_assignee else self.current_account or self.jira_username.strip("'")
+        name = f"{board_id}/{scope}/{assignee}"
+        try:
+            return self.issue_store.sync(name, jql, fetch_issues, fetch_keys, full=full_sync)
+        except CircuitOpenError:
+            issues = self.issue_store.stored(name, jql)
+            if issues is None:
+                raise
+            logger.warning(f"Using the stored issues for the {scope}, Jira fails fast.")
+            return issues
+
+    def fetch_current_sprint_issues(self, full_sync=False):
         """
         Fetch issues for the current sprint and process them.
         """
-        jql = f"sprint in openSprints() and assignee = {self.jira_username}"
-        attempt = 0
-        while True:
-            attempt += 1
-            try:
-                issues = self.jira.search_issues(jql_str=jql)
-                break
-            except JIRAError as e:
-                status = getattr(e.response, 'status_code', None)
-                if status == 429 and attempt <= 5:
-                    retry_after = e.response.headers.get("Retry-After")
-                    try:
-                        wait = max(int(retry_after),2)
-                    except (TypeError, ValueError):
-                        wait = 60
-                    logger.warning(
-                        f"Rate limit exceeded (attempt {attempt}/5). "
-                        f"Waiting {wait}s before retrying..."
-                    )
-                    time.sleep(wait)
-                    continue
-                logger.error(
-                    f"Failed to fetch issues for the current sprint (attempt {attempt}/5): {e}"
-                )
-                raise e
-        return self._process_issues(issues)
+        def fetch(board_id):
+            jql = f"sprint in openSprints(){self._assignee_clause()}"
+            if len(self.jira_board_ids) > 1:
+                # the columns depend on the board
+                jql = f"filter = {self.boards[board_id]['filter']['id']} and {jql}"
+            return self._search("current sprint", jql, full_sync=full_sync, board_id=board_id)
+
+        with metrics.stage("sprint"):
+            return self._merge_boards(fetch)
 
     def get_issue(self, key, max_retries=5):
         jql = f"key = {key}"
-        attempt = 0
-        while True:
-            attempt += 1
-            try:
-                issue = self.jira.search_issues(jql_str=jql)
-                return self._process_issues(issue)[0]
-            except JIRAError as e:
-                status = getattr(e.response, 'status_code', None)
-                if status == 429 and attempt <= max_retries:
-                    retry_after = e.response.headers.get("Retry-After")
-                    try:
-                        wait = max(int(retry_after),2)
-                    except (TypeError, ValueError):
-                        wait = 60
-                    logger.warning(
-                        f"Rate limit exceeded (attempt {attempt}/{max_retries}). "
-                        f"Waiting {wait}s before retrying..."
-                    )
-                    time.sleep(wait)
-                    continue
-                logger.error(
-                    f"Failed to fetch issue {key} (attempt {attempt}/{max_retries}): {e}"
-                )
-                raise e
-    
-    def fetch_current_backlog_issues(self, exclude_resolved=True, max_retries=5):
+        issues = self._retry_on_rate_limit(f"issue {key}", lambda: self.jira.search_issues(jql_str=jql),
+                                           max_retries)
+        return self._process_issues(issues)[0]
+
+    def get_issues(self, keys, max_retries=5):
+        """
+        Fetch many issues at once with `key in (…)` queries.
+        Keys of issues which don't exist or aren't accessible are ignored.
+        """
+        keys = list(dict.fromkeys(keys))
+        ret = []
+        for start in range(0, len(keys), JIRA_KEYS_PER_QUERY):
+            chunk = keys[start:start + JIRA_KEYS_PER_QUERY]
+            jql = f"key in ({', '.join(chunk)})"
+            # without validation Jira ignores unknown keys instead of failing the query
+            issues = self._retry_on_rate_limit(
+                f"issues {', '.join(chunk)}",
+                lambda: self.jira.search_issues(jql_str=jql, maxResults=False, validate_query=False),
+                max_retries)
+            ret.extend(self._process_issues(issues))
+        return ret
+
+    def _backlog_filter_id(self, board_id):
+        """
+        Return the ID of the backlog filter of the board, `jira_backlog_filter_id` for the first one if given
+        """
+        if board_id == self.jira_board_id and self.backlog_filter_id:
+            return self.backlog_filter_id
+        filter_id = self.boards[board_id]['filter']['id']
+        if not filter_id:
+            logger.error(f"No backlog filter ID found for board ID {board_id}.")
+            sys.exit(1)
+        return filter_id
+
+    def fetch_current_backlog_issues(self, exclude_resolved=True, max_retries=5, full_sync=False):
         """
         Fetch issues for the backlog using a specific Jira filter ID and process them.
         """
-        if not self.backlog_filter_id:
-            self.backlog_filter_id = self.board_data['filter']['id']
+        def fetch(board_id):
+            jql = f"filter = {self._backlog_filter_id(board_id)} and issuetype != 'EPIC'{self._assignee_clause()}"
+            return self._search("backlog", jql, max_retries, full_sync, board_id)
 
-        if not self.backlog_filter_id:
-            logger.error(f"No backlog filter ID found for board ID {self.jira_board_id}.")
-            sys.exit(1)
-        jql = f"filter = {self.backlog_filter_id} and issuetype != 'EPIC' and assignee = {self.jira_username}"
-        attempt = 0
-        while True:
-            attempt += 1
-            try:
-                issues = self.jira.search_issues(jql_str=jql)
-                # optionally exclude resolved issues
-                # some inconsistencies can happen in jira we'll just filter them out
-                issues_filtered = [i for i in issues if not i.fields.resolution] if exclude_resolved else issues
-                issues_filtered = [i for i in issues_filtered if i.fields.status.name.lower() != 'closed'] if exclude_resolved else issues_filtered
-                issues_filtered = [i for i in issues_filtered if i.fields.status.name.lower() != 'resolved'] if exclude_resolved else issues_filtered
-                issues_filtered = [i for i in issues_filtered if i.fields.status.name.lower() != 'release pending'] if exclude_resolved else issues_filtered
-
-                # filter out issues that are in an "ACTIVE" sprint
-                ret = []
-                for i in issues_filtered:
-                    # ugly workaround to check if the issue is in an active sprint
-                    # as customfield_12310940 seems to be a string, not an object
-                    # TBD: proper implementation to get an object for the sprint
-                    if hasattr(i.fields, 'customfield_12310940') and \
-                        i.fields.customfield_12310940 and \
-                        any(["state=ACTIVE" in sprint for sprint in i.fields.customfield_12310940]):
-                        continue
-                    ret.append(i)
-                return self._process_issues(ret)
-            except JIRAError as e:
-                status = getattr(e.response, 'status_code', None)
-                if status == 429 and attempt <= max_retries:
-                    retry_after = e.response.headers.get("Retry-After")
-                    try:
-                        wait = max(int(retry_after),2)
-                    except (TypeError, ValueError):
-                        wait = 60
-                    logger.warning(
-                        f"Rate limit exceeded (attempt {attempt}/{max_retries}). "
-                        f"Waiting {wait}s before retrying..."
-                    )
-                    time.sleep(wait)
-                    continue
-                logger.error(
-                    f"Failed to fetch issues for the backlog (attempt {attempt}/{max_retries}): {e}"
-                )
-                raise e
+        with metrics.stage("backlog"):
+            issues = self._merge_boards(fetch)
+            # optionally exclude resolved issues
+            # some inconsistencies can happen in jira we'll just filter them out
+            if exclude_resolved:
+                issues = [i for i in issues if not i.get("resolution")
+                          and i["status"].lower() not in ('closed', 'resolved', 'release pending')]
+
+            # filter out issues that are in an "ACTIVE" sprint
+            return [i for i in issues if not any(sprint.get("state") == "ACTIVE" for sprint in i["sprint"])]
 
 
-    def get_issue_overview(self):
+    def get_issue_overview(self, on_issue=None, full_sync=False):
         """
         Get an overview of issues in the current sprint and backlog.
+
+        `on_issue(section, issue)` is called for every issue as soon as its
+        section is fetched, with `section` being "current_sprint" or "backlog".
+        With `full_sync` all issues in the issue store are fetched again.
         """
-        current_sprint_issues = self.fetch_current_sprint_issues()
-        backlog_issues = self.fetch_current_backlog_issues()
+        current_sprint_issues = self.fetch_current_sprint_issues(full_sync=full_sync)
+        if on_issue:
+            for issue in current_sprint_issues:
+                on_issue("current_sprint", issue)
+
+        backlog_issues = self.fetch_current_backlog_issues(full_sync=full_sync)
+        if on_issue:
+            for issue in backlog_issues:
+                on_issue("backlog", issue)
 
         return {
             'current_sprint': current_sprint_issues,
@@ -367,6 +497,16 @@ def main():
     )
 
     parser.add_argument("--jira-token", help="Set the API token for Jira", required=(JIRA_TOKEN is None))
+    parser.add_argument("--output-format", choices=["json", "jsonl"], default="json",
+                        help="Write `current_sprint_issues.json` at the end (json) or "
+                        "stream one issue per line into `current_sprint_issues.jsonl` (jsonl)")
+    parser.add_argument("--full-sync", help="Fetch all issues again instead of only the changes (with `STATE_STORE`)",
+                        action="store_true")
+    parser.add_argument("--warehouse", metavar="FILE",
+                        help="Also add the issues to the SQLite database FILE, see `warehouse.py`")
+    parser.add_argument("--metrics", help="Print request counts and stage timings as JSON to stderr at the end",
+                        action="store_true")
+    add_profile_argument(parser)
     parser.add_argument("--debug", help="Enable debug logging", action="store_true")
     parser.add_argument("--quiet", help="No info logging. Use for automations", action="store_true")
     parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
@@ -376,6 +516,7 @@ def main():
         sys.exit(0)
 
     args = parser.parse_args()
+    start_profiling(args.profile)
 
     if args.jira_token:
         jira_token = args.jira_token
@@ -395,7 +536,10 @@ def main():
         logger.addHandler(handler)
         logger.propagate = False
 
-    data_processor = JiraDataProcessor(jira_token,JIRA_USERNAME, JIRA_BOARD_ID)
+    store = open_store()
+    issue_store = JiraIssueStore(store) if store is not None else None
+    data_processor = JiraDataProcessor(jira_token,JIRA_USERNAME, split_list(JIRA_BOARD_ID) or None,
+                                       issue_store=issue_store)
 
     # Uncomment the following line to fetch boards for a specific project key
     # can be useful for debugging or future use
@@ -406,11 +550,24 @@ def main():
     # sprints = data_processor.fetch_sprints(JIRA_BOARD_ID)
     # print(json.dumps(sprints, indent=2))
 
-    processed_issues = data_processor.get_issue_overview()
+    if args.output_format == "jsonl":
+        with JsonLinesWriter("current_sprint_issues.jsonl", ensure_ascii=False) as writer:
+            processed_issues = data_processor.get_issue_overview(
+                on_issue=lambda section, issue: writer.write({"section": section, **issue}),
+                full_sync=args.full_sync)
+    else:
+        processed_issues = data_processor.get_issue_overview(full_sync=args.full_sync)
+        write_json("current_sprint_issues.json", processed_issues, ensure_ascii=False, indent=2)
 
-    with open("current_sprint_issues.json", "w") as f:
-        f.write(json.dumps(processed_issues, ensure_ascii=False, indent=2))
+    if args.warehouse:
+        from warehouse import Warehouse
+        with Warehouse(args.warehouse) as warehouse:
+            warehouse.add_issues(processed_issues["current_sprint"] + processed_issues["backlog"])
 
     logger.info(f"User '{JIRA_USERNAME}' has {len(processed_issues['current_sprint'])} issues in the current sprint, and {len(processed_issues['backlog'])} issues in the backlog.")
+
+    if args.metrics:
+        metrics.write_summary()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,172 +4,373 @@
 Returns all pull requests for a given organisation, repository and assignee
 
 Saves a `pr_data_collection.json` to be used with following scripts.
+With `--output-format jsonl` a `pr_data_collection.jsonl` is written instead,
+one pull request per line as soon as it is processed.
 Alternatively the class `DataProcessor` can be used to get the data
 from within python.
 
 """
 
 import argparse
+import io
 import logging
+import math
 import os
-import re
 import requests
 import time
 import pickle
 import sys
 import json
+import urllib.error
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fastcore.net import ExceptionsHTTP
 from ghapi.all import GhApi
+from ghapi.core import dict2obj, quote
 
-from utils import format_help_as_md, Cache
+from utils import (add_profile_argument, format_help_as_md, start_profiling, split_list, Cache, RateBudget, TTLCache,
+                   DeadlineExceeded, JsonLinesWriter, write_json)
+from records import PullRequest
+from jira_keys import JiraKeyMatcher
+from metrics import metrics
+import http_transport
+import circuit_breaker
+from circuit_breaker import CircuitOpenError
 
 doc_epilog = """You can set the `GITHUB_TOKEN` environment variable instead of using the `--github-token` argument.
 You can also set the `PR_BEST_PRACTICES_TEST_CACHE` environment variable to anything (e.g. `1`) use the cache.
+Set `JIRA_PROJECT_KEYS` to a comma separated list (e.g. `HMS,COMPOSER`) to only accept Jira keys of those projects.
+The existence of Jira links is cached for `JIRA_LINK_CACHE_TTL` seconds (default: 3600),
+set `JIRA_LINK_CACHE_FILE` to keep that cache between runs.
+Pull requests of archived repositories are excluded by the search itself.
+`--related-issues` needs `JIRA_TOKEN` and `JIRA_BOARD_ID` (for the columns of the issues).
 """
 
 JIRA_HOST = os.getenv("JIRA_HOST", "https://issues.redhat.com")
 JIRA_TOKEN = os.getenv("JIRA_TOKEN")
 
-JIRA_RE_KEY = r"[A-Z]+\-\d+"
+# set by GitHub Actions, also useful to point to a local test server
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
 
-logger = logging.getLogger(__name__)
+JIRA_PROJECT_KEYS = [k.strip() for k in os.getenv("JIRA_PROJECT_KEYS", "").split(",") if k.strip()]
 
-def get_archived_repos(github_api, org):
-    """
-    Return a list of archived or disabled repositories
-    """
-    res = None
+jira_key_matcher = JiraKeyMatcher(JIRA_PROJECT_KEYS)
 
-    try:
-        res = github_api.repos.list_for_org(org)
-    except:  # pylint: disable=bare-except
-        logger.error(f"Couldn't get repositories for organisation {org}.")
+# the GitHub search API doesn't return more results
+SEARCH_MAX_RESULTS = 1000
+# pull requests whose titles are scanned for Jira keys at once, a page of the search
+CLASSIFY_BATCH_SIZE = 100
 
-    archived_repos = []
+JIRA_LINK_CHECK_WORKERS = 8
+jira_link_cache = TTLCache(int(os.getenv("JIRA_LINK_CACHE_TTL", "3600")), os.getenv("JIRA_LINK_CACHE_FILE"))
 
-    if res is not None:
-        for repo in res:
-            if repo["archived"] is True or repo["disabled"] is True:
-                archived_repos.append(repo["name"])
+# what `DataProcessor` fetches for every pull request, everything else is fetched on first access:
+#  * minimal: the search result (title, author, description, ...)
+#  * summary: plus the `DETAIL_FIELDS` of `pulls.get`
+#  * full: plus the commit messages of `pulls.list_commits`
+FIELD_PROFILES = ("minimal", "summary", "full")
+DETAIL_FIELDS = ("requested_reviewers", "additions", "deletions", "draft", "mergeable", "rebaseable",
+                 "mergeable_state")
 
-    if archived_repos:
-        archived_repos_string = ", ".join(archived_repos)
-        logger.info(f"The following repositories are archived or disabled and will be ignored:\n  {archived_repos_string}")
+logger = logging.getLogger(__name__)
 
-    return archived_repos
 
-def get_pull_request_details(github_api, repo, pull_request):
+class InstrumentedGhApi(GhApi):
     """
-    Return a pull_request_details object
+    `GhApi` sending its requests with the shared keep-alive session of
+    `http_transport` instead of a new connection per request.
+    Every request is recorded in `metrics`, by its path template
+    (e.g. `/repos/{owner}/{repo}/pulls/{pull_number}`).
+    With a `utils.RateBudget` as `rate_budget` the requests run within it,
+    with a `utils.Deadline` as `deadline` no request outlasts it.
+    Every endpoint has a `circuit_breaker`, while it's open requests fail
+    right away with `CircuitOpenError`.
     """
-
-    pull_request_details = None
-    for attempt in range(3):
+    rate_budget = None
+    deadline = None
+
+    def __call__(self, path, verb=None, headers=None, route=None, query=None, data=None, timeout=None,
+                 decode=True):
+        if verb is None:
+            verb = "POST" if data else "GET"
+        endpoint = f"{verb.upper()} {path}"
+        if self.deadline is not None:
+            timeout = self.deadline.timeout(timeout or http_transport.HTTP_TIMEOUT, endpoint)
+        breaker = circuit_breaker.get(f"github {endpoint}")
+        breaker.before_request()
+        status = None
+        nbytes = 0
+        start = time.perf_counter()
         try:
-            pull_request_details = github_api.pulls.get(repo=repo, pull_number=pull_request["number"])
-        except:  # pylint: disable=bare-except
-            time.sleep(2)  # avoid API blocking
-        else:
-            break
+            if self.rate_budget is not None:
+                with self.rate_budget.request():
+                    response = self._send(path, verb, headers, route, query, data, timeout)
+            else:
+                response = self._send(path, verb, headers, route, query, data, timeout)
+            status = response.status_code
+            nbytes = len(response.content)
+        finally:
+            metrics.record_request(endpoint, status, nbytes, time.perf_counter() - start)
+            breaker.record(status)
+
+        if status >= 400:
+            # the same exceptions as `GhApi`, e.g. `HTTP404NotFoundError`
+            fp = io.BytesIO(response.content)
+            if status in ExceptionsHTTP:
+                raise ExceptionsHTTP[status](response.url, self.recv_hdrs, fp, msg=response.reason)
+            raise urllib.error.HTTPError(response.url, status, response.reason, self.recv_hdrs, fp)
+
+        if "json" in response.request.headers.get("Accept", "") and decode is True:
+            return dict2obj(response.json())
+        return response.text if decode else response.content
+
+    def _send(self, path, verb, headers, route, query, data, timeout):
+        headers = {**self.headers, **(headers or {})}
+        url = path if path.startswith(("http://", "https://")) else self.gh_host + path
+        if route:
+            url = url.format(**{k: quote(str(v)) for k, v in route.items()})
+        # like `GhApi`, an empty `data` means no body
+        data = json.dumps(data) if isinstance(data, dict) and data else data or None
+        response = http_transport.request(verb, url, headers=headers, params=query or None, data=data,
+                                          timeout=timeout)
+        self.recv_hdrs = dict(response.headers)
+        if "X-RateLimit-Remaining" in self.recv_hdrs:
+            remaining = self.recv_hdrs["X-RateLimit-Remaining"]
+            if self.limit_cb is not None and remaining != self.limit_rem:
+                self.limit_cb(int(remaining), int(self.recv_hdrs["X-RateLimit-Limit"]))
+            self.limit_rem = remaining
+        return response
+
+
+def _backoff(github_api, seconds, what):
+    """
+    Sleep `seconds` before retrying `what`, unless the deadline of `github_api` would pass meanwhile
+    """
+    deadline = getattr(github_api, "deadline", None)
+    if deadline is not None:
+        deadline.sleep(seconds, what)
     else:
-        logger.warning(f"Tried {attempt} times to get details for {pull_request.html_url}. Skipping.")
-    
+        time.sleep(seconds)
+    metrics.record_backoff(seconds)
+
+
+def get_pull_request_details(github_api, repo, pull_request, attempts=3):
+    """
+    Return a pull_request_details object.
+    The error of the last attempt is raised, `CircuitOpenError` right away.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return github_api.pulls.get(repo=repo, pull_number=pull_request["number"])
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if attempt == attempts:
+                logger.error(f"Couldn't get the details of {pull_request['html_url']} after {attempt} attempts. {e}")
+                raise
+            _backoff(github_api, 2, pull_request["html_url"])  # avoid API blocking
+
+def get_pull_request_commit_messages(github_api, repo, pull_number, html_url):
+    """
+    Return the commit messages of a pull request
+    """
     commits = []
     for attempt in range(3):
         try:
-            commits = github_api.pulls.list_commits(repo=repo, pull_number=pull_request["number"])
+            commits = github_api.pulls.list_commits(repo=repo, pull_number=pull_number)
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
         except:  # pylint: disable=bare-except
-            time.sleep(2)  # avoid API blocking
+            _backoff(github_api, 2, html_url)  # avoid API blocking
         else:
             break
     else:
-        logger.warning(f"Tried {attempt} times to get commits for {pull_request.html_url}. Skipping.")
-
-    if pull_request_details is not None:
-        # without the general details, it would not make sense to return the commit messages
-        pull_request_details["commit_messages"] = [c.commit.message for c in commits]
-        return pull_request_details
+        logger.warning(f"Tried {attempt} times to get commits for {html_url}. Skipping.")
 
-    logger.error("Couldn't get any pull requests details.")
-    sys.exit(1)
+    return [c.commit.message for c in commits]
 
-def get_pull_request_properties(github_api, pull_request, org, repo):
+def get_pull_request_properties(github_api, pull_request, org, repo, fields="summary"):
     """
-    Return a dictionary of all relevant pull request properties
+    Return a `PullRequest` record of all relevant pull request properties.
+    The fields `fields` (see `FIELD_PROFILES`) doesn't need are only fetched when accessed.
     """
-    pr_properties = {}
+    if fields == "minimal":
+        pr_properties = make_pull_request(pull_request, None, org, repo)
+        set_details_loader(github_api, pr_properties)
+    else:
+        pull_request_details = get_pull_request_details(github_api, repo, pull_request)
+        pr_properties = make_pull_request(pull_request, pull_request_details, org, repo)
+    set_commit_messages_loader(github_api, pr_properties)
+    if fields == "full":
+        pr_properties["commit_messages"]  # pylint: disable=pointless-statement
+
+    # the Jira issues of all pull requests are fetched at once by `DataProcessor.collect_related_issues`
 
-    pull_request_details = get_pull_request_details(github_api, repo, pull_request)
+    return pr_properties
+
+
+def make_pull_request(pull_request, pull_request_details, org, repo):
+    """
+    Return a `PullRequest` record from a search result and the pull request details.
+    A pull request webhook payload can be used for both.
+    Without `pull_request_details` the `DETAIL_FIELDS` are left unset.
+    """
+    pr_properties = PullRequest()
 
     pr_properties["number"] = pull_request["number"]
-    pr_properties["html_url"] = pull_request.html_url
-    pr_properties["title"] = pull_request.title
+    pr_properties["html_url"] = pull_request["html_url"]
+    pr_properties["title"] = pull_request["title"]
     pr_properties["org"] = org
     pr_properties["repo"] = repo
-    pr_properties["created_at"] = pull_request.created_at
-    pr_properties["updated_at"] = pull_request.updated_at
-    pr_properties["requested_reviewers"] = list(pull_request_details["requested_reviewers"])
-    pr_properties["additions"] = pull_request_details["additions"]
-    pr_properties["deletions"] = pull_request_details["deletions"]
-    pr_properties["draft"] = pull_request_details["draft"]
-    pr_properties["mergeable"] = pull_request_details["mergeable"]
-    pr_properties["rebaseable"] = pull_request_details["rebaseable"]
-    pr_properties["mergeable_state"] = pull_request_details["mergeable_state"]
-    pr_properties["description"] = pull_request.body
-    pr_properties["commit_messages"] = pull_request_details["commit_messages"]
-
-    # TBD: when the PR contains a Jira key or other PR reference
-    # this additional info should be fetched and fed to pr_properties/AI too.
+    pr_properties["author"] = pull_request["user"]["login"] if pull_request.get("user") else None
+    pr_properties["created_at"] = pull_request["created_at"]
+    pr_properties["updated_at"] = pull_request["updated_at"]
+    pr_properties["description"] = pull_request["body"]
+    if pull_request_details is not None:
+        pr_properties["requested_reviewers"] = list(pull_request_details["requested_reviewers"])
+        for name in DETAIL_FIELDS[1:]:
+            pr_properties[name] = pull_request_details[name]
 
     return pr_properties
 
 
-def get_pull_request_list(github_api, org, repo, author):
+def set_details_loader(github_api, pr_properties):
+    """
+    Fetch the `DETAIL_FIELDS` of the pull request when one of them is accessed
+    """
+    repo = pr_properties["repo"]
+    pull_request = {"number": pr_properties["number"], "html_url": pr_properties["html_url"]}
+
+    def load():
+        pull_request_details = get_pull_request_details(github_api, repo, pull_request)
+        return {**{name: pull_request_details[name] for name in DETAIL_FIELDS[1:]},
+                "requested_reviewers": list(pull_request_details["requested_reviewers"])}
+
+    pr_properties.set_lazy(DETAIL_FIELDS, load)
+
+
+def set_commit_messages_loader(github_api, pr_properties):
+    """
+    Fetch the commit messages of the pull request when they are accessed
+    """
+    repo = pr_properties["repo"]
+    pull_number = pr_properties["number"]
+    html_url = pr_properties["html_url"]
+    pr_properties.set_lazy(["commit_messages"], lambda: {
+        "commit_messages": get_pull_request_commit_messages(github_api, repo, pull_number, html_url)
+    })
+
+
+def get_pull_request_list(github_api, org, repo, author, fields="summary"):
     """
     Return a list of pull requests with their properties
     """
-    pull_request_list = []
-    res = None
-    archived_repos = []
+    return list(iter_pull_requests(github_api, org, repo, author, fields))
+
 
+def pull_request_query(org, repo, author, created=None):
+    """
+    Return the search query for the open pull requests, `created` is a range
+    of creation dates like `2025-01-01..2025-06-30`
+    """
+    query = f"repo:{org}/{repo}" if repo else f"org:{org}"
+    query += " type:pr is:open archived:false"
     if author:
-        author_query = f" author:{author}"
-    else:
-        author_query = ""
+        query += f" author:{author}"
+    if created:
+        query += f" created:{created}"
+    return query
 
+
+def iter_pull_requests(github_api, org, repo, author, fields="summary", created=None, raise_errors=False):
+    """
+    Yield the pull requests with their properties one by one, see
+    `pull_request_query` for `created` and `search_pull_requests` for `raise_errors`
+    """
     if repo:
         logger.info(f"Fetching pull requests from one repository: {org}/{repo}")
-        query = f"repo:{org}/{repo} type:pr is:open{author_query}"
         entire_org = False
     else:
         logger.info(f"Fetching pull requests from an entire organisation: {org}")
-        query = f"org:{org} type:pr is:open{author_query}"
         entire_org = True
-        archived_repos = get_archived_repos(github_api, org)
 
+    query = pull_request_query(org, repo, author, created)
     logger.info(f"Query: {query}")
 
-    try:
-        res = github_api.search.issues_and_pull_requests(q=query, per_page=100, sort="updated", order="asc")
-    except Exception as e:  # pylint: disable=broad-exception-caught
-        logger.error("Couldn't get any pull requests.", e)
+    for pull_request in search_pull_requests(github_api, query, raise_errors=raise_errors):
+        if entire_org:  # necessary when iterating over an organisation
+            repo = pull_request.repository_url.split('/')[-1]
+
+        logger.info(f" * Processing {pull_request.html_url} ...")
+        with metrics.stage("enrich"):
+            pr_properties = get_pull_request_properties(github_api, pull_request, org, repo, fields)
+        yield pr_properties
+
+
+def search_pull_requests(github_api, query, per_page=100, raise_errors=False):
+    """
+    Yield all search results of `query`, page by page.
+    The search API returns at most 1000 results.
+    A failed search ends the results unless `raise_errors` is set.
+    """
+    for page in range(1, SEARCH_MAX_RESULTS // per_page + 1):
+        try:
+            with metrics.stage("search"):
+                res = github_api.search.issues_and_pull_requests(q=query, per_page=per_page, page=page,
+                                                                 sort="updated", order="asc")
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if raise_errors:
+                raise
+            logger.error(f"Couldn't get any pull requests. {e}")
+            return
 
-    if res is not None:
         pull_requests = res["items"]
         logger.info(f"{len(pull_requests)} pull requests retrieved.")
+        yield from pull_requests
 
-        for pull_request in pull_requests:
-            if entire_org:  # necessary when iterating over an organisation
-                repo = pull_request.repository_url.split('/')[-1]
-                if archived_repos and repo in archived_repos:
-                    logger.info(f" * Repository '{org}/{repo}' is archived or disabled. Skipping.")
-                    continue
+        if len(pull_requests) < per_page or page * per_page >= res["total_count"]:
+            return
 
-            logger.info(f" * Processing {pull_request.html_url} ...")
-            pull_request_props = get_pull_request_properties(github_api, pull_request, org, repo)
-            pull_request_list.append(pull_request_props)
 
-    return pull_request_list
+def _jira_link_exists(jira_key):
+    """
+    Return True/False if the Jira issue exists or None if that is unknown
+    """
+    try:
+        response = http_transport.request("HEAD", f"{JIRA_HOST}/browse/{jira_key}", timeout=3)
+    except requests.RequestException as e:
+        logger.warning(f"Couldn't verify the Jira link for {jira_key}: {e}")
+        return None
+    metrics.record_response(response)
+    return response.status_code == 200
+
+
+def verify_jira_links(jira_keys):
+    """
+    Return a dictionary telling for each Jira key if its link exists.
+    Keys not in `jira_link_cache` are checked concurrently.
+    """
+    ret = {}
+    missing = []
+    for jira_key in dict.fromkeys(jira_keys):
+        exists = jira_link_cache.get(jira_key)
+        if exists is None:
+            missing.append(jira_key)
+        else:
+            ret[jira_key] = exists
+
+    if missing:
+        logger.debug(f"Verifying {len(missing)} Jira links")
+        with metrics.stage("links"), ThreadPoolExecutor(max_workers=JIRA_LINK_CHECK_WORKERS) as executor:
+            results = dict(zip(missing, executor.map(_jira_link_exists, missing)))
+        # don't remember failed checks, they should be retried the next time
+        jira_link_cache.set_many({k: v for k, v in results.items() if v is not None})
+        ret.update({k: bool(v) for k, v in results.items()})
+
+    return ret
 
 
 def generate_jira_link(jira_key):
@@ -177,13 +378,12 @@ def generate_jira_link(jira_key):
     Generate a Jira link and verify that it exists
     """
     jira_url = f"{JIRA_HOST}/browse/{jira_key}"
-    response = requests.head(jira_url, timeout=3)
-    return f"<{jira_url}|:jira-1992:{jira_key}>" if response.status_code == 200 else jira_key
+    exists = verify_jira_links([jira_key])[jira_key]
+    return f"<{jira_url}|:jira-1992:{jira_key}>" if exists else jira_key
 
 
 def find_all_jira_keys(text):
-    match = re.findall(rf"(?:\W|^)({JIRA_RE_KEY})(?:\W|$)", text)
-    return match
+    return jira_key_matcher.find_all(text)
 
 def find_jira_key(pr_title, pr_html_url):
     """
@@ -191,9 +391,9 @@ def find_jira_key(pr_title, pr_html_url):
     """
     pr_title_link = f"<{pr_title}|{pr_html_url}>"
 
-    match = re.match(rf"({JIRA_RE_KEY})([: -]+)(.+)", pr_title)
+    match = jira_key_matcher.match_prefix(pr_title)
     if match:
-        jira_key, separator, title_remainder = match.groups()
+        jira_key, separator, title_remainder = match
         if jira_key:
             pr_title_link = f"{generate_jira_link(jira_key)}{separator}<{title_remainder}|{pr_html_url}>"
 
@@ -213,21 +413,123 @@ class ConsoleFormatter(logging.Formatter):
 
 
 class DataProcessor:
-    def __init__(self, owner, repo, author, github_token):
-        self.owner = owner
+    def __init__(self, owner, repo, author, github_token, index=None, fields="summary", rate_budget=None,
+                 shard_runner=None, deadline=None, raise_errors=False):
+        """
+        `owner` is an organisation or a list of them, several organisations are
+        fetched concurrently within `rate_budget` (default: a new `utils.RateBudget`).
+        Pull requests are only listed once, even if found in several of them.
+
+        With a `pr_index.PullRequestIndex` as `index`, the pull requests are
+        read from it instead of GitHub as long as it is reconciled regularly.
+
+        `fields` is one of `FIELD_PROFILES`, the fields it doesn't contain
+        are fetched when they are accessed.
+
+        With a `shards.ShardRunner` as `shard_runner`, the search is split
+        into shards which are fetched by its workers.
+
+        With a `utils.Deadline` as `deadline`, `process()` stops when it's
+        reached and sets `partial`, the pull requests so far are kept.
+        The same happens when the circuit breaker of an endpoint is open.
+
+        With `raise_errors` a failed search raises instead of ending the
+        pull requests early, see `search_pull_requests`.
+        """
+        if fields not in FIELD_PROFILES:
+            raise ValueError(f"Unknown field profile '{fields}', use one of {', '.join(FIELD_PROFILES)}")
+        self.owners = list(owner) if isinstance(owner, (list, tuple)) else [owner]
+        self.owner = self.owners[0]
         self.repo = repo
         self.author = author
         self.github_token = github_token
-        self.github_api = GhApi(owner=owner, token=github_token)
+        self.index = index
+        self.fields = fields
+        self.shard_runner = shard_runner
+        self.raise_errors = raise_errors
+        if rate_budget is None and len(self.owners) > 1:
+            rate_budget = RateBudget()
+        # `pulls.get` etc. use the owner of the API object
+        self.github_apis = {}
+        for org in self.owners:
+            self.github_apis[org] = InstrumentedGhApi(owner=org, token=github_token, gh_host=GITHUB_API_URL)
+            self.github_apis[org].rate_budget = rate_budget
+            self.github_apis[org].deadline = deadline
+        self.github_api = self.github_apis[self.owner]
 
         self.with_jira = []
         self.without_jira = []
+        self.partial = False
+        # filled by `collect_related_issues`
         self.unique_sorted_epics = []
         self.related_issues = {}
         self.data_collection = {}
         self.data_collection_jira = {}
 
-    def process(self):
+    def _pull_requests(self, org, cache):
+        """
+        Return the pull requests of one organisation, as an iterator while they are searched
+        """
+        github_api = self.github_apis[org]
+        logger.debug(f"Fetching pull requests for {org}/{self.repo} assigned to {self.author}")
+
+        if cache.cache_on:
+            return cache.cached_result(
+                f"get_pull_request_list_{org}_{self.repo}_{self.author}",
+                get_pull_request_list,
+                github_api=github_api,
+                org=org,
+                repo=self.repo,
+                author=self.author,
+                fields=self.fields
+            )
+
+        # while the search fails fast, any complete scan is better than nothing
+        search_unavailable = circuit_breaker.get("github GET /search/issues").is_open()
+        pull_requests = None
+        if self.index is not None:
+            with metrics.stage("index"):
+                if search_unavailable:
+                    pull_requests = self.index.fresh_pull_requests(org, self.repo, self.author, max_age=math.inf)
+                else:
+                    pull_requests = self.index.fresh_pull_requests(org, self.repo, self.author)
+        if pull_requests is not None:
+            if search_unavailable:
+                logger.warning(f"Searching GitHub fails, using the outdated pull request index of {org}.")
+            for pull_request in pull_requests:
+                # the reconciliation only stores the search results
+                if not pull_request.is_loaded("mergeable_state"):
+                    set_details_loader(github_api, pull_request)
+                set_commit_messages_loader(github_api, pull_request)
+                if self.fields == "full":
+                    pull_request["commit_messages"]  # pylint: disable=pointless-statement
+            return pull_requests
+
+        if self.index is not None:
+            logger.warning(f"The pull request index of {org} is outdated, searching instead.")
+        if self.shard_runner is not None:
+            return self.shard_runner.pull_requests(github_api, org, self.repo, self.author, self.fields)
+        # process the pull requests while they are fetched
+        return iter_pull_requests(github_api, org, self.repo, self.author, self.fields,
+                                  raise_errors=self.raise_errors)
+
+    def _pull_requests_of_all_owners(self, cache):
+        """
+        Yield the pull requests of all organisations, each organisation as soon as it's complete
+        """
+        with ThreadPoolExecutor(max_workers=len(self.owners)) as executor:
+            futures = [executor.submit(lambda org: list(self._pull_requests(org, cache)), org)
+                       for org in self.owners]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def process(self, on_item=None):
+        """
+        Fetch and classify all pull requests.
+
+        `on_item(section, item)` is called for every pull request as soon as
+        it is processed, with `section` being "with_jira" or "without_jira".
+        """
         if os.getenv("PR_BEST_PRACTICES_TEST_CACHE"):
             logger.info("Loading cache…")
             import requests_cache
@@ -241,30 +543,98 @@ class DataProcessor:
         else:
             cache = Cache(None)  # indicates not to use cache
 
-        logger.debug(f"Fetching pull requests for {self.owner}/{self.repo} assigned to {self.author}")
-
-        pull_request_list = cache.cached_result(
-            f"get_pull_request_list_{self.owner}_{self.repo}_{self.author}",
-            get_pull_request_list,
-            github_api=self.github_api,
-            org=self.owner,
-            repo=self.repo,
-            author=self.author
-        )
-
-        jira_pattern = re.compile(r"\b[A-Z]+-\d+\b")
-        # also extend the item to include the "jira_key" field
-        for item in pull_request_list:
-            item['jira_keys'] = re.findall(jira_pattern, item['title'])
-            if item['jira_keys'] and len(item['jira_keys']) > 0:
+        try:
+            if len(self.owners) == 1:
+                pull_requests = self._pull_requests(self.owner, cache)
+            else:
+                pull_requests = self._pull_requests_of_all_owners(cache)
+            self._classify(pull_requests, on_item)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Stopped after {len(self.with_jira) + len(self.without_jira)} pull requests: {e}")
+            self.partial = True
+
+    def _classify(self, pull_requests, on_item):
+        seen = set()
+        batch = []
+        try:
+            for item in pull_requests:
+                if item['html_url'] in seen:
+                    continue
+                seen.add(item['html_url'])
+                batch.append(item)
+                if len(batch) >= CLASSIFY_BATCH_SIZE:
+                    items, batch = batch, []
+                    self._classify_batch(items, on_item)
+        finally:
+            # also the pull requests fetched before an error
+            self._classify_batch(batch, on_item)
+
+    def _classify_batch(self, items, on_item):
+        # also extend the items to include the "jira_key" field
+        for item, matches in zip(items, jira_key_matcher.scan(item['title'] for item in items)):
+            item['jira_keys'] = [match.key for match in matches]
+            if item['jira_keys']:
                 # make the first one the "main" key
                 item['jira_key'] = item['jira_keys'][0]
                 item['jira_url'] = f"{JIRA_HOST}/browse/{item['jira_key']}"
                 self.with_jira.append(item)
+                section = "with_jira"
             else:
                 item['jira_key'] = None
                 item['jira_url'] = None
                 self.without_jira.append(item)
+                section = "without_jira"
+
+            if on_item:
+                on_item(section, item)
+
+    def collect_related_issues(self, jira_data_processor):
+        """
+        Fetch the Jira issues of all pull requests and their epics with
+        `jira_data_processor` (a `get_jira_sprint.JiraDataProcessor`), every
+        issue only once and in bulk. Call it after `process()`.
+
+        Fills `related_issues` (issues and epics by key), `unique_sorted_epics`
+        (the keys of all epics) and `data_collection_jira` (the pull requests
+        by epic key, pull requests of issues without an epic aren't listed).
+        """
+        keys = dict.fromkeys(key for pr in self.with_jira for key in pr["jira_keys"])
+        with metrics.stage("epics"):
+            issues = {issue["key"]: issue for issue in jira_data_processor.get_issues(keys)} if keys else {}
+            epic_keys = {issue["epic"] for issue in issues.values() if issue.get("epic")}
+            missing = [key for key in epic_keys if key not in issues]
+            if missing:
+                issues.update((issue["key"], issue) for issue in jira_data_processor.get_issues(missing))
+
+        def epic_of(key):
+            issue = issues.get(key)
+            if issue is None:
+                return None
+            if (issue.get("issue_type") or "").lower() == "epic":
+                return key
+            return issue.get("epic")
+
+        by_epic = {}
+        for pr in self.with_jira:
+            for epic in dict.fromkeys(epic_of(key) for key in pr["jira_keys"]):
+                if epic is not None:
+                    by_epic.setdefault(epic, []).append(pr)
+
+        self.related_issues = issues
+        self.unique_sorted_epics = sorted(epic_keys | by_epic.keys(), key=_jira_key_order)
+        self.data_collection_jira = {epic: by_epic[epic] for epic in self.unique_sorted_epics if epic in by_epic}
+        return self.data_collection_jira
+
+
+def _jira_key_order(key):
+    project, _, number = key.rpartition("-")
+    return project, int(number) if number.isdigit() else 0
+
+
+def _format_size(pull_request):
+    if not pull_request.is_loaded("additions"):
+        return ""
+    return f" (+{pull_request['additions']}/-{pull_request['deletions']})"
 
 
 def main():
@@ -284,11 +654,32 @@ def main():
         token_arg_required = True
 
     parser.add_argument("--github-token", help="Set a token for github.com", required=token_arg_required)
-    parser.add_argument("--org", help="Set an organisation on github.com", required=True)
+    parser.add_argument("--org", help="Set an organisation on github.com, several comma separated", required=True)
     parser.add_argument("--repo", help="Set a repo in `--org` on github.com", required=False)
     parser.add_argument("--author", help="Author of pull requests", required=False)
     parser.add_argument("--dry-run", help="Don't send Slack notifications", default=False,
                         action=argparse.BooleanOptionalAction)
+    parser.add_argument("--output-format", choices=["json", "jsonl"], default="json",
+                        help="Write `pr_data_collection.json` at the end (json) or "
+                        "stream one pull request per line into `pr_data_collection.jsonl` (jsonl)")
+    parser.add_argument("--fields", choices=FIELD_PROFILES, default="full",
+                        help="Fields fetched for every pull request: the search result only (minimal), "
+                        "plus additions, reviewers, mergeability etc. (summary) or also the commit messages (full)")
+    parser.add_argument("--related-issues", action="store_true",
+                        help="Also fetch the Jira issues of the pull requests and their epics, "
+                        "written as `related_issues` and the pull requests per epic as `epics`")
+    parser.add_argument("--warehouse", metavar="FILE",
+                        help="Also add the pull requests to the SQLite database FILE, see `warehouse.py`")
+    parser.add_argument("--shard-workers", type=int, metavar="N",
+                        help="Split the search into ranges of creation dates with at most `SHARD_SIZE` "
+                        "(default: 500) pull requests and fetch them in N processes, see `shards.py`")
+    parser.add_argument("--shard-lambda", metavar="FUNCTION",
+                        help="Fetch the shards with asynchronous invocations of the AWS Lambda FUNCTION instead, "
+                        "at most `--shard-workers` (default: 10) at a time. "
+                        "The results are exchanged via `STATE_STORE`")
+    parser.add_argument("--metrics", help="Print request counts and stage timings as JSON to stderr at the end",
+                        action="store_true")
+    add_profile_argument(parser)
     parser.add_argument("--quiet", help="No info logging. Use for automations", action="store_true")
     parser.add_argument("--debug", help="Enable debug logging", action="store_true")
     parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
@@ -299,10 +690,15 @@ def main():
         sys.exit(0)
 
     args = parser.parse_args()
+    start_profiling(args.profile)
 
     # Assert that --quiet and --debug cannot be used together
     if args.quiet and args.debug:
         parser.error("The --quiet and --debug options cannot be used together.")
+    if args.related_issues and not (JIRA_TOKEN and os.getenv("JIRA_BOARD_ID")):
+        parser.error("--related-issues needs the JIRA_TOKEN and JIRA_BOARD_ID environment variables.")
+    if args.shard_lambda and not os.getenv("STATE_STORE"):
+        parser.error("--shard-lambda needs the STATE_STORE environment variable.")
 
     if args.debug:
         logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -318,36 +714,89 @@ def main():
         logger.addHandler(handler)
         logger.propagate = False
 
-    data_processor = DataProcessor(args.org, args.repo, args.author, args.github_token)
-    data_processor.process()
-
-    with open("pr_data_collection.json", "w") as f:
-        data = {"with_jira": data_processor.with_jira, "without_jira": data_processor.without_jira}
-        f.write(json.dumps(data, indent=2))
+    github_token = args.github_token or os.getenv("GITHUB_TOKEN")
+    shard_runner = None
+    if args.shard_lambda:
+        from shards import LambdaShardRunner
+        from state_store import open_store
+        store = open_store()
+        if store is None:
+            parser.error("--shard-lambda needs the STATE_STORE environment variable.")
+        shard_runner = LambdaShardRunner(args.shard_lambda, store, github_token, workers=args.shard_workers or 10)
+    elif args.shard_workers:
+        from shards import ProcessShardRunner
+        shard_runner = ProcessShardRunner(github_token, args.shard_workers)
+
+    # the warehouse can only mark pull requests as closed after a search which didn't fail
+    data_processor = DataProcessor(split_list(args.org), args.repo, args.author, args.github_token, fields=args.fields,
+                                   shard_runner=shard_runner, raise_errors=bool(args.warehouse))
+
+    def collect_related_issues():
+        from get_jira_sprint import JiraDataProcessor
+        jira_data_processor = JiraDataProcessor(JIRA_TOKEN, jira_board_id=split_list(os.getenv("JIRA_BOARD_ID")))
+        data_processor.collect_related_issues(jira_data_processor)
+        logger.info(f"Pull requests of {len(data_processor.unique_sorted_epics)} epics: "
+                    f"{', '.join(data_processor.unique_sorted_epics)}")
+        return {epic: [pr["html_url"] for pr in pull_requests]
+                for epic, pull_requests in data_processor.data_collection_jira.items()}
+
+    if args.output_format == "jsonl":
+        with JsonLinesWriter("pr_data_collection.jsonl") as writer:
+            data_processor.process(on_item=lambda section, item: writer.write(
+                {"section": section, **item.to_dict(load=False)}))
+            if args.related_issues:
+                epics = collect_related_issues()
+                for issue in data_processor.related_issues.values():
+                    writer.write({"section": "related_issues", **issue,
+                                  "pull_requests": epics.get(issue["key"], [])})
+    else:
+        data_processor.process()
+        # only the fields of `--fields`, without fetching the others
+        data = {"with_jira": [item.to_dict(load=False) for item in data_processor.with_jira],
+                "without_jira": [item.to_dict(load=False) for item in data_processor.without_jira]}
+        if args.related_issues:
+            data["epics"] = collect_related_issues()
+            data["related_issues"] = data_processor.related_issues
+        write_json("pr_data_collection.json", data, indent=2)
+
+    if args.warehouse:
+        from warehouse import Warehouse
+        pull_requests = data_processor.with_jira + data_processor.without_jira
+        with Warehouse(args.warehouse) as warehouse:
+            # only a search of everything tells which pull requests were closed
+            complete = (data_processor.raise_errors and not data_processor.partial
+                        and not args.repo and not args.author
+                        and (shard_runner.complete if shard_runner is not None
+                             else len(pull_requests) < SEARCH_MAX_RESULTS))
+            warehouse.add_pull_requests(pull_requests, data_processor.owners, complete=complete)
+            if args.related_issues:
+                warehouse.add_issues(data_processor.related_issues.values())
+
+    # verify all links of the report at once
+    title_prefixes = (jira_key_matcher.match_prefix(pull_request['title'])
+                      for pull_request in data_processor.with_jira + data_processor.without_jira)
+    verify_jira_links(match[0] for match in title_prefixes if match)
 
     logger.info(f"# Pull requests with Jira keys: {len(data_processor.with_jira)}")
     for pull_request in data_processor.with_jira:
         pr_title_link = find_jira_key(pull_request['title'], pull_request['html_url'])
-        entry = (
-            f"*{pull_request['repo']}*: {pr_title_link}"
-            f" (+{pull_request['additions']}/-{pull_request['deletions']})"
-        )
+        entry = f"*{pull_request['repo']}*: {pr_title_link}{_format_size(pull_request)}"
         logger.info(entry)
     
     logger.info("---") # spacer for console output
     logger.info(f"# Pull requests without Jira keys: {len(data_processor.without_jira)}")
     for pull_request in data_processor.without_jira:
         pr_title_link = find_jira_key(pull_request['title'], pull_request['html_url'])
-        entry = (
-            f"*{pull_request['repo']}*: {pr_title_link}"
-            f" (+{pull_request['additions']}/-{pull_request['deletions']})"
-        )
+        entry = f"*{pull_request['repo']}*: {pr_title_link}{_format_size(pull_request)}"
         logger.info(entry)
 
     logger.info(f"Stats:")
     logger.info(f"PRs with jira key: {len(data_processor.with_jira)}")
     logger.info(f"PRs without jira key: {len(data_processor.without_jira)}")
 
+    if args.metrics:
+        metrics.write_summary()
+
 
 if __name__ == "__main__":
     main()
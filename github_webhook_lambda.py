@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+AWS Lambda function receiving GitHub webhooks (via a "Function URL")
+and keeping the index of open pull requests of `pr_index.py` up to date.
+
+Configure an organisation webhook for the `pull_request` and `repository`
+events with the secret in `GITHUB_WEBHOOK_SECRET`.
+A scheduled event `{"reconcile": true}` replaces the index by a complete
+scan of every organisation of `GITHUB_ORGANIZATION` (comma separated) using `GITHUB_TOKEN`.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+
+from get_pull_requests import InstrumentedGhApi, GITHUB_API_URL
+from metrics import metrics
+from pr_index import PullRequestIndex, reconcile
+from state_store import open_store
+from utils import profile_from_env, split_list
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def _response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(body),
+    }
+
+
+def _get_header(headers, name):
+    # Function URLs pass lower case headers
+    name = name.lower()
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def verify_signature(secret, body, signature):
+    """
+    Check the `X-Hub-Signature-256` header of a webhook
+    """
+    if not secret or not signature:
+        return False
+    expected = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _handle_webhook(event, index):
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded", False):
+        body = base64.b64decode(body)
+    else:
+        body = body.encode("utf-8")
+
+    headers = event.get("headers")
+    if not verify_signature(os.environ.get("GITHUB_WEBHOOK_SECRET"), body,
+                            _get_header(headers, "X-Hub-Signature-256")):
+        return _response(401, {"error": "Invalid request signature"})
+
+    event_name = _get_header(headers, "X-GitHub-Event")
+    if event_name == "ping":
+        return _response(200, {"result": "pong"})
+
+    payload = json.loads(body)
+    with metrics.stage("index"):
+        result = index.apply_webhook(event_name, payload)
+    logger.info(f"{event_name} {payload.get('action')}: {result}")
+    return _response(200, {"result": result})
+
+
+def lambda_handler(event, context):
+    # the module stays loaded between invocations of a warm Lambda
+    metrics.reset()
+    function_name = getattr(context, "function_name", "github_webhook")
+    try:
+        with profile_from_env(f"/tmp/{function_name}.pstats"):
+            return _lambda_handler(event)
+    finally:
+        metrics.log_emf(function_name)
+
+
+def _lambda_handler(event):
+    store = open_store()
+    if store is None:
+        return _response(500, {"error": "I'm not configured properly"})
+    index = PullRequestIndex(store)
+
+    if event.get("reconcile"):
+        # every organisation has its own index
+        reconciled = {}
+        for org in split_list(event.get("github_organization") or os.environ.get("GITHUB_ORGANIZATION")):
+            github_api = InstrumentedGhApi(owner=org, token=os.environ.get("GITHUB_TOKEN"), gh_host=GITHUB_API_URL)
+            reconciled[org] = reconcile(index, github_api, org)
+        return {"reconciled": reconciled}
+
+    return _handle_webhook(event, index)
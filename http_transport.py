@@ -0,0 +1,79 @@
+"""
+One HTTP transport for all GitHub and Jira REST calls of a process.
+
+`get_session()` returns a `requests.Session` shared by all scripts, so
+connections are kept alive and reused instead of paying a new TLS
+handshake for every call, and responses are compressed with gzip.
+
+ * `HTTP_POOL_SIZE` - connections kept per host (default: 16)
+ * `HTTP_TIMEOUT` - seconds to wait for a response (default: 30)
+
+`request()` is `Session.request` with that timeout, `GhApi` uses it
+through `get_pull_requests.InstrumentedGhApi`. Sessions created by
+libraries, like the one of the `jira` client, use the same connection
+pool after `share_connections(session)`.
+"""
+
+import os
+import threading
+
+import requests
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+_session = None
+_adapter = None
+_session_lock = threading.RLock()
+
+
+def _get_adapter():
+    global _adapter
+    with _session_lock:
+        if _adapter is None:
+            _adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        return _adapter
+
+
+def get_session():
+    """
+    Return the shared keep-alive session, created on first use.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["Accept-Encoding"] = "gzip, deflate"
+            share_connections(_session)
+        return _session
+
+
+def share_connections(session):
+    """
+    Let `session` use the shared connection pool, returns `session`.
+    """
+    adapter = _get_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send a request with the shared session, see `requests.request` for the arguments.
+    """
+    return get_session().request(method, url, timeout=timeout or HTTP_TIMEOUT, **kwargs)
+
+
+def close():
+    """
+    Close all connections, the next request opens new ones.
+    """
+    global _session, _adapter
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        if _adapter is not None:
+            _adapter.close()
+            _adapter = None
@@ -5,7 +5,9 @@ import os
 import sys
 
 from jira import JIRA
-from utils import UserMap, format_help_as_md
+from metrics import metrics
+import http_transport
+from utils import UserMap, add_profile_argument, format_help_as_md, start_profiling
 
 JIRA_SERVER = os.getenv("JIRA_SERVER", "https://redhat.atlassian.net")
 DEFAULT_PROJECT_KEY = os.getenv("DEFAULT_PROJECT_KEY", "HMS")
@@ -56,8 +58,10 @@ def create_jira_task(token, email, project_key, summary,
     create_jira_task creates a jira issue with the given parameter
     """
     try:
-        jira = JIRA(server=JIRA_SERVER,
-                    basic_auth=(email, token))
+        with metrics.stage("connect"):
+            jira = JIRA(server=JIRA_SERVER,
+                        basic_auth=(email, token))
+        metrics.instrument_session(http_transport.share_connections(jira._session))
         print(f"Connected to Jira ({JIRA_SERVER}).", file=sys.stderr)
     # pylint: disable=broad-exception-caught
     except Exception as e:
@@ -65,7 +69,9 @@ def create_jira_task(token, email, project_key, summary,
         return
 
     # Check if Epic exists
-    if not is_epic_issue(jira, epic_link):
+    with metrics.stage("epic"):
+        is_epic = is_epic_issue(jira, epic_link)
+    if not is_epic:
         print(f"🔴 The Jira issue '{epic_link}' does not exist or is not of issuetype Epic.", file=sys.stderr)
         sys.exit(1)
 
@@ -91,7 +97,8 @@ def create_jira_task(token, email, project_key, summary,
         issue_dict['components'] = [{'name': component}]
 
     try:
-        new_issue = jira.create_issue(fields=issue_dict)
+        with metrics.stage("create"):
+            new_issue = jira.create_issue(fields=issue_dict)
         print(f"🟢 Task created successfully: {new_issue.key}", file=sys.stderr)
         print(new_issue.key)
     # pylint: disable=broad-exception-caught
@@ -128,6 +135,9 @@ def main():
                         help=f"The component (default: '{DEFAULT_COMPONENT}').")
     parser.add_argument('--assignees-yaml', default='usermap.yaml',
                         help="Path to the YAML file containing GitHub-to-Jira username mappings (default: usermap.yaml).")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Print request counts and stage timings as JSON to stderr at the end.")
+    add_profile_argument(parser)
     parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
 
     # workaround that required attribute are not given for --help-md
@@ -136,22 +146,27 @@ def main():
         sys.exit(0)
 
     args = parser.parse_args()
+    start_profiling(args.profile)
 
     assignee_mapping = UserMap(args.assignees_yaml)
 
     # Call the task creation function with parsed arguments
-    create_jira_task(
-        token=args.token,
-        email=args.email,
-        project_key=args.project_key,
-        summary=args.summary,
-        description=args.description,
-        issue_type=args.issuetype,
-        epic_link=args.epic_link,
-        component=args.component,
-        assignee=args.assignee,
-        story_points=args.story_points
-    )
+    try:
+        create_jira_task(
+            token=args.token,
+            email=args.email,
+            project_key=args.project_key,
+            summary=args.summary,
+            description=args.description,
+            issue_type=args.issuetype,
+            epic_link=args.epic_link,
+            component=args.component,
+            assignee=args.assignee,
+            story_points=args.story_points
+        )
+    finally:
+        if args.metrics:
+            metrics.write_summary()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+"""
+Local copy of the Jira issues of a JQL query, refreshed incrementally.
+
+The first sync fetches all issues of the query. Later syncs only fetch
+the issues of the query updated since the last sync and the keys of the
+issues which were updated and aren't part of the query anymore, so a
+refresh costs two small queries no matter how many issues the query has.
+Issues can leave a query without being updated (e.g. when a filter is
+changed), so everything is fetched again every `JIRA_FULL_SYNC_INTERVAL`
+seconds (default: 6 hours).
+"""
+
+import logging
+import math
+import os
+import re
+import time
+
+from records import Issue, Sprint
+
+logger = logging.getLogger(__name__)
+
+JIRA_FULL_SYNC_INTERVAL = int(os.getenv("JIRA_FULL_SYNC_INTERVAL", str(6 * 3600)))
+
+# overlap of incremental syncs, covering clock skew and Jira's minute resolution
+SYNC_OVERLAP_MINUTES = 2
+
+
+def _issue_from_json(data):
+    return Issue(**{**data, "sprint": [Sprint(**sprint) for sprint in data.get("sprint") or []]})
+
+
+class JiraIssueStore:
+    def __init__(self, store, prefix="jira_issues", full_sync_interval=None):
+        """
+        `store` is a store of `state_store.py`
+        """
+        self.store = store
+        self.prefix = prefix
+        self.full_sync_interval = JIRA_FULL_SYNC_INTERVAL if full_sync_interval is None else full_sync_interval
+
+    def _key(self, name):
+        name = re.sub(r"[^\w/.@-]", "_", name)
+        return f"{self.prefix}/{name}"
+
+    def stored(self, name, jql):
+        """
+        Return the issues of `jql` stored as `name` without syncing them, None if there are none
+        """
+        document = self.store.get_json(self._key(name))
+        if document is None or document["jql"] != jql:
+            return None
+        return [_issue_from_json(data) for data in document["issues"].values()]
+
+    def sync(self, name, jql, fetch_issues, fetch_keys, full=False):
+        """
+        Bring the issues of `jql` stored as `name` up to date and return them.
+
+        `fetch_issues(jql)` returns `Issue` records, `fetch_keys(jql)` only the keys.
+        """
+        key = self._key(name)
+        document = self.store.get_json(key)
+        now = time.time()
+
+        if (full or document is None or document["jql"] != jql
+                or now - document["full_sync_at"] > self.full_sync_interval):
+            logger.info(f"Full sync of the Jira issues '{name}'")
+            issues = fetch_issues(jql)
+            document = {
+                "jql": jql,
+                "full_sync_at": now,
+                "issues": {issue["key"]: issue.to_dict() for issue in issues},
+            }
+        else:
+            minutes = math.ceil((now - document["synced_at"]) / 60) + SYNC_OVERLAP_MINUTES
+            updated = f'updated >= "-{minutes}m"'
+            changed = fetch_issues(f"({jql}) and {updated}")
+            stored = document["issues"]
+            projects = sorted({k.rsplit("-", 1)[0] for k in stored})
+            removed = fetch_keys(f"project in ({', '.join(projects)}) and {updated} and not ({jql})") if projects else []
+            for issue_key in removed:
+                stored.pop(issue_key, None)
+            for issue in changed:
+                stored[issue["key"]] = issue.to_dict()
+            logger.info(f"Incremental sync of the Jira issues '{name}': "
+                        f"{len(changed)} changed, {len(removed)} left the query")
+
+        document["synced_at"] = now
+        self.store.put_json(key, document)
+        return [_issue_from_json(data) for data in document["issues"].values()]
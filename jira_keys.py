@@ -0,0 +1,138 @@
+"""
+Shared Jira key detection.
+
+All scripts should use the precompiled patterns and the `JiraKeyMatcher`
+from here instead of writing their own regular expressions, so they agree
+on what a Jira key looks like.
+
+A Jira key is the project key (an uppercase letter followed by uppercase
+letters, digits or underscores) a dash and the issue number, e.g. `HMS-123`
+or `RHEL9-42`.
+"""
+
+import bisect
+import re
+
+from collections import namedtuple
+
+JIRA_PROJECT_KEY = r"[A-Z][A-Z0-9_]+"
+JIRA_KEY = rf"{JIRA_PROJECT_KEY}-\d+"
+
+# a Jira key anywhere in a text, not glued to other word characters
+# group 1 is the key, group 2 the project key
+JIRA_KEY_RE = re.compile(rf"\b(({JIRA_PROJECT_KEY})-\d+)\b")
+# a Jira key at the very beginning of a text followed by a separator
+# e.g. "HMS-123: fix something"
+JIRA_KEY_PREFIX_RE = re.compile(rf"({JIRA_KEY})([: -]+)(.+)")
+# our pull request title schema "component: This describes the change (HMS-123)"
+JIRA_TITLE_SCHEMA_RE = re.compile(rf"(.*[?<=:])(.*[?<= \(])(\({JIRA_KEY}\))")
+# the reference `update_pr.py` writes into the pull request description
+JIRA_DESCRIPTION_REFERENCE_RE = re.compile(
+    rf"JIRA: \[{JIRA_KEY}\]\(https:\/\/issues.redhat.com\/browse\/{JIRA_KEY}\)"
+)
+# the `/jira-epic HMS-123` slash command, case insensitive as it's typed by humans
+JIRA_EPIC_COMMAND_RE = re.compile(rf"/jira-epic \b({JIRA_KEY})\b", re.IGNORECASE)
+
+JiraKeyMatch = namedtuple("JiraKeyMatch", ["key", "project", "start", "end"])
+
+# texts of a batch are joined with this separator which can't be part of a key
+_BATCH_SEPARATOR = "\n"
+
+
+class JiraKeyMatcher:
+    """
+    Find Jira keys in texts.
+
+    With `projects` set, only keys of those projects are reported which
+    avoids false positives like `UTF-8` or `SHA-256`.
+    """
+
+    def __init__(self, projects=None):
+        self.projects = frozenset(p.upper() for p in projects) if projects else None
+
+    def _allowed(self, project):
+        return self.projects is None or project in self.projects
+
+    def find_spans(self, text):
+        """
+        Return a list of `JiraKeyMatch` for all keys found in `text`.
+        """
+        ret = []
+        if not text:
+            return ret
+        for match in JIRA_KEY_RE.finditer(text):
+            key, project = match.groups()
+            if self._allowed(project):
+                start, end = match.span(1)
+                ret.append(JiraKeyMatch(key, project, start, end))
+        return ret
+
+    def find_all(self, text):
+        """
+        Return all keys found in `text` in order of appearance.
+        """
+        return [m.key for m in self.find_spans(text)]
+
+    def find_first(self, text):
+        """
+        Return the first key found in `text` or `None`.
+        """
+        if not text:
+            return None
+        for match in JIRA_KEY_RE.finditer(text):
+            key, project = match.groups()
+            if self._allowed(project):
+                return key
+        return None
+
+    def match_prefix(self, text):
+        """
+        Match a key at the beginning of `text` (e.g. a pull request title).
+        Returns a tuple `(key, separator, remainder)` or `None`.
+        """
+        match = JIRA_KEY_PREFIX_RE.match(text or "")
+        if not match or not self._allowed(match.group(1).rsplit("-", 1)[0]):
+            return None
+        return match.groups()
+
+    def scan(self, texts):
+        """
+        Scan many texts at once.
+
+        Returns a list with one list of `JiraKeyMatch` per text, the spans being
+        relative to the respective text.
+        All texts are searched in one pass of the regular expression engine.
+        """
+        texts = [text or "" for text in texts]
+        ret = [[] for _ in texts]
+        if not texts:
+            return ret
+
+        # offsets of the beginning of each text within the joined text
+        offsets = []
+        position = 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + len(_BATCH_SEPARATOR)
+
+        joined = _BATCH_SEPARATOR.join(texts)
+        for match in JIRA_KEY_RE.finditer(joined):
+            key, project = match.groups()
+            if not self._allowed(project):
+                continue
+            start, end = match.span(1)
+            index = bisect.bisect_right(offsets, start) - 1
+            offset = offsets[index]
+            ret[index].append(JiraKeyMatch(key, project, start - offset, end - offset))
+        return ret
+
+
+# default matcher without a project allow-list
+matcher = JiraKeyMatcher()
+
+
+def find_all_jira_keys(text):
+    """
+    Return all Jira keys found in `text` using the default matcher.
+    """
+    return matcher.find_all(text)
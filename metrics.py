@@ -0,0 +1,208 @@
+"""
+Request counters and stage timings for all scripts and Lambda functions.
+
+`metrics` is one process wide instance. The fetchers report every request,
+retry, 429 and backoff sleep to it and wrap their work in named stages:
+
+    with metrics.stage("search"):
+        ...
+
+At the end of a run, `summary()` returns everything as a dictionary,
+`write_summary()` prints it as JSON and `log_emf()` prints it in the
+CloudWatch embedded metric format for AWS Lambda. `stage_breakdown()`
+splits the time of every stage into network wait, backoff sleep and CPU,
+as far as they happened in the thread of the stage.
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+EMF_NAMESPACE = "PrBestPractices"
+
+# IDs, but not API versions like `/rest/api/2`
+_ID_SEGMENT_RE = re.compile(r"(?<!/api)/\d+(?=/|$)")
+_JIRA_KEY_SEGMENT_RE = re.compile(r"/[A-Z][A-Z0-9_]+-\d+(?=/|$)")
+
+
+def endpoint_name(method, url):
+    """
+    Return a name like `GET /rest/api/2/issue/{key}` for a request,
+    grouping requests to the same endpoint with different IDs.
+    """
+    path = urlparse(url).path
+    path = _JIRA_KEY_SEGMENT_RE.sub("/{key}", path)
+    path = _ID_SEGMENT_RE.sub("/{id}", path)
+    return f"{method.upper()} {path}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # the stages running in the current thread, innermost last
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """
+        Start over, e.g. for every invocation of a warm AWS Lambda.
+        """
+        with self._lock:
+            self.started = time.perf_counter()
+            self.requests = Counter()
+            self.status_codes = Counter()
+            self.retries = 0
+            self.rate_limited = 0
+            self.bytes_received = 0
+            self.request_seconds = 0.0
+            self.backoff_seconds = 0.0
+            self.stages = defaultdict(float)
+            self.stage_request_seconds = defaultdict(float)
+            self.stage_backoff_seconds = defaultdict(float)
+            self.stage_cpu_seconds = defaultdict(float)
+
+    def _current_stage(self):
+        stages = getattr(self._local, "stages", None)
+        return stages[-1] if stages else None
+
+    def record_request(self, endpoint, status=None, nbytes=0, seconds=0.0):
+        with self._lock:
+            self.requests[endpoint] += 1
+            if status is not None:
+                self.status_codes[str(status)] += 1
+                if status == 429:
+                    self.rate_limited += 1
+            self.bytes_received += nbytes or 0
+            self.request_seconds += seconds
+            stage = self._current_stage()
+            if stage is not None:
+                self.stage_request_seconds[stage] += seconds
+
+    def record_response(self, response, *args, **kwargs):
+        """
+        Record a `requests.Response`, also usable as `requests` response hook.
+        """
+        self.record_request(
+            endpoint_name(response.request.method, response.url),
+            response.status_code,
+            len(response.content or b""),
+            response.elapsed.total_seconds(),
+        )
+
+    def record_backoff(self, seconds):
+        """
+        Record a retry after sleeping `seconds`.
+        """
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += seconds
+            stage = self._current_stage()
+            if stage is not None:
+                self.stage_backoff_seconds[stage] += seconds
+
+    def instrument_session(self, session):
+        """
+        Record all requests of a `requests.Session`.
+        """
+        session.hooks.setdefault("response", []).append(self.record_response)
+        return session
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure the wall time of a stage, repeated stages add up.
+        """
+        if not hasattr(self._local, "stages"):
+            self._local.stages = []
+        self._local.stages.append(name)
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self._local.stages.pop()
+            with self._lock:
+                self.stages[name] += time.perf_counter() - start
+                self.stage_cpu_seconds[name] += time.thread_time() - cpu_start
+
+    def summary(self):
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 3),
+                "requests": sum(self.requests.values()),
+                "requests_by_endpoint": dict(self.requests.most_common()),
+                "status_codes": dict(self.status_codes),
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "bytes_received": self.bytes_received,
+                "request_seconds": round(self.request_seconds, 3),
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "stages": {k: round(v, 3) for k, v in self.stages.items()},
+            }
+
+    def stage_breakdown(self):
+        """
+        Return the wall, network, backoff and CPU seconds of every stage.
+        Requests and backoffs count for the innermost stage only.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "wall": round(wall, 3),
+                    "network": round(self.stage_request_seconds[name], 3),
+                    "backoff": round(self.stage_backoff_seconds[name], 3),
+                    "cpu": round(self.stage_cpu_seconds[name], 3),
+                }
+                for name, wall in self.stages.items()
+            }
+
+    def write_summary(self, file=sys.stderr):
+        print(json.dumps(self.summary(), indent=2), file=file)
+
+    def emf(self, function_name, namespace=EMF_NAMESPACE):
+        """
+        Return the summary in the CloudWatch embedded metric format.
+        """
+        summary = self.summary()
+        values = {
+            "Requests": (summary["requests"], "Count"),
+            "Retries": (summary["retries"], "Count"),
+            "RateLimited": (summary["rate_limited"], "Count"),
+            "BytesReceived": (summary["bytes_received"], "Bytes"),
+            "RequestSeconds": (summary["request_seconds"], "Seconds"),
+            "BackoffSeconds": (summary["backoff_seconds"], "Seconds"),
+            "TotalSeconds": (summary["total_seconds"], "Seconds"),
+        }
+        for stage, seconds in summary["stages"].items():
+            values[f"Stage_{stage}_Seconds"] = (seconds, "Seconds")
+
+        ret = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [["FunctionName"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()],
+                }],
+            },
+            "FunctionName": function_name,
+            "requests_by_endpoint": summary["requests_by_endpoint"],
+            "status_codes": summary["status_codes"],
+        }
+        ret.update({name: value for name, (value, _) in values.items()})
+        return ret
+
+    def log_emf(self, function_name, namespace=EMF_NAMESPACE):
+        """
+        Print the embedded metric format line, CloudWatch picks it up from the Lambda log.
+        """
+        print(json.dumps(self.emf(function_name, namespace)), flush=True)
+
+
+metrics = Metrics()
@@ -1,23 +1,22 @@
 import argparse
-import re
 import os
 import subprocess
 import sys
-import requests
-from utils import format_help_as_md
+import http_transport
+from utils import add_profile_argument, format_help_as_md, start_profiling
+from jira_keys import JIRA_DESCRIPTION_REFERENCE_RE, JIRA_TITLE_SCHEMA_RE, find_all_jira_keys
 
 def check_jira_issues_public(text):
-    for match in re.findall(r"[A-Z][A-Z0-9]+-[0-9]+", text):
+    for match in find_all_jira_keys(text):
         url = f"https://issues.redhat.com/browse/{match}"
-        res = requests.get(url)
+        res = http_transport.request("GET", url)
 
         if res.status_code != 200:
             print("⛔ Assumed issue {match!r} is not publicly accessible.")
 
 
 def check_pr_title_contains_jira(title):
-    regex = r"(.*[?<=:])(.*[?<= \(])(\([A-Z][A-Z0-9]+-[0-9]+\))"
-    if re.search(regex, title):
+    if JIRA_TITLE_SCHEMA_RE.search(title):
         print("✅ Pull request title complies with our schema.")
 
         check_jira_issues_public(title)
@@ -54,8 +53,7 @@ def check_pr_description_not_empty(description):
 
 
 def check_pr_description_contains_jira(description):
-    regex = r"JIRA: \[[A-Z]+-[0-9]+\]\(https:\/\/issues.redhat.com\/browse\/[A-Z]+-[0-9]+\)"
-    match = re.search(regex, description)
+    match = JIRA_DESCRIPTION_REFERENCE_RE.search(description)
     if match:
         print(f"Found a Jira reference in the PR description: '{match.group(0)}'")
         sys.exit(2)
@@ -74,7 +72,7 @@ def add_best_practice_label(token, repository, pr_number):
     payload = {
         "labels": ["🌟 best practice"]
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_transport.request("POST", url, headers=headers, json=payload)
     if response.status_code != 200:
         print(f"Failed to add label to PR. Status code: {response.status_code}")
         sys.exit(1)
@@ -100,6 +98,7 @@ python {my_filename} --add-label --token "your_token" --repository "your_reposit
     parser.add_argument("--token", help="GitHub token")
     parser.add_argument("--repository", help="GitHub repository")
     parser.add_argument("--pr-number", type=int, help="Pull Request number")
+    add_profile_argument(parser)
     parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
 
     args = parser.parse_args()
@@ -108,6 +107,8 @@ python {my_filename} --add-label --token "your_token" --repository "your_reposit
         print(format_help_as_md(parser))
         sys.exit(0)
 
+    start_profiling(args.profile)
+
     if args.pr_title:
         check_pr_title_contains_jira(args.pr_title)
     if args.check_commits:
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+
+"""
+Keeps an index of all open pull requests of an organisation up to date
+from GitHub webhooks, so reports don't need a search and one request per
+pull request.
+
+The index is stored as one document per organisation in the state store
+(see `STATE_STORE`). Webhooks can get lost and concurrent updates can
+overwrite each other, so the index is replaced by a complete scan
+regularly (`--reconcile`). `DataProcessor` only uses the index while the
+last reconciliation is younger than `PR_INDEX_MAX_AGE` seconds.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from get_pull_requests import (SEARCH_MAX_RESULTS, InstrumentedGhApi, GITHUB_API_URL, iter_pull_requests,
+                               make_pull_request)
+from records import PullRequest
+from shards import plan_shards
+from state_store import open_store
+from utils import format_help_as_md
+
+logger = logging.getLogger(__name__)
+
+doc_epilog = """The state store is configured with the `STATE_STORE` environment variable
+(e.g. `s3://bucket/prefix` or a local directory).
+You can set the `GITHUB_TOKEN` environment variable instead of using the `--github-token` argument.
+"""
+
+# two missed hourly reconciliations are tolerated
+PR_INDEX_MAX_AGE = int(os.getenv("PR_INDEX_MAX_AGE", "7200"))
+
+# pull request webhook actions removing a pull request from the index
+REMOVING_ACTIONS = {"closed"}
+
+
+class PullRequestIndex:
+    def __init__(self, store, prefix="pr_index"):
+        self.store = store
+        self.prefix = prefix
+
+    def _key(self, org):
+        return f"{self.prefix}/{org.lower()}"
+
+    def _load(self, org):
+        return self.store.get_json(self._key(org)) or {"reconciled_at": None, "pull_requests": {}}
+
+    def _save(self, org, document):
+        document["updated_at"] = time.time()
+        self.store.put_json(self._key(org), document)
+
+    def reconciled_at(self, org):
+        """
+        Return the time of the last complete scan of `org` or None
+        """
+        return self._load(org)["reconciled_at"]
+
+    @staticmethod
+    def _is_fresh(document, max_age):
+        reconciled_at = document["reconciled_at"]
+        return reconciled_at is not None and time.time() - reconciled_at <= max_age
+
+    def is_fresh(self, org, max_age=PR_INDEX_MAX_AGE):
+        return self._is_fresh(self._load(org), max_age)
+
+    def pull_requests(self, org, repo=None, author=None):
+        """
+        Return the `PullRequest` records of `org`, optionally only of one
+        repository or author, in the order of the search (least recently updated first).
+        """
+        return self._records(self._load(org), repo, author)
+
+    def fresh_pull_requests(self, org, repo=None, author=None, max_age=PR_INDEX_MAX_AGE):
+        """
+        Return the pull requests like `pull_requests` if the index of `org` is fresh
+        (see `is_fresh`), otherwise None. The index is only loaded once.
+        """
+        document = self._load(org)
+        if not self._is_fresh(document, max_age):
+            return None
+        return self._records(document, repo, author)
+
+    @staticmethod
+    def _records(document, repo, author):
+        ret = []
+        for item in document["pull_requests"].values():
+            if repo and item["repo"] != repo:
+                continue
+            if author and (item.get("author") or "").lower() != author.lower():
+                continue
+            ret.append(PullRequest(**item))
+        ret.sort(key=lambda pr: pr["updated_at"] or "")
+        return ret
+
+    def replace(self, org, pull_requests, complete=True):
+        """
+        Replace all pull requests of `org`, after a complete scan.
+        Without `complete` the index isn't fresh afterwards (see `is_fresh`).
+        """
+        document = {
+            "reconciled_at": time.time() if complete else None,
+            "pull_requests": {pr["html_url"]: pr.to_dict(load=False) for pr in pull_requests},
+        }
+        self._save(org, document)
+
+    def apply_webhook(self, event_name, payload):
+        """
+        Update the index from a GitHub webhook, return what was done
+        """
+        repository = payload.get("repository") or {}
+        org = (payload.get("organization") or repository.get("owner") or {}).get("login")
+        if not org:
+            return "ignored"
+
+        if event_name == "pull_request":
+            action = payload.get("action")
+            pull_request = payload["pull_request"]
+            document = self._load(org)
+            if action in REMOVING_ACTIONS or pull_request.get("state") != "open":
+                found = document["pull_requests"].pop(pull_request["html_url"], None)
+                if found is None:
+                    return "ignored"
+                result = "removed"
+            else:
+                record = make_pull_request(pull_request, pull_request, org, repository["name"])
+                document["pull_requests"][pull_request["html_url"]] = record.to_dict(load=False)
+                result = "updated"
+            self._save(org, document)
+            return result
+
+        if event_name == "repository" and payload.get("action") in ("archived", "deleted"):
+            document = self._load(org)
+            before = len(document["pull_requests"])
+            document["pull_requests"] = {url: item for url, item in document["pull_requests"].items()
+                                         if item["repo"] != repository["name"]}
+            if len(document["pull_requests"]) == before:
+                return "ignored"
+            self._save(org, document)
+            return "removed"
+
+        return "ignored"
+
+
+def reconcile(index, github_api, org):
+    """
+    Replace the index of `org` by a complete scan, return the number of pull requests.
+    Only the search results are stored, the details are fetched when they are accessed.
+    Organisations with more pull requests than one search returns are scanned by
+    ranges of creation dates (see `shards.plan_shards`).
+    A failed scan raises and leaves the index as it was.
+    """
+    pull_requests = list(iter_pull_requests(github_api, org, None, None, fields="minimal", raise_errors=True))
+    complete = True
+    if len(pull_requests) >= SEARCH_MAX_RESULTS:
+        pull_requests = []
+        for shard in plan_shards(github_api, org):
+            # a single day with more pull requests than one search returns can't be scanned completely
+            complete = complete and shard["count"] <= SEARCH_MAX_RESULTS
+            pull_requests.extend(iter_pull_requests(github_api, org, None, None, fields="minimal",
+                                                    created=shard["created"], raise_errors=True))
+    index.replace(org, pull_requests, complete=complete)
+    if complete:
+        logger.info(f"Indexed {len(pull_requests)} open pull requests of {org}")
+    else:
+        logger.warning(f"Indexed only {len(pull_requests)} open pull requests of {org}, the index isn't used")
+    return len(pull_requests)
+
+
+def main():
+    """Update the index of open pull requests"""
+    parser = argparse.ArgumentParser(allow_abbrev=False,
+        description=__doc__,
+        epilog=doc_epilog
+    )
+    parser.add_argument("--org", help="Set an organisation on github.com", required=True)
+    parser.add_argument("--github-token", help="Set a token for github.com")
+    parser.add_argument("--reconcile", help="Replace the index by a complete scan of the organisation",
+                        action="store_true")
+    parser.add_argument("--event-name", help="Name of the GitHub webhook event (e.g. `pull_request`)")
+    parser.add_argument("--event-path", help="JSON file with the payload of the webhook event "
+                        "(e.g. `$GITHUB_EVENT_PATH` in GitHub Actions)")
+    parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
+
+    if "--help-md" in sys.argv:
+        print(format_help_as_md(parser))
+        sys.exit(0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    store = open_store()
+    if store is None:
+        parser.error("The STATE_STORE environment variable is required.")
+    index = PullRequestIndex(store)
+
+    if args.event_name and args.event_path:
+        with open(args.event_path, encoding="utf-8") as f:
+            payload = json.load(f)
+        logger.info(f"{args.event_name}: {index.apply_webhook(args.event_name, payload)}")
+
+    if args.reconcile:
+        github_token = args.github_token or os.getenv("GITHUB_TOKEN")
+        github_api = InstrumentedGhApi(owner=args.org, token=github_token, gh_host=GITHUB_API_URL)
+        reconcile(index, github_api, args.org)
+
+
+if __name__ == "__main__":
+    main()
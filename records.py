@@ -0,0 +1,225 @@
+"""
+Compact record types for pull requests, Jira issues and sprints.
+
+The records use `__slots__` instead of a per-instance `__dict__` and can load
+expensive fields lazily on first access (e.g. the commit messages of a pull
+request, which need an extra API call).
+
+For compatibility with the code written for plain dictionaries, the records
+also support `record["field"]`, `record.get("field")`, `"field" in record`
+and `**record`. Fields which were never set behave like missing keys.
+`**record`, `dict(record)` and `to_dict()` only cover the loaded fields, so
+copying or serialising a record never calls a loader.
+"""
+
+import sys
+import threading
+
+
+class _Lazy:
+    """
+    A loader shared by the fields it loads; the lock makes sure only one
+    thread calls it.
+    """
+    __slots__ = ("loader", "lock", "loaded")
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.loaded = False
+
+
+class Record:
+    """
+    Base class of all records, subclasses only define `__slots__`.
+    """
+    __slots__ = ("_lazy",)
+
+    # shared by all records without lazy fields, never modified
+    _NO_LAZY = {}
+
+    # values of those fields are repeated a lot, so they are interned
+    _INTERNED = ()
+
+    def __init__(self, **fields):
+        self._lazy = self._NO_LAZY
+        for name, value in fields.items():
+            self[name] = value
+
+    @classmethod
+    def fields(cls):
+        """
+        Return the names of all fields in their definition order.
+        """
+        fields = cls.__dict__.get("_fields")
+        if fields is None:
+            fields = tuple(s for klass in reversed(cls.__mro__)
+                           for s in klass.__dict__.get("__slots__", ()) if not s.startswith("_"))
+            cls._fields = fields
+            cls._field_set = frozenset(fields)
+        return fields
+
+    def set_lazy(self, names, loader):
+        """
+        Load the fields `names` by calling `loader()` on first access.
+        `loader` returns a dictionary with the values of the fields.
+        """
+        if self._lazy is self._NO_LAZY:
+            self._lazy = {}
+        lazy = _Lazy(loader)
+        for name in names:
+            self._lazy[name] = lazy
+
+    def _load(self, lazy):
+        with lazy.lock:
+            if lazy.loaded:
+                return
+            values = lazy.loader()
+            for name in [n for n, l in list(self._lazy.items()) if l is lazy]:
+                if not self.is_loaded(name):
+                    setattr(self, name, values.get(name))
+                self._lazy.pop(name, None)
+            lazy.loaded = True
+
+    def __getattr__(self, name):
+        # only called for fields which are not set (yet)
+        try:
+            lazy = object.__getattribute__(self, "_lazy").get(name)
+        except AttributeError:
+            lazy = None
+        if lazy is None:
+            raise AttributeError(name)
+        self._load(lazy)
+        return object.__getattribute__(self, name)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name, value):
+        self.fields()
+        if name not in self._field_set:
+            raise KeyError(name)
+        if name in self._INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, name, value)
+        self._lazy.pop(name, None)
+
+    def __contains__(self, name):
+        return self.is_loaded(name) or name in self._lazy
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def is_loaded(self, name):
+        """
+        Return True if the field has a value without calling a lazy loader.
+        """
+        try:
+            object.__getattribute__(self, name)
+        except AttributeError:
+            return False
+        return True
+
+    def keys(self):
+        # only the loaded fields, so `**record` doesn't call the loaders
+        return [name for name in self.fields() if self.is_loaded(name)]
+
+    def to_dict(self, load=False):
+        """
+        Return the record as dictionary e.g. for the JSON output.
+        Lazy fields which are not loaded yet are left out, unless `load=True`.
+        """
+        ret = {}
+        for name in self.fields():
+            if self.is_loaded(name):
+                ret[name] = object.__getattribute__(self, name)
+            elif load and name in self._lazy:
+                ret[name] = self[name]
+        return ret
+
+    def __getstate__(self):
+        # lazy loaders can't be pickled, so load everything first
+        return self.to_dict(load=True)
+
+    def __setstate__(self, state):
+        self._lazy = self._NO_LAZY
+        for name, value in state.items():
+            self[name] = value
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return type(self) is type(other) and self.to_dict(load=False) == other.to_dict(load=False)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict(load=False)!r})"
+
+
+class PullRequest(Record):
+    __slots__ = (
+        "number",
+        "html_url",
+        "title",
+        "org",
+        "repo",
+        "author",
+        "created_at",
+        "updated_at",
+        "requested_reviewers",
+        "additions",
+        "deletions",
+        "draft",
+        "mergeable",
+        "rebaseable",
+        "mergeable_state",
+        "description",
+        "commit_messages",
+        "jira_keys",
+        "jira_key",
+        "jira_url",
+    )
+    _INTERNED = ("org", "repo", "author", "mergeable_state")
+
+
+class Issue(Record):
+    __slots__ = (
+        "key",
+        "url",
+        "summary",
+        "assignee",
+        "assignee_id",
+        "description",
+        "status",
+        "resolution",
+        "sprint",
+        "sprint_column",
+        "issue_type",
+        "epic",
+    )
+    _INTERNED = ("assignee", "assignee_id", "status", "resolution", "issue_type", "epic")
+
+
+class Sprint(Record):
+    __slots__ = (
+        "id",
+        "rapidViewId",
+        "originBoardId",
+        "state",
+        "name",
+        "startDate",
+        "endDate",
+        "completeDate",
+        "activatedDate",
+        "sequence",
+        "goal",
+        "synced",
+        "autoStartStop",
+        "incompleteIssuesDestinationId",
+    )
+    _INTERNED = ("state", "name")
@@ -0,0 +1,295 @@
+"""
+Sharded scans of whole organisations.
+
+The pull requests of an organisation are searched page by page in one
+process and the search returns at most 1000 results. `plan_shards` splits
+the search into ranges of creation dates with at most `SHARD_SIZE` (default:
+500) pull requests each. The shards are fetched concurrently and merged:
+
+ * `ProcessShardRunner` - in local worker processes
+ * `LambdaShardRunner` - in asynchronous invocations of an AWS Lambda running
+   `slack_lambda_get_pull_requests.py`, the results are exchanged via the
+   state store (`STATE_STORE`)
+
+A failed shard is fetched again up to `SHARD_RETRIES` times (default: 2).
+With `GITHUB_REQUESTS_PER_SECOND` the requests of all workers together stay
+below that rate, every worker gets its share, the planning keeps to it as well.
+Every split of the planning costs a search, which GitHub limits to 30 per
+minute, so the planning stops splitting after `SHARD_PLAN_MAX_SEARCHES`
+(default: 60, two minutes of the limit) searches.
+"""
+
+import abc
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+import uuid
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
+
+import get_pull_requests
+from get_pull_requests import (SEARCH_MAX_RESULTS, InstrumentedGhApi, iter_pull_requests, pull_request_query,
+                               set_commit_messages_loader, set_details_loader)
+from metrics import metrics
+from records import PullRequest
+from utils import RateBudget
+
+logger = logging.getLogger(__name__)
+
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "500"))
+SHARD_RETRIES = int(os.getenv("SHARD_RETRIES", "2"))
+# seconds until a shard invocation of the AWS Lambda is considered lost
+SHARD_TIMEOUT = int(os.getenv("SHARD_TIMEOUT", "900"))
+GITHUB_REQUESTS_PER_SECOND = float(os.getenv("GITHUB_REQUESTS_PER_SECOND", "0")) or None
+SHARD_PLAN_MAX_SEARCHES = int(os.getenv("SHARD_PLAN_MAX_SEARCHES", "60"))
+# the launch of GitHub, no pull request is older
+SHARD_START = "2008-01-01"
+
+
+class ShardError(Exception):
+    pass
+
+
+def count_pull_requests(github_api, query, rate_budget=None):
+    if rate_budget is None:
+        return github_api.search.issues_and_pull_requests(q=query, per_page=1)["total_count"]
+    with rate_budget.request():
+        return github_api.search.issues_and_pull_requests(q=query, per_page=1)["total_count"]
+
+
+def plan_shards(github_api, org, repo=None, author=None, start=SHARD_START, end=None, shard_size=None,
+                rate_budget=None, max_searches=None):
+    """
+    Return the shards of the search for the open pull requests, sorted by their
+    range of creation dates. Ranges with more than `shard_size` pull requests
+    are split, assuming the pull requests are spread evenly, until they fit.
+    The searches run within `rate_budget` (a `utils.RateBudget`), ranges which
+    would need more than `max_searches` searches in total aren't split anymore.
+    """
+    shard_size = shard_size or SHARD_SIZE
+    max_searches = max_searches or SHARD_PLAN_MAX_SEARCHES
+    start = date.fromisoformat(start)
+    end = date.fromisoformat(end) if end else datetime.now(timezone.utc).date()
+    shards = []
+    pending = [(start, end)]
+    searches = 1
+    with metrics.stage("plan"):
+        while pending:
+            since, until = pending.pop()
+            created = f"{since.isoformat()}..{until.isoformat()}"
+            count = count_pull_requests(github_api, pull_request_query(org, repo, author, created), rate_budget)
+            if count == 0:
+                continue
+            days = (until - since).days + 1
+            pieces = min(math.ceil(count / shard_size), days)
+            if count > shard_size and days > 1 and searches + pieces > max_searches:
+                logger.warning(f"Not splitting the {count} pull requests of {org} created {created}, "
+                               f"the planning is limited to {max_searches} searches")
+            elif count > shard_size and days > 1:
+                searches += pieces
+                bounds = [since + timedelta(days=days * i // pieces) for i in range(pieces + 1)]
+                pending.extend((a, b - timedelta(days=1)) for a, b in zip(bounds, bounds[1:]))
+                continue
+            if count > SEARCH_MAX_RESULTS:
+                logger.warning(f"Only {SEARCH_MAX_RESULTS} of the {count} pull requests of {org} "
+                               f"created {created} can be fetched")
+            shards.append({"org": org, "repo": repo, "author": author, "created": created, "count": count})
+    logger.info(f"{len(shards)} shards for {sum(s['count'] for s in shards)} pull requests of {org}")
+    return sorted(shards, key=lambda s: s["created"])
+
+
+def fetch_shard(shard, github_token, fields, gh_host, rate_budget=None):
+    """
+    Return the pull requests of one shard as dictionaries, e.g. to be sent back by a worker.
+    Errors of the search are raised, so the shard can be retried.
+    """
+    github_api = InstrumentedGhApi(owner=shard["org"], token=github_token, gh_host=gh_host)
+    github_api.rate_budget = rate_budget
+    return [pull_request.to_dict(load=False)
+            for pull_request in iter_pull_requests(github_api, shard["org"], shard.get("repo"), shard.get("author"),
+                                                   fields, created=shard["created"], raise_errors=True)]
+
+
+def _share_of_rate(workers):
+    return GITHUB_REQUESTS_PER_SECOND / workers if GITHUB_REQUESTS_PER_SECOND else None
+
+
+class ShardRunner(abc.ABC):
+    def __init__(self, github_token, workers, retries=None, shard_size=None):
+        self.github_token = github_token
+        self.workers = workers
+        self.retries = SHARD_RETRIES if retries is None else retries
+        self.shard_size = shard_size
+        # whether the last `pull_requests` fetched every pull request of the search
+        self.complete = False
+
+    @abc.abstractmethod
+    def run(self, shards, fields):
+        """
+        Return the pull requests (dictionaries) of every shard, in the order of `shards`
+        """
+
+    def pull_requests(self, github_api, org, repo, author, fields):
+        """
+        Return the pull requests of all shards of the search as records, like
+        `get_pull_requests.get_pull_request_list`. Fields a shard didn't fetch
+        are fetched with `github_api` when they are accessed.
+        """
+        rate_budget = RateBudget(per_second=GITHUB_REQUESTS_PER_SECOND) if GITHUB_REQUESTS_PER_SECOND else None
+        shards = plan_shards(github_api, org, repo, author, shard_size=self.shard_size, rate_budget=rate_budget)
+        self.complete = all(shard["count"] <= SEARCH_MAX_RESULTS for shard in shards)
+        ret = []
+        seen = set()
+        with metrics.stage("shards"):
+            results = self.run(shards, fields)
+        for pull_requests in results:
+            for data in pull_requests:
+                # a pull request created while scanning can show up twice
+                if data["html_url"] in seen:
+                    continue
+                seen.add(data["html_url"])
+                pull_request = PullRequest(**data)
+                if not pull_request.is_loaded("mergeable_state"):
+                    set_details_loader(github_api, pull_request)
+                if not pull_request.is_loaded("commit_messages"):
+                    set_commit_messages_loader(github_api, pull_request)
+                ret.append(pull_request)
+        return ret
+
+
+_worker_rate_budget = None
+
+
+def _init_worker(per_second):
+    global _worker_rate_budget
+    _worker_rate_budget = RateBudget(per_second=per_second) if per_second else None
+
+
+def _fetch_shard_in_worker(shard, github_token, fields, gh_host):
+    return fetch_shard(shard, github_token, fields, gh_host, _worker_rate_budget)
+
+
+class ProcessShardRunner(ShardRunner):
+    """
+    Fetch the shards in `workers` local processes
+    """
+
+    def run(self, shards, fields):
+        results = [None] * len(shards)
+        futures = {}
+        # `spawn`, forking a process with threads (e.g. of the connection pool) isn't safe
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(_share_of_rate(self.workers),)) as executor:
+
+            def submit(index, attempt):
+                future = executor.submit(_fetch_shard_in_worker, shards[index], self.github_token, fields,
+                                         get_pull_requests.GITHUB_API_URL)
+                futures[future] = (index, attempt)
+
+            for index in range(len(shards)):
+                submit(index, 1)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, attempt = futures.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        results[index] = future.result()
+                    elif attempt <= self.retries:
+                        logger.warning(f"Shard {shards[index]['created']} of {shards[index]['org']} failed "
+                                       f"({error}), retrying")
+                        submit(index, attempt + 1)
+                    else:
+                        raise ShardError(f"Shard {shards[index]['created']} of {shards[index]['org']} "
+                                         f"failed {attempt} times: {error}") from error
+        return results
+
+
+class LambdaShardRunner(ShardRunner):
+    """
+    Fetch the shards with asynchronous invocations of the AWS Lambda
+    `function_name`, at most `workers` at the same time. The invocations
+    put their results into `store`, a store of `state_store.py`.
+    """
+
+    def __init__(self, function_name, store, github_token, workers=10, retries=None, shard_size=None,
+                 timeout=None, poll_interval=2, lambda_client=None):
+        if store is None:
+            raise ValueError("The shards need a state store (STATE_STORE) to return their results")
+        super().__init__(github_token, workers, retries, shard_size)
+        self.function_name = function_name
+        self.store = store
+        self.timeout = SHARD_TIMEOUT if timeout is None else timeout
+        self.poll_interval = poll_interval
+        if lambda_client is None:
+            import boto3
+            lambda_client = boto3.client("lambda")
+        self.lambda_client = lambda_client
+
+    def run(self, shards, fields):
+        prefix = f"shards/{uuid.uuid4().hex}/"
+        results = [None] * len(shards)
+        attempts = [0] * len(shards)
+        # shard index by start time of the invocation
+        running = {}
+        waiting = list(range(len(shards)))
+        per_second = _share_of_rate(min(self.workers, len(shards)) or 1)
+
+        def invoke(index):
+            attempts[index] += 1
+            self.store.delete(f"{prefix}{index}")
+            self.lambda_client.invoke(FunctionName=self.function_name, InvocationType="Event", Payload=json.dumps({
+                "shard": shards[index],
+                "shard_key": f"{prefix}{index}",
+                "github_token": self.github_token,
+                "fields": fields,
+                "per_second": per_second,
+            }))
+            running[index] = time.monotonic()
+
+        def failed(index, error):
+            del running[index]
+            if attempts[index] > self.retries:
+                raise ShardError(f"Shard {shards[index]['created']} of {shards[index]['org']} "
+                                 f"failed {attempts[index]} times: {error}")
+            logger.warning(f"Shard {shards[index]['created']} of {shards[index]['org']} failed ({error}), retrying")
+            waiting.insert(0, index)
+
+        while waiting or running:
+            while waiting and len(running) < self.workers:
+                invoke(waiting.pop(0))
+            time.sleep(self.poll_interval)
+
+            finished = set(self.store.list_keys(prefix))
+            for index in list(running):
+                key = f"{prefix}{index}"
+                if key in finished:
+                    result = self.store.get_json(key)
+                    self.store.delete(key)
+                    if result["status"] == "done":
+                        results[index] = result["pull_requests"]
+                        del running[index]
+                    else:
+                        failed(index, result.get("error"))
+                elif time.monotonic() - running[index] > self.timeout:
+                    failed(index, f"no result after {self.timeout} seconds")
+        return results
+
+
+def run_shard_event(event, store):
+    """
+    Fetch the shard of an event sent by `LambdaShardRunner` and put the result into `store`
+    """
+    rate_budget = RateBudget(per_second=event["per_second"]) if event.get("per_second") else None
+    try:
+        pull_requests = fetch_shard(event["shard"], event["github_token"], event.get("fields", "summary"),
+                                    get_pull_requests.GITHUB_API_URL, rate_budget)
+        result = {"status": "done", "pull_requests": pull_requests}
+    except (Exception, SystemExit) as e:  # pylint: disable=broad-exception-caught
+        logger.exception(f"Shard {event['shard']['created']} of {event['shard']['org']} failed")
+        result = {"status": "failed", "error": str(e) or type(e).__name__}
+    store.put_json(event["shard_key"], result)
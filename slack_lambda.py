@@ -5,7 +5,6 @@ This function handles incoming requests from Slack, verifies the request signatu
 and processes commands sent to the Slack bot.
 """
 
-import boto3
 import os
 import json
 import time
@@ -14,8 +13,11 @@ import hashlib
 import urllib.parse
 import base64
 
-from utils import UserMap
-from botocore.exceptions import ClientError
+from coalesce import job_id, open_coalescer
+from metrics import metrics
+from snapshots import SnapshotStore
+from state_store import open_store
+from utils import profile_from_env, split_list, UserMap
 
 import logging
 
@@ -23,9 +25,31 @@ import logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-lambda_client = boto3.client('lambda')
+lambda_client = None
+# set by the AWS Lambda handler, secrets are taken from the environment without it
+secretmanager_client = None
 
-def _handle_request(params, staging=False):
+
+def _invoke_lambda(payload, staging=False):
+    """
+    Hand the payload over to `slack_lambda_get_pull_requests.py` running as another AWS Lambda
+    """
+    global lambda_client
+    if lambda_client is None:
+        import boto3
+        lambda_client = boto3.client('lambda')
+    lambda_client.invoke(
+            FunctionName='schutzbot_command_get_pull_requests' if not staging else 'schutzbot_command_staging_get_pull_requests',
+            InvocationType='Event',  # async invoke
+            Payload=json.dumps(payload)
+    )
+
+
+def _handle_request(params, staging=False, dispatch=None):
+    """
+    Answer a slash command, `dispatch(payload, staging)` starts the collection of
+    a report in the background (default: invoking another AWS Lambda)
+    """
     user = params.get("user_name", ["there"])[0]
     command = params.get("command")
     text = params.get("text", [""])[0]
@@ -48,17 +72,33 @@ def _handle_request(params, staging=False):
             message = f"""The command `/{command}` can show you, if your <https://github.com/pulls|PRs in Github> are 
 linked to a Jira ticket.
 Please add your *GitHub username* after `/{command}` if it's not the same as the slack username.
+Use `/{command} team` to get the overview of everyone in the team.
+Add `refresh` (e.g. `/{command} refresh`) to get the current state instead of the last snapshot.
 """
         else:
             user_map = UserMap(os.environ.get('USER_MAP_FILE', 'usermap.yaml'))
-            args = text if text else user_map.slack2github(user)
+            words = text.split(" ")
+            refresh = words[0].lower() == "refresh"
+            if refresh:
+                text = " ".join(words[1:])
+            team = text.lower() == "team"
+            args = text if text and not team else user_map.slack2github(user)
             jira_user = user_map.slack2jira(user)
             arg_array = args.split(" ")
             if len(arg_array) == 2:
                 args = arg_array[0]
                 jira_user = arg_array[1]
             elif len(arg_array) > 2:
-                return f":stop: There are too many arguments. Please use the format: `/{command} [<github_user>|<github_user> <jira_user>]`"
+                return f":stop: There are too many arguments. Please use the format: `/{command} [refresh] [<github_user>|<github_user> <jira_user>]`"
+
+            if not refresh:
+                message = _snapshot_message(args, jira_user, team)
+
+            response_url = params.get('response_url')[0]
+            coalescer = None if message else open_coalescer()
+            job = job_id(command, args, jira_user, team)
+            if coalescer is not None and not coalescer.claim(job, response_url):
+                message = ":waittime: I'm already working on this, you'll get the answer here as well…"
 
             if not message:
                 github_token = get_secret("SCHUTZBOT_GITHUB_TOKEN")
@@ -69,25 +109,38 @@ Please add your *GitHub username* after `/{command}` if it's not the same as the
 
                 jira_current_sprint_url = os.environ.get("JIRA_CURRENT_SPRINT_URL")
                 jira_backlog_url = os.environ.get("JIRA_BACKLOG_URL")
+                # send the sprint section first and update the message as more data arrives
+                progressive = os.environ.get("PROGRESSIVE_RESPONSES", "").lower() in ("1", "true", "yes")
 
-                message = f":waittime: I will check the PRs of `{args}` correlate with issues from `{jira_user}` and let you know if all is good…"
+                if team:
+                    message = ":waittime: I will check the PRs of the whole team correlate with their issues and let you know if all is good…"
+                else:
+                    message = f":waittime: I will check the PRs of `{args}` correlate with issues from `{jira_user}` and let you know if all is good…"
                 payload = {
+                    "team": team,
                     "jira_user": jira_user,
                     "args": args,
                     "github_organization": github_organization,
+                    "github_organizations": split_list(github_organization),
                     "github_token": github_token,
                     "jira_token": jira_token,
                     "jira_board_id": jira_board_id,
+                    "jira_board_ids": split_list(jira_board_id),
                     "jira_current_sprint_url": jira_current_sprint_url,
                     "jira_backlog_url": jira_backlog_url,
                     "original_message": message,
-                    "response_url": params.get('response_url')[0],
+                    "response_url": response_url,
+                    "progressive": progressive,
+                    "job_id": job if coalescer is not None else None,
                 }
-                lambda_client.invoke(
-                        FunctionName='schutzbot_command_get_pull_requests' if not staging else 'schutzbot_command_staging_get_pull_requests',
-                        InvocationType='Event',  # async invoke
-                        Payload=json.dumps(payload)
-                )
+                with metrics.stage("dispatch"):
+                    try:
+                        (dispatch or _invoke_lambda)(payload, staging)
+                    except Exception:
+                        # nobody runs the job, the next command has to claim it again
+                        if coalescer is not None:
+                            coalescer.finish(job)
+                        raise
 
     else:
         message = f":stop: Hello {user}. The command '{command}' + '{text}' is not yet implemented. You are ahead of time!"
@@ -102,6 +155,21 @@ Please add your *GitHub username* after `/{command}` if it's not the same as the
     }
 
 
+def _snapshot_message(github_user, jira_user, team):
+    """
+    Return the answer from the newest snapshot or None
+    """
+    store = open_store()
+    if store is None:
+        return None
+    with metrics.stage("snapshot"):
+        try:
+            return SnapshotStore(store).message(github_user, jira_user, team)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning(f"Couldn't read the snapshot: {e}")
+            return None
+
+
 def get_secret(secret_name):
     """
     Retrieve a secret from AWS Secrets Manager.
@@ -109,6 +177,10 @@ def get_secret(secret_name):
     """
     logger.debug(f"Getting secret {secret_name}")
 
+    if secretmanager_client is None:
+        return os.environ.get(secret_name)
+
+    from botocore.exceptions import ClientError
     try:
         get_secret_value_response = secretmanager_client.get_secret_value(
             SecretId=secret_name
@@ -191,20 +263,52 @@ def _check_request_validity(event):
         }
     return body, None
 
+def _retry_response(event):
+    """
+    Return the answer to a retry of Slack or None if it's the first request
+    """
+    # Slack retries when we're slow, the first request is still being handled
+    headers = event.get("headers", {})
+    retry_num = headers.get("X-Slack-Retry-Num") or headers.get("x-slack-retry-num")
+    if not retry_num:
+        return None
+    logger.info(f"Ignoring retry {retry_num} of Slack")
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json", "X-Slack-No-Retry": "1"},
+        "body": ""
+    }
+
 def lambda_handler(event, context):
+    # the module stays loaded between invocations of a warm Lambda
+    metrics.reset()
+    try:
+        with profile_from_env(f"/tmp/{context.function_name}.pstats"):
+            return _lambda_handler(event, context)
+    finally:
+        metrics.log_emf(context.function_name)
+
+
+def _lambda_handler(event, context):
 
     global secretmanager_client
 
+    retry = _retry_response(event)
+    if retry:
+        return retry
+
     region_name = os.environ.get('SECRETMANAGER_AWS_REGION', 'us-east-1')
 
     # Create a Secrets Manager client
+    import boto3
     session = boto3.session.Session()
     secretmanager_client = session.client(
         service_name='secretsmanager',
         region_name=region_name
     )
 
-    body, error = _check_request_validity(event)    
+    with metrics.stage("verify"):
+        body, error = _check_request_validity(event)
     if error:
         return error
 
@@ -4,86 +4,147 @@ AWS Lambda function calling `JiraDataProcessor` and `DataProcessor`
 formatting the result and sending back to the slack user.
 """
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 import requests
 
 from get_jira_sprint import JiraDataProcessor
+import http_transport
+from circuit_breaker import CircuitOpenError
+from coalesce import open_coalescer
 from get_pull_requests import DataProcessor
+from jira_issue_store import JiraIssueStore
+from metrics import metrics
+from pr_index import PullRequestIndex
+from shards import run_shard_event
+from snapshots import SnapshotStore, team_message
+from state_store import open_store
+from utils import profile_from_env, split_list, Deadline, DeadlineExceeded, UserMap
 import logging
 
 # Set the logging level to DEBUG for more verbose output
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
-def get_github_url(issue, pr_data_processor):
-    for pr in pr_data_processor.with_jira:
-        if issue["key"] == pr["jira_key"]:
-            return pr["html_url"]
-    return None
-
-def get_github_number(issue, pr_data_processor):
-    for pr in pr_data_processor.with_jira:
-        if issue["key"] == pr["jira_key"]:
-            return f"{pr["repo"]}#{pr["number"]}"
-    return None
-
-def is_practice_issue(issue, pr_data_processor):
-    return get_github_url(issue, pr_data_processor) is not None
-
-def is_backlog_issue(pr, processed_issues):
-    for issue in processed_issues["backlog"]:
-        if pr["jira_key"] == issue["key"]:
-            return True
-    return False
-
-def is_sprint_issue(pr, processed_issues):
-    for issue in processed_issues["current_sprint"]:
-        if pr["jira_key"] == issue["key"]:
-            return True
-    return False
-
-
-def get_issue_summary(jira_data_processor, pr, processed_issues):
-    for issue in processed_issues["backlog"] + processed_issues["current_sprint"]:
-        if pr["jira_key"] == issue["key"]:
-            return issue["summary"]
+def _pull_requests_by_key(with_jira):
+    """
+    Return the first pull request of every Jira key
+    """
+    ret = {}
+    for pr in with_jira:
+        ret.setdefault(pr["jira_key"], pr)
+    return ret
+
+
+def _issue_summaries(processed_issues, other_issues):
+    """
+    Return the summaries by issue key, backlog and sprint issues take precedence
+    """
+    ret = {key: issue["summary"] for key, issue in other_issues.items() if issue}
+    for issue in reversed(processed_issues["backlog"] + processed_issues["current_sprint"]):
+        ret[issue["key"]] = issue["summary"]
+    return ret
+
+
+def fetch_other_issues(jira_data_processor, with_jira, processed_issues):
+    """
+    Fetch the Jira issues of pull requests which are neither in the sprint nor
+    in the backlog in one go. Returns a dictionary by issue key.
+    """
+    known_keys = {issue["key"] for issue in processed_issues["backlog"] + processed_issues["current_sprint"]}
+    other_keys = [pr["jira_key"] for pr in with_jira if pr["jira_key"] not in known_keys]
+    if not other_keys:
+        return {}
     try:
-        return jira_data_processor.get_issue(pr["jira_key"])["summary"]
-    except:
-        pass
-
-    return pr["title"]
-
-
-def _process(event):
-    jira_user = event.get("jira_user", "unknown")
-    args = event.get("args", "unknown")
-
-    github_organization = event.get("github_organization", "unknown")
-    github_token = event.get("github_token", "unknown")
-
-    jira_token = event.get("jira_token", "unknown")
-    jira_board_id = event.get("jira_board_id", "unknown")
-
-    current_sprint_url = event.get("jira_current_sprint_url")
-    backlog_url = event.get("jira_backlog_url")
-
-    # the functionality is duplicated here (alos in slack_lambda.py)
-    # for the testcases
+        return {issue["key"]: issue for issue in jira_data_processor.get_issues(other_keys)}
+    except (CircuitOpenError, DeadlineExceeded):
+        raise
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.warning(f"Couldn't fetch the issues {other_keys}: {e}")
+        return {}
+
+
+def _pull_request_index():
+    """
+    Return the index of pull requests kept up to date by
+    `github_webhook_lambda.py` if a state store is configured.
+    """
+    store = open_store()
+    return PullRequestIndex(store) if store is not None else None
+
+
+def _jira_issue_store():
+    """
+    Return the store keeping the sprint and backlog issues between
+    invocations if a state store is configured.
+    """
+    store = open_store()
+    return JiraIssueStore(store) if store is not None else None
+
+
+def _split_args(args, jira_user):
+    """
+    Return `(github_user, jira_user)` from the command arguments or `None`
+    when there are too many.
+    """
     arg_array = args.split(" ")
     if len(arg_array) == 2:
-        args = arg_array[0]
-        jira_user = arg_array[1]
+        return arg_array[0], arg_array[1]
     elif len(arg_array) > 2:
-        return ":stop: There are too many arguments. Please use the format: `/pr2jira [<github_user>|<github_user> <jira_user>]`"
+        return None
+    return args, jira_user
 
-    pr_data_processor = DataProcessor(github_organization, None, args, github_token)
-    pr_data_processor.process()
 
-    jira_data_processor = JiraDataProcessor(jira_token, f"{jira_user}", jira_board_id)
-    processed_issues = jira_data_processor.get_issue_overview()
+NO_ISSUES = {"current_sprint": [], "backlog": []}
 
+PARTIAL_MARKER = ("\n\n:warning: *Partial report*: GitHub or Jira didn't answer in time or is failing, "
+                  "some pull requests or issues may be missing.")
+
+
+def _fetch_issues(jira_token, jira_user, jira_board_ids, deadline, any_assignee=False):
+    """
+    Return the `JiraDataProcessor` and its issue overview, or `(None, NO_ISSUES)`
+    if the deadline passed before the issues were fetched or Jira fails fast.
+    """
+    try:
+        jira_data_processor = JiraDataProcessor(jira_token, jira_user, jira_board_ids, any_assignee=any_assignee,
+                                                issue_store=_jira_issue_store(), deadline=deadline)
+        return jira_data_processor, jira_data_processor.get_issue_overview()
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Reporting without the Jira issues: {e}")
+        return None, NO_ISSUES
+
+
+def _fetch_other_issues(jira_data_processor, with_jira, processed_issues):
+    """
+    `fetch_other_issues`, returns `None` if the deadline passed or Jira fails fast
+    """
+    if jira_data_processor is None:
+        return None
+    try:
+        return fetch_other_issues(jira_data_processor, with_jira, processed_issues)
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Reporting without the summaries of other issues: {e}")
+        return None
+
+
+COLUMN_ICONS = {
+    "In Progress": ":progress: ",
+    "To Do": ":todo-circle: ",
+    "Done": ":check-done: ",
+}
+
+
+def _render_report(jira_user, with_jira, without_jira, processed_issues, other_issues,
+                   current_sprint_url=None, backlog_url=None, greeting=True, pull_requests_pending=False,
+                   partial=False):
+    """
+    Format the report of one user for Slack.
+    With `pull_requests_pending` only the sprint section is rendered,
+    with `partial` the report says that some data couldn't be fetched in time.
+    """
     if current_sprint_url:
         current_sprint_url = f"<{current_sprint_url}|current sprint>"
     else:
@@ -94,53 +155,59 @@ def _process(event):
     else:
         backlog_url = "backlog"
 
-    message = f"Happy {datetime.now().strftime('%A')}! 👋\n\n"
+    pull_requests_by_key = _pull_requests_by_key(with_jira)
+
+    parts = []
+    if greeting:
+        parts.append(f"Happy {datetime.now().strftime('%A')}! 👋\n\n")
 
-    message += f"*Work from your {current_sprint_url}* 🟢\n"
+    parts.append(f"*Work from your {current_sprint_url}* 🟢\n")
 
     current_column = None
     for sprint_issue in sorted(
         processed_issues["current_sprint"],
-        key=lambda x: (x["sprint_column"]["sort_id"], is_practice_issue(x, pr_data_processor), x["key"])):
+        key=lambda x: (x["sprint_column"]["sort_id"], x["key"] in pull_requests_by_key, x["key"])):
 
         if current_column != sprint_issue["sprint_column"]["name"]:
             current_column = sprint_issue["sprint_column"]["name"]
-            if current_column == "In Progress":
-                message += f"\n  :progress: *{current_column}*\n"
-            elif current_column == "To Do":
-                message += f"\n  :todo-circle: *{current_column}*\n"
-            elif current_column == "Done":
-                message += f"\n  :check-done: *{current_column}*\n"
-            else:
-                message += f"\n  *{current_column}*\n"
+            parts.append(f"\n  {COLUMN_ICONS.get(current_column, '')}*{current_column}*\n")
 
         jira_link = f"<{sprint_issue['url']}|:jira-6472: {sprint_issue['key']}>"
-        github_url = get_github_url(sprint_issue, pr_data_processor)
+        pr = pull_requests_by_key.get(sprint_issue["key"])
 
-        if github_url:
-            github_link = f", <{github_url}|:github: {get_github_number(sprint_issue, pr_data_processor)}>"
+        if pr:
+            github_link = f", <{pr['html_url']}|:github: {pr['repo']}#{pr['number']}>"
         else:
-            if current_column == "In Progress":
+            if current_column == "In Progress" and not pull_requests_pending:
                 github_link = ", ⚠️ no PR linked"
             else:
                 github_link = ""
-        message += f"     • {sprint_issue['summary']} {jira_link}{github_link}\n"
+        parts.append(f"     • {sprint_issue['summary']} {jira_link}{github_link}\n")
 
     if not current_column:
-        message += "    :hanging-sloth: You don't have any issues in the current sprint\n\n"
+        parts.append("    :hanging-sloth: You don't have any issues in the current sprint\n\n")
     else:
-        message += "\n"
+        parts.append("\n")
+
+    if pull_requests_pending:
+        parts.append(":waittime: Fetching your PRs…")
+        if partial:
+            parts.append(PARTIAL_MARKER)
+        return "".join(parts)
+
+    sprint_keys = {issue["key"] for issue in processed_issues["current_sprint"]}
+    backlog_keys = {issue["key"] for issue in processed_issues["backlog"]}
+    summaries = _issue_summaries(processed_issues, other_issues)
 
     section = None
-    for pr in sorted(pr_data_processor.with_jira
-                                , key=lambda x: is_backlog_issue(x, processed_issues)):
-        if is_sprint_issue(pr, processed_issues):
+    for pr in sorted(with_jira, key=lambda x: x["jira_key"] in backlog_keys):
+        if pr["jira_key"] in sprint_keys:
             continue
 
         if section is None:
-            message += "*Other work* 🟡\n"
+            parts.append("*Other work* 🟡\n")
 
-        backlog_section = is_backlog_issue(pr, processed_issues)
+        backlog_section = pr["jira_key"] in backlog_keys
         if section != backlog_section:
             section = backlog_section
             # skip sub-heading for simplicity for now
@@ -154,43 +221,270 @@ def _process(event):
         github_link = ""
         if github_url:
             github_link = f", <{github_url}|:github: {pr['repo']}#{pr['number']}>"
-        summary = get_issue_summary(jira_data_processor, pr, processed_issues)
-        message += f" • {summary} {jira_link}{github_link}\n"
+        summary = summaries.get(pr["jira_key"], pr["title"])
+        parts.append(f" • {summary} {jira_link}{github_link}\n")
 
     if section is not None:
-        message += "\n"
+        parts.append("\n")
 
-    message += f"*PRs not tracked in Jira* 🟠\n"
+    parts.append(f"*PRs not tracked in Jira* 🟠\n")
     # Format the message for PRs without Jira keys
-    if pr_data_processor.without_jira:
+    if without_jira:
         pr_list = []
-        for pr in sorted(pr_data_processor.without_jira, key=lambda x: x["repo"]):
+        for pr in sorted(without_jira, key=lambda x: x["repo"]):
             entry = f" • {pr['title']} <{pr['html_url']}|:github: {pr['repo']}#{pr['number']}>"
             pr_list.append(entry)
         pr_message = "\n".join(pr_list)
         # indenting does not work in slack, so we'll use some spaces for now
         pr_message += "\n\n    :cat_typing: Please add a Jira key to your PR title e.g by using `/jira-epic …` described <https://github.com/osbuild/pr-best-practices?tab=readme-ov-file#features|here>."
     else:
-        if len(pr_data_processor.with_jira) == 0:
+        if len(with_jira) == 0:
             pr_message = f"    *{jira_user}* is not working on any PRs at the moment? :confusedoggo:"
         else:
             pr_message = "    :party-blob: All your PRs are best practice."
 
-    message += f"{pr_message}"
+    parts.append(pr_message)
+    if partial:
+        parts.append(PARTIAL_MARKER)
 
-    return message
+    return "".join(parts)
 
 
-def lambda_handler(event, context):
-    logger.debug(f"start processing {event}")
+def _process(event, on_update=None, deadline=None):
+    """
+    Return the report of one user.
+
+    With `on_update(message)` the pull requests and the Jira issues are fetched
+    concurrently and preliminary reports are passed to it as soon as possible:
+    the sprint section once the Jira issues are there and the whole report
+    before the summaries of other issues are looked up.
+
+    With a `utils.Deadline` as `deadline` the report is rendered from what
+    was fetched when it's reached, marked as partial.
+    """
+    jira_user = event.get("jira_user", "unknown")
+    args = event.get("args", "unknown")
+
+    github_organizations, jira_board_ids = _sources(event)
+    github_token = event.get("github_token", "unknown")
 
-    message = _process(event)
-    response_url = event.get("response_url")
-    # updating doesn't work with response_url
-    # original_message = event.get("original_message")
+    jira_token = event.get("jira_token", "unknown")
 
-    logger.debug(f"responding to: {response_url}")
+    # the functionality is duplicated here (alos in slack_lambda.py)
+    # for the testcases
+    users = _split_args(args, jira_user)
+    if users is None:
+        return ":stop: There are too many arguments. Please use the format: `/pr2jira [<github_user>|<github_user> <jira_user>]`"
+    args, jira_user = users
+
+    def render(other_issues, pull_requests_pending=False):
+        # the pull request lists are still filled while they are pending
+        with_jira = [] if pull_requests_pending else pr_data_processor.with_jira
+        without_jira = [] if pull_requests_pending else pr_data_processor.without_jira
+        partial = pr_data_processor.partial or jira_data_processor is None or other_issues is None
+        with metrics.stage("render"):
+            return _render_report(jira_user, with_jira, without_jira, processed_issues, other_issues or {},
+                                  event.get("jira_current_sprint_url"), event.get("jira_backlog_url"),
+                                  pull_requests_pending=pull_requests_pending, partial=partial)
+
+    pr_data_processor = DataProcessor(github_organizations, None, args, github_token, index=_pull_request_index(),
+                                      fields="minimal", deadline=deadline)
+
+    if on_update is None:
+        pr_data_processor.process()
+        jira_data_processor, processed_issues = _fetch_issues(jira_token, f"{jira_user}", jira_board_ids, deadline)
+    else:
+        # fetch the pull requests in the background, Jira is usually faster
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pull_requests = executor.submit(pr_data_processor.process)
+            jira_data_processor, processed_issues = _fetch_issues(jira_token, f"{jira_user}", jira_board_ids,
+                                                                  deadline)
+            if not pull_requests.done():
+                on_update(render({}, pull_requests_pending=True))
+            pull_requests.result()
+        on_update(render({}))
+
+    other_issues = _fetch_other_issues(jira_data_processor, pr_data_processor.with_jira, processed_issues)
+    return render(other_issues)
+
+
+def _sources(event):
+    """
+    Return the GitHub organisations and Jira boards of the event, all of them
+    are fetched concurrently. Older events only carry one of each.
+    """
+    github_organizations = (event.get("github_organizations")
+                            or split_list(event.get("github_organization")) or ["unknown"])
+    jira_board_ids = (event.get("jira_board_ids")
+                      or split_list(str(event.get("jira_board_id") or "")) or ["unknown"])
+    return github_organizations, jira_board_ids
+
+
+def _user_map(event):
+    return UserMap(event.get("user_map_file") or os.environ.get('USER_MAP_FILE', 'usermap.yaml'))
+
+
+def _process_team(event, deadline=None):
+    """
+    Generate the reports of all users in the user map from one org-wide
+    pull request search and one sprint and backlog query.
+    Returns a dictionary of the reports by GitHub user.
+    With a `utils.Deadline` see `_process`.
+    """
+    github_organizations, jira_board_ids = _sources(event)
+    github_token = event.get("github_token", "unknown")
 
-    response = {"text": message}
-    r = requests.post(response_url, json=response)
-    r.raise_for_status()
+    jira_token = event.get("jira_token", "unknown")
+
+    user_map = _user_map(event)
+
+    pr_data_processor = DataProcessor(github_organizations, None, None, github_token, index=_pull_request_index(),
+                                      fields="minimal", deadline=deadline)
+    pr_data_processor.process()
+
+    jira_data_processor, processed_issues = _fetch_issues(jira_token, None, jira_board_ids, deadline,
+                                                          any_assignee=True)
+    other_issues = _fetch_other_issues(jira_data_processor, pr_data_processor.with_jira, processed_issues)
+    partial = pr_data_processor.partial or jira_data_processor is None or other_issues is None
+
+    # partition everything by user
+    with_jira = defaultdict(list)
+    for pr in pr_data_processor.with_jira:
+        with_jira[pr["author"]].append(pr)
+    without_jira = defaultdict(list)
+    for pr in pr_data_processor.without_jira:
+        without_jira[pr["author"]].append(pr)
+    issues = defaultdict(lambda: {"current_sprint": [], "backlog": []})
+    for section in ("current_sprint", "backlog"):
+        for issue in processed_issues[section]:
+            issues[issue["assignee_id"]][section].append(issue)
+
+    reports = {}
+    with metrics.stage("render"):
+        for user in user_map.users():
+            reports[user["github"]] = _render_report(
+                user["jira"], with_jira[user["github"]], without_jira[user["github"]],
+                issues[user["jira"]], other_issues or {},
+                event.get("jira_current_sprint_url"), event.get("jira_backlog_url"),
+                greeting=False, partial=partial)
+    return reports
+
+
+def lambda_handler(event, context):
+    logger.debug(f"start processing {event}")
+    # the module stays loaded between invocations of a warm Lambda
+    metrics.reset()
+    function_name = getattr(context, "function_name", "get_pull_requests")
+    # answer with what's there before the invocation times out
+    deadline = Deadline.from_lambda_context(context)
+    try:
+        with profile_from_env(f"/tmp/{function_name}.pstats"):
+            _handle_event(event, deadline)
+    finally:
+        metrics.log_emf(function_name)
+
+
+def _create_snapshot(event, deadline=None):
+    """
+    Store the reports of the whole team for `slack_lambda.py` to answer from.
+    Scheduled events don't carry the configuration, so it's taken from the environment.
+    With a `utils.Deadline` see `_process`.
+    """
+    store = open_store()
+    if store is None:
+        logger.error("Snapshots need a STATE_STORE.")
+        return None
+
+    event = {
+        "github_organization": os.environ.get("GITHUB_ORGANIZATION"),
+        "github_token": os.environ.get("GITHUB_TOKEN"),
+        "jira_token": os.environ.get("JIRA_TOKEN"),
+        "jira_board_id": os.environ.get("JIRA_BOARD_ID"),
+        "jira_current_sprint_url": os.environ.get("JIRA_CURRENT_SPRINT_URL"),
+        "jira_backlog_url": os.environ.get("JIRA_BACKLOG_URL"),
+        **event,
+    }
+    reports = _process_team(event, deadline)
+    jira_users = {user["github"]: user["jira"] for user in _user_map(event).users()}
+    return SnapshotStore(store).save({github_user: {"jira": jira_users[github_user], "report": report}
+                                      for github_user, report in reports.items()})
+
+
+class ResponseUrl:
+    """
+    Send messages to a Slack `response_url`, which accepts at most
+    5 messages within 30 minutes. With `replace_original` every message
+    replaces the previous one instead of being added.
+    """
+    MAX_MESSAGES = 5
+
+    def __init__(self, response_url, replace_original=False):
+        self.response_url = response_url
+        self.replace_original = replace_original
+        self.sent = 0
+        self.last_message = None
+
+    def post(self, message):
+        if message == self.last_message:
+            return
+        if self.sent >= self.MAX_MESSAGES:
+            logger.warning(f"Not sending more than {self.MAX_MESSAGES} messages to {self.response_url}")
+            return
+
+        logger.debug(f"responding to: {self.response_url}")
+        response = {"text": message}
+        if self.replace_original:
+            response["replace_original"] = True
+        with metrics.stage("post"):
+            r = http_transport.request("POST", self.response_url, json=response)
+        metrics.record_response(r)
+        r.raise_for_status()
+        self.sent += 1
+        self.last_message = message
+
+
+def _handle_event(event, deadline=None):
+    if event.get("snapshot"):
+        # scheduled, nobody to respond to
+        _create_snapshot(event, deadline)
+        return
+    if event.get("shard"):
+        # invoked by `shards.LambdaShardRunner`, which waits for the result in the store
+        store = open_store()
+        if store is None:
+            logger.error("Shards need a STATE_STORE.")
+            return
+        run_shard_event(event, store)
+        return
+
+    progressive = bool(event.get("progressive"))
+    response_url = ResponseUrl(event.get("response_url"), replace_original=progressive)
+
+    message = None
+    try:
+        if event.get("team"):
+            message = team_message(_process_team(event, deadline))
+        elif progressive:
+            # replaces the ":waittime:" message of the command step by step
+            message = _process(event, on_update=response_url.post, deadline=deadline)
+        else:
+            message = _process(event, deadline=deadline)
+
+        response_url.post(message)
+    finally:
+        if event.get("job_id"):
+            _finish_job(event["job_id"], message)
+
+
+def _finish_job(job, message):
+    """
+    Answer the duplicate commands attached to the job by `slack_lambda.py`
+    """
+    coalescer = open_coalescer()
+    if coalescer is None:
+        return
+    for url in coalescer.finish(job):
+        try:
+            ResponseUrl(url).post(message or ":warning: Sorry, that didn't work. Please try again.")
+        except requests.RequestException as e:
+            logger.warning(f"Couldn't answer {url}: {e}")
@@ -1,32 +1,252 @@
+"""
+Send direct messages on Slack, one or many at once.
+
+In bulk mode (`--bulk`, `--from-snapshot` or `DirectMessenger.send_many`)
+one client is used for all messages, the DM channels are cached in the state
+store (`STATE_STORE`) so `conversations.open` is only called for new users,
+and messages are sent concurrently within the rate limits of Slack:
+
+ * `SLACK_DM_CONCURRENCY` - messages sent at the same time (default: 4)
+
+The Slack users of the user map (`--from-snapshot`) are user names, their
+IDs are looked up with `users.list` and cached in the state store as well,
+unknown users are looked up again after `SLACK_USERS_MAX_AGE` seconds
+(default: 86400).
+
+Slack allows short bursts above its per minute limits (e.g. 50 calls of
+`conversations.open`), requests rejected with HTTP 429 are retried after
+`Retry-After` seconds.
+"""
+
 import os
 import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+from slack_sdk.errors import SlackApiError, SlackClientError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+
+from snapshots import SnapshotStore, greeting
+from state_store import open_store
+from utils import format_help_as_md, UserMap
+
+logger = logging.getLogger(__name__)
+
+SLACK_DM_CONCURRENCY = int(os.getenv("SLACK_DM_CONCURRENCY", "4"))
+RATE_LIMIT_RETRIES = 5
+SLACK_USERS_MAX_AGE = int(os.getenv("SLACK_USERS_MAX_AGE", "86400"))
+
+
+class DirectMessenger:
+    def __init__(self, token, store=None, max_workers=None, client=None, prefix="slack_dm_channels",
+                 users_key="slack_user_ids"):
+        """
+        `store` is a store of `state_store.py` to keep the DM channels in
+        """
+        if client is None:
+            client = WebClient(token=token)
+            client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=RATE_LIMIT_RETRIES))
+        self.client = client
+        self.store = store
+        self.max_workers = max_workers or SLACK_DM_CONCURRENCY
+        self.key = prefix
+        self.users_key = users_key
+        self._channels = None
+        self._channels_changed = False
+        self._lock = threading.Lock()
+
+    def _load_channels(self):
+        with self._lock:
+            if self._channels is None:
+                self._channels = (self.store.get_json(self.key) if self.store is not None else None) or {}
+            return self._channels
+
+    def save_channels(self):
+        """
+        Store the DM channels opened since the last call
+        """
+        with self._lock:
+            if self.store is None or not self._channels_changed:
+                return
+            self.store.put_json(self.key, self._channels)
+            self._channels_changed = False
+
+    def user_ids(self, names):
+        """
+        Return the Slack user IDs by user name, names Slack doesn't know are left out.
+        `users.list` is only called if a name isn't cached in the store and
+        the cache is older than `SLACK_USERS_MAX_AGE`.
+        """
+        names = set(names)
+        cached = (self.store.get_json(self.users_key) if self.store is not None else None) or {}
+        user_ids = cached.get("user_ids", {})
+        if not names <= user_ids.keys() and time.time() - cached.get("listed_at", 0) > SLACK_USERS_MAX_AGE:
+            listed_at = time.time()
+            user_ids = {}
+            cursor = None
+            while True:
+                response = self.client.users_list(cursor=cursor, limit=200)
+                for member in response["members"]:
+                    if not member.get("deleted"):
+                        user_ids[member["name"]] = member["id"]
+                cursor = (response.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+            if self.store is not None:
+                self.store.put_json(self.users_key, {"listed_at": listed_at, "user_ids": user_ids})
+        return {name: user_ids[name] for name in names if name in user_ids}
+
+    def channel(self, user_id):
+        """
+        Return the ID of the DM channel with `user_id`, opened only once
+        """
+        channel_id = self._load_channels().get(user_id)
+        if channel_id is None:
+            response = self.client.conversations_open(users=[user_id])
+            channel_id = response["channel"]["id"]
+            with self._lock:
+                self._channels[user_id] = channel_id
+                self._channels_changed = True
+        return channel_id
+
+    def send(self, user_id, message):
+        """
+        Send `message` to `user_id`, return the error of Slack (or of the connection) or None
+        """
+        try:
+            self.client.chat_postMessage(channel=self.channel(user_id), text=message)
+        except SlackApiError as e:
+            error = e.response["error"]
+            if error == "channel_not_found":
+                # the cached channel is gone, open a new one next time
+                with self._lock:
+                    if self._channels.pop(user_id, None) is not None:
+                        self._channels_changed = True
+            logger.warning(f"Error sending message to {user_id}: {error}")
+            return error
+        except (SlackClientError, OSError) as e:
+            # e.g. a timeout, the other messages are sent anyway
+            error = str(e) or type(e).__name__
+            logger.warning(f"Error sending message to {user_id}: {error}")
+            return error
+        return None
+
+    def send_many(self, messages):
+        """
+        Send all `(user_id, message)` pairs, return the errors by user ID
+        """
+        messages = list(messages)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                errors = list(executor.map(lambda m: self.send(*m), messages))
+        finally:
+            self.save_channels()
+        return {user_id: error for (user_id, _), error in zip(messages, errors) if error}
+
 
 def send_dm(token, user_id, message):
-    client = WebClient(token=token)
-    try:
-        response = client.conversations_open(users=[user_id])
-        channel_id = response["channel"]["id"]
-        client.chat_postMessage(channel=channel_id, text=message)
+    messenger = DirectMessenger(token, store=open_store())
+    error = messenger.send(user_id, message)
+    messenger.save_channels()
+    if error:
+        print(f"Error sending message: {error}")
+    else:
         print("Message sent successfully!")
-    except SlackApiError as e:
-        print(f"Error sending message: {e.response['error']}")
+
+
+def read_messages(file_name):
+    """
+    Return the `(user_id, message)` pairs of a JSON file (`-` for stdin), either
+    `{"<user_id>": "<message>", …}` or `[{"user": "<user_id>", "message": "<message>"}, …]`
+    """
+    if file_name == "-":
+        data = json.load(sys.stdin)
+    else:
+        with open(file_name, encoding="utf-8") as f:
+            data = json.load(f)
+    if isinstance(data, dict):
+        return list(data.items())
+    return [(entry["user"], entry["message"]) for entry in data]
+
+
+def snapshot_messages(user_map_file, messenger):
+    """
+    Return the `(user_id, message)` pairs of the newest snapshot of the
+    reports, for everyone in `user_map_file` with a Slack user, whose ID
+    is looked up with `messenger` (a `DirectMessenger`)
+    """
+    store = open_store()
+    if store is None:
+        raise ValueError("STATE_STORE is needed to read the snapshot")
+    snapshot = SnapshotStore(store).latest(max_age=float("inf"))
+    if snapshot is None:
+        raise ValueError("There is no snapshot of the reports")
+
+    user_map = UserMap(user_map_file)
+    slack_users = {github_user: user_map.github2slack(github_user) for github_user in snapshot["reports"]}
+    user_ids = messenger.user_ids(slack_user for slack_user in slack_users.values() if slack_user)
+    ret = []
+    for github_user, entry in snapshot["reports"].items():
+        slack_user = slack_users[github_user]
+        if not slack_user:
+            continue
+        if slack_user not in user_ids:
+            logger.warning(f"There is no Slack user {slack_user} for {github_user}")
+            continue
+        ret.append((user_ids[slack_user], greeting() + entry["report"]))
+    return ret
+
 
 def main():
     parser = argparse.ArgumentParser(description="Send a direct message on Slack.")
     parser.add_argument("-t", "--token", type=str, default=os.getenv("SLACK_BOT_TOKEN"),
                         help="Slack Bot User OAuth Token (defaults to env var SLACK_BOT_TOKEN)")
-    parser.add_argument("-u", "--user", type=str, required=True, help="Slack User ID to send the message to")
-    parser.add_argument("-m", "--message", type=str, required=True, help="Message to send")
-    
+    parser.add_argument("-u", "--user", type=str, help="Slack User ID to send the message to")
+    parser.add_argument("-m", "--message", type=str, help="Message to send")
+    parser.add_argument("--bulk", type=str, metavar="FILE",
+                        help="Send all messages of a JSON file (`-` for stdin), either an object of messages "
+                             "by Slack User ID or a list of objects with `user` and `message`")
+    parser.add_argument("--from-snapshot", action="store_true",
+                        help="Send everyone in the user map their report of the newest snapshot in STATE_STORE")
+    parser.add_argument("--user-map", type=str, default=os.getenv("USER_MAP_FILE", "usermap.yaml"),
+                        help="User map for --from-snapshot (defaults to env var USER_MAP_FILE or usermap.yaml)")
+    parser.add_argument("--concurrency", type=int, default=SLACK_DM_CONCURRENCY,
+                        help="Messages sent at the same time in bulk mode (defaults to env var SLACK_DM_CONCURRENCY or 4)")
+    parser.add_argument("--help-md", action="store_true", help="Show help as Markdown")
+
     args = parser.parse_args()
-    
+
+    if args.help_md:
+        print(format_help_as_md(parser))
+        return
+
     if not args.token:
         print("Error: Slack token is required (provide via argument or set SLACK_BOT_TOKEN env variable).")
         exit(1)
 
-    send_dm(args.token, args.user, args.message)
+    if not args.bulk and not args.from_snapshot:
+        if not args.user or not args.message:
+            parser.error("--user and --message are required without --bulk or --from-snapshot")
+        send_dm(args.token, args.user, args.message)
+        return
+
+    messenger = DirectMessenger(args.token, store=open_store(), max_workers=args.concurrency)
+    messages = read_messages(args.bulk) if args.bulk else []
+    if args.from_snapshot:
+        messages += snapshot_messages(args.user_map, messenger)
+
+    errors = messenger.send_many(messages)
+    print(f"Sent {len(messages) - len(errors)} of {len(messages)} messages.")
+    for user_id, error in errors.items():
+        print(f"Error sending message to {user_id}: {error}")
+    if errors:
+        exit(1)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Run the Slack bot as one long running server instead of AWS Lambda functions.
+
+The server answers the signed requests of the Slack commands like
+`slack_lambda.py` does, but collects the reports in its own pool of worker
+threads instead of invoking `slack_lambda_get_pull_requests.py` as another
+AWS Lambda. Connections, clients and caches stay warm between commands.
+
+Secrets (`SLACK_SCHUTZBOT_SIGNING_SECRET`, `SCHUTZBOT_GITHUB_TOKEN`,
+`SLACK_COMMAND_JIRA_TOKEN`) and the rest of the configuration are read from
+the environment. Put it behind a reverse proxy terminating TLS and point the
+"Request URL" of the Slack commands to it.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import slack_lambda
+import slack_lambda_get_pull_requests
+from utils import add_profile_argument, format_help_as_md, start_profiling
+
+logger = logging.getLogger(__name__)
+
+SLACK_SERVER_WORKERS = int(os.getenv("SLACK_SERVER_WORKERS", "4"))
+
+
+class SlackRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        # health check
+        self._send({"statusCode": 200, "headers": {"Content-Type": "application/json"},
+                    "body": {"status": "ok"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        event = {"headers": dict(self.headers.items()), "body": self.rfile.read(length).decode("utf-8")}
+
+        response = slack_lambda._retry_response(event)
+        if response is None:
+            body, response = slack_lambda._check_request_validity(event)
+            if response is None:
+                response = slack_lambda._handle_request(urllib.parse.parse_qs(body), self.server.staging,
+                                                        dispatch=self.server.dispatch)
+        self._send(response)
+
+    def _send(self, response):
+        if isinstance(response, str):
+            response = {"statusCode": 200, "headers": {"Content-Type": "text/plain; charset=utf-8"}, "body": response}
+        body = response.get("body", "")
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        body = body.encode("utf-8")
+
+        self.send_response(response["statusCode"])
+        for name, value in response.get("headers", {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class SlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, max_workers=None, staging=False, dispatch=None):
+        """
+        The reports are collected by `max_workers` threads (default: `SLACK_SERVER_WORKERS`)
+        unless `dispatch(payload, staging)` is given.
+        """
+        super().__init__(server_address, SlackRequestHandler)
+        self.staging = staging
+        self.executor = None
+        if dispatch is None:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers or SLACK_SERVER_WORKERS,
+                                               thread_name_prefix="report")
+            dispatch = self._submit
+        self.dispatch = dispatch
+
+    def _submit(self, payload, staging=False):
+        self.executor.submit(self._run, payload)
+
+    @staticmethod
+    def _run(payload):
+        try:
+            slack_lambda_get_pull_requests._handle_event(payload)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception(f"Failed to answer {payload.get('response_url')}")
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+def main():
+    """Run the Slack bot as a long running server"""
+    parser = argparse.ArgumentParser(allow_abbrev=False, description=__doc__)
+    parser.add_argument("--host", help="Address to listen on", default="127.0.0.1")
+    parser.add_argument("--port", help="Port to listen on (defaults to env var PORT or 3000)", type=int,
+                        default=int(os.getenv("PORT", "3000")))
+    parser.add_argument("--workers", type=int, default=SLACK_SERVER_WORKERS,
+                        help="Reports collected at the same time (defaults to env var SLACK_SERVER_WORKERS or 4)")
+    parser.add_argument("--staging", help="Answer the `_staging` variants of the commands", action="store_true")
+    add_profile_argument(parser)
+    parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
+
+    if "--help-md" in sys.argv:
+        print(format_help_as_md(parser))
+        sys.exit(0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    start_profiling(args.profile)
+
+    server = SlackServer((args.host, args.port), max_workers=args.workers, staging=args.staging)
+    logger.info(f"Listening on {args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
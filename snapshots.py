@@ -0,0 +1,88 @@
+"""
+Pre-rendered Slack reports of the whole team, created on a schedule by
+`slack_lambda_get_pull_requests.py` and answered from by `slack_lambda.py`
+within Slack's 3 second timeout.
+
+Every snapshot is stored as a new version in the state store,
+`snapshots/latest` always points to the newest one.
+"""
+
+import logging
+import os
+import time
+
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# snapshots older than this (in seconds) aren't used for answers
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "900"))
+SNAPSHOTS_KEPT = 5
+
+
+def greeting(team=False):
+    if team:
+        return f"Happy {datetime.now().strftime('%A')}! 👋 Here is the overview of the whole team.\n\n"
+    return f"Happy {datetime.now().strftime('%A')}! 👋\n\n"
+
+
+def team_message(reports):
+    """
+    Return the message with the reports of all users, `reports` by GitHub user
+    """
+    return greeting(team=True) + "\n\n---\n\n".join(
+        f"*{github_user}*\n{report}" for github_user, report in reports.items())
+
+
+class SnapshotStore:
+    def __init__(self, store, prefix="snapshots"):
+        """
+        `store` is a store of `state_store.py`
+        """
+        self.store = store
+        self.prefix = prefix
+
+    def save(self, reports):
+        """
+        Store a new version of the reports, a dictionary by GitHub user of
+        `{"jira": <jira user>, "report": <report without greeting>}`
+        """
+        created_at = time.time()
+        version = datetime.fromtimestamp(created_at).strftime("%Y%m%dT%H%M%S")
+        snapshot = {"version": version, "created_at": created_at, "reports": reports}
+        self.store.put_json(f"{self.prefix}/versions/{version}", snapshot)
+        self.store.put_json(f"{self.prefix}/latest", snapshot)
+
+        for old in self.store.list_keys(f"{self.prefix}/versions/")[:-SNAPSHOTS_KEPT]:
+            self.store.delete(old)
+        logger.info(f"Saved snapshot {version} with {len(reports)} reports")
+        return version
+
+    def latest(self, max_age=SNAPSHOT_MAX_AGE):
+        """
+        Return the newest snapshot or None if there is none younger than `max_age` seconds
+        """
+        snapshot = self.store.get_json(f"{self.prefix}/latest")
+        if snapshot is None or time.time() - snapshot["created_at"] > max_age:
+            return None
+        return snapshot
+
+    def message(self, github_user, jira_user, team=False, max_age=SNAPSHOT_MAX_AGE):
+        """
+        Return the message for a user (or the whole team) from the newest
+        snapshot or None if it can't be answered from it.
+        """
+        snapshot = self.latest(max_age)
+        if snapshot is None:
+            return None
+
+        if team:
+            message = team_message({user: entry["report"] for user, entry in snapshot["reports"].items()})
+        else:
+            entry = snapshot["reports"].get(github_user)
+            if entry is None or entry["jira"] != jira_user:
+                return None
+            message = greeting() + entry["report"]
+
+        created = datetime.fromtimestamp(snapshot["created_at"]).strftime("%H:%M")
+        return f"{message}\n\n_As of {created}, add `refresh` to the command for the current state._"
@@ -0,0 +1,200 @@
+"""
+Small JSON document store shared between scripts and AWS Lambda functions.
+
+`open_store()` returns the store configured with the `STATE_STORE`
+environment variable:
+
+ * `s3://bucket/prefix` - an S3 bucket, e.g. for AWS Lambda
+ * `file:///path/to/dir` or just a path - a local directory
+ * `memory://` - a process local dictionary, e.g. for tests
+
+All stores have the same methods: `get_json`, `put_json`,
+`put_json_if_absent`, `list_keys` and `delete`. Keys are `/` separated,
+values are anything `json` can serialize, including records.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from urllib.parse import urlparse
+
+from utils import json_default
+
+logger = logging.getLogger(__name__)
+
+STATE_STORE = os.getenv("STATE_STORE")
+
+
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_json(self, key):
+        with self._lock:
+            data = self._data.get(key)
+        return None if data is None else json.loads(data)
+
+    def put_json(self, key, value):
+        data = json.dumps(value, default=json_default)
+        with self._lock:
+            self._data[key] = data
+
+    def put_json_if_absent(self, key, value):
+        """
+        Store `value` only if `key` doesn't exist yet, return if it was stored.
+        """
+        data = json.dumps(value, default=json_default)
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = data
+            return True
+
+    def list_keys(self, prefix=""):
+        with self._lock:
+            return sorted(k for k in self._data if k.startswith(prefix))
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class FileStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, *key.split("/")) + ".json"
+
+    def get_json(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put_json(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, default=json_default)
+        os.replace(tmp_path, path)
+
+    def put_json_if_absent(self, key, value):
+        """
+        Store `value` only if `key` doesn't exist yet, return if it was stored.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and link, so readers never see a partial file and linking fails if the key exists
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, default=json_default)
+            os.link(tmp_path, path)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+        return True
+
+    def list_keys(self, prefix=""):
+        ret = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                key = os.path.relpath(os.path.join(root, name), self.directory)[:-len(".json")]
+                key = key.replace(os.sep, "/")
+                if key.startswith(prefix):
+                    ret.append(key)
+        return sorted(ret)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Store:
+    def __init__(self, bucket, prefix="", client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def get_json(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key + ".json")
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response["Body"].read())
+
+    def put_json(self, key, value):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key + ".json",
+                               Body=json.dumps(value, default=json_default).encode("utf-8"),
+                               ContentType="application/json")
+
+    def put_json_if_absent(self, key, value):
+        """
+        Store `value` only if `key` doesn't exist yet, return if it was stored.
+        """
+        from botocore.exceptions import ClientError
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self.prefix + key + ".json",
+                                   Body=json.dumps(value, default=json_default).encode("utf-8"),
+                                   ContentType="application/json", IfNoneMatch="*")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise
+        return True
+
+    def list_keys(self, prefix=""):
+        ret = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(self.prefix):]
+                if key.endswith(".json"):
+                    ret.append(key[:-len(".json")])
+        return sorted(ret)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key + ".json")
+
+
+_memory_store = None
+
+
+def open_store(url=None):
+    """
+    Return the store for `url` (default: `STATE_STORE`) or None if there is none.
+    """
+    global _memory_store
+    url = url or STATE_STORE
+    if not url:
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3Store(parsed.netloc, parsed.path)
+    if parsed.scheme == "memory":
+        if _memory_store is None:
+            _memory_store = MemoryStore()
+        return _memory_store
+    if parsed.scheme == "file":
+        return FileStore(parsed.path)
+    if parsed.scheme == "":
+        return FileStore(url)
+    raise ValueError(f"Unknown state store '{url}'")
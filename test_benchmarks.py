@@ -0,0 +1,538 @@
+"""
+Benchmarks against the local stand-in APIs of `fake_server.py`.
+
+Every scenario reports the number of requests per endpoint, the wall time
+and the peak memory. The request counts and generous time and memory
+budgets are asserted, so performance regressions show up as test failures.
+
+Set `BENCHMARK_SCALES` to a comma separated list of pull request counts
+(default: `10,100`), e.g. `BENCHMARK_SCALES=10,1000,10000` for a full run.
+The rendering of the reports doesn't need any requests, it always runs
+for `RENDER_SCALES`.
+"""
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+import yaml
+
+import circuit_breaker
+import get_jira_sprint
+import get_pull_requests
+import shards
+import slack_lambda_get_pull_requests
+
+from fake_server import FakeServer, FakeData, FAKE_ORG, FAKE_BOARD_ID, FAKE_USERS
+from state_store import MemoryStore
+from utils import Deadline, DeadlineExceeded
+
+BENCHMARK_SCALES = [int(s) for s in os.getenv("BENCHMARK_SCALES", "10,100").split(",")]
+RENDER_SCALES = [10, 100, 1000, 10000]
+
+# all results, printed at the end
+RESULTS = []
+
+
+def run_scenario(server, name, scale, function):
+    """
+    Run `function()` and return the measurements of it, `server` is None
+    for scenarios without requests.
+    """
+    if server is not None:
+        server.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        function()
+    finally:
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    result = {
+        "scenario": name,
+        "scale": scale,
+        "requests": server.total_requests() if server is not None else 0,
+        "by_endpoint": dict(server.requests) if server is not None else {},
+        "wall_time": wall_time,
+        "peak_memory": peak_memory,
+    }
+    RESULTS.append(result)
+    return result
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    """
+    Runs every test once per scale against a fresh `FakeServer`.
+    """
+
+    def fake_server(self, scale, data=None, **kwargs):
+        server = FakeServer(data or FakeData(scale), **kwargs).start()
+        self.addCleanup(server.stop)
+        # every scenario starts with closed circuits
+        circuit_breaker.reset()
+        for patcher in [
+            patch.object(get_pull_requests, "GITHUB_API_URL", server.url),
+            patch.object(get_pull_requests, "JIRA_HOST", server.url),
+            patch.object(get_jira_sprint, "JIRA_HOST", server.url),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return server
+
+    def assertBudget(self, result, max_requests, max_seconds, max_memory):
+        self.assertLessEqual(result["requests"], max_requests, result["by_endpoint"])
+        self.assertLessEqual(result["wall_time"], max_seconds)
+        self.assertLessEqual(result["peak_memory"], max_memory)
+
+
+class TestDataProcessorBenchmark(BenchmarkTestCase):
+
+    def test_org_wide_pull_requests(self):
+        for scale in BENCHMARK_SCALES:
+            with self.subTest(scale=scale):
+                server = self.fake_server(scale)
+                data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token")
+                result = run_scenario(server, "DataProcessor.process", scale, data_processor.process)
+
+                processed = min(scale, get_pull_requests.SEARCH_MAX_RESULTS)
+                self.assertEqual(len(data_processor.with_jira) + len(data_processor.without_jira), processed)
+                # search pages + one pulls.get per pull request
+                self.assertBudget(result,
+                                  max_requests=math.ceil(processed / 100) + processed,
+                                  max_seconds=5 + processed * 0.05,
+                                  max_memory=20 * 2**20 + processed * 100 * 2**10)
+
+    def test_minimal_fields(self):
+        scale = min(BENCHMARK_SCALES)
+        server = self.fake_server(scale)
+        data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", fields="minimal")
+        result = run_scenario(server, "DataProcessor.process (minimal)", scale, data_processor.process)
+        # only the search
+        self.assertEqual(result["requests"], 1, result["by_endpoint"])
+
+        pull_request = data_processor.with_jira[0]
+        self.assertFalse(pull_request.is_loaded("additions"))
+        self.assertIsInstance(pull_request["additions"], int)
+        self.assertTrue(pull_request.is_loaded("mergeable_state"))
+        self.assertEqual(server.requests["GET /repos/{owner}/{repo}/pulls/{number}"], 1)
+
+    def test_archived_repos_excluded_by_search(self):
+        server = FakeServer(FakeData(50, archived_repos=2)).start()
+        self.addCleanup(server.stop)
+        github_api = get_pull_requests.InstrumentedGhApi(token="token", gh_host=server.url)
+        data = server.data
+        pull_requests = list(get_pull_requests.search_pull_requests(
+            github_api, f"org:{FAKE_ORG} type:pr is:open archived:false"))
+        self.assertEqual(len(pull_requests), len([pr for pr in data.pull_requests
+                                                  if pr["repo"] not in data.archived_repos]))
+
+        self.assertEqual(server.requests["GET /orgs/{org}/repos"], 0)
+
+    def test_related_issues(self):
+        for scale in BENCHMARK_SCALES:
+            with self.subTest(scale=scale):
+                server = self.fake_server(scale, data=FakeData(scale, epics=3))
+                data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", fields="minimal")
+                data_processor.process()
+                jira_data_processor = get_jira_sprint.JiraDataProcessor("token", None, FAKE_BOARD_ID)
+
+                result = run_scenario(server, "DataProcessor.collect_related_issues", scale,
+                                      lambda: data_processor.collect_related_issues(jira_data_processor))
+
+                data = server.data
+                epics = sorted({issue["epic"] for issue in data.issues.values() if issue.get("epic")},
+                               key=lambda k: int(k.split("-")[1]))
+                self.assertEqual(data_processor.unique_sorted_epics, epics)
+                self.assertEqual({epic: sorted(pr["jira_key"] for pr in prs)
+                                  for epic, prs in data_processor.data_collection_jira.items()},
+                                 {epic: sorted(key for key, issue in data.issues.items() if issue.get("epic") == epic)
+                                  for epic in epics})
+                self.assertEqual(len(data_processor.related_issues), len(data_processor.with_jira) + len(epics))
+                # the issues 100 keys per query, then all epics at once
+                self.assertEqual(server.requests["GET /rest/api/2/search"],
+                                 math.ceil(len(data_processor.with_jira) / 100) + 1, result["by_endpoint"])
+
+    def test_rate_limited_pull_requests(self):
+        scale = min(BENCHMARK_SCALES)
+        server = self.fake_server(scale, rate_limit_every=5)
+        data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token")
+        with patch.object(get_pull_requests.time, "sleep") as sleep:
+            result = run_scenario(server, "DataProcessor.process (429)", scale, data_processor.process)
+        self.assertGreater(server.requests["429"], 0)
+        self.assertEqual(len(data_processor.with_jira) + len(data_processor.without_jira), scale)
+        self.assertLessEqual(sleep.call_count, server.requests["429"])
+        self.assertLessEqual(result["requests"], 2 * (scale + 2))
+
+
+class FakeLambdaClient:
+    """
+    Runs the asynchronous invocations in threads, the first one of every shard in `fail` fails
+    """
+
+    def __init__(self, store, fail=()):
+        self.store = store
+        self.fail = set(fail)
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        event = json.loads(Payload)
+        self.invocations.append(event["shard"]["created"])
+        if event["shard"]["created"] in self.fail:
+            self.fail.remove(event["shard"]["created"])
+            self.store.put_json(event["shard_key"], {"status": "failed", "error": "Task timed out"})
+        else:
+            threading.Thread(target=slack_lambda_get_pull_requests._handle_event, args=(event,)).start()
+
+
+class TestShardsBenchmark(BenchmarkTestCase):
+    # more than one search can return
+    SCALE = 2500
+    SHARD_SIZE = 400
+
+    def test_plan_shards(self):
+        server = self.fake_server(self.SCALE)
+        github_api = get_pull_requests.InstrumentedGhApi(token="token", gh_host=server.url)
+        planned = shards.plan_shards(github_api, FAKE_ORG, shard_size=self.SHARD_SIZE)
+
+        self.assertEqual(sum(shard["count"] for shard in planned), self.SCALE)
+        self.assertTrue(all(shard["count"] <= self.SHARD_SIZE for shard in planned), planned)
+        # the ranges don't overlap
+        ranges = [shard["created"].split("..") for shard in planned]
+        self.assertTrue(all(a[1] < b[0] for a, b in zip(ranges, ranges[1:])), ranges)
+
+        # the searches of the planning are limited
+        server.reset()
+        planned = shards.plan_shards(github_api, FAKE_ORG, shard_size=self.SHARD_SIZE, max_searches=3)
+        self.assertLessEqual(server.requests["GET /search/issues"], 3)
+        self.assertEqual(sum(shard["count"] for shard in planned), self.SCALE)
+
+    def test_process_shards(self):
+        server = self.fake_server(self.SCALE)
+        data_processor = get_pull_requests.DataProcessor(
+            FAKE_ORG, None, None, "token", fields="minimal",
+            shard_runner=shards.ProcessShardRunner("token", workers=4, shard_size=self.SHARD_SIZE))
+        run_scenario(server, "DataProcessor.process (4 shard processes)", self.SCALE, data_processor.process)
+
+        pull_requests = data_processor.with_jira + data_processor.without_jira
+        self.assertEqual(sorted(pr["number"] for pr in pull_requests), list(range(1, self.SCALE + 1)))
+        # the fields of the search come from the workers, the others are fetched when accessed
+        self.assertFalse(pull_requests[0].is_loaded("additions"))
+        self.assertIsInstance(pull_requests[0]["additions"], int)
+
+    def test_lambda_shards(self):
+        server = self.fake_server(self.SCALE)
+        store = MemoryStore()
+        github_api = get_pull_requests.InstrumentedGhApi(token="token", gh_host=server.url)
+        planned = shards.plan_shards(github_api, FAKE_ORG, shard_size=self.SHARD_SIZE)
+        lambda_client = FakeLambdaClient(store, fail=[planned[0]["created"]])
+        runner = shards.LambdaShardRunner("get_pull_requests", store, "token", workers=3, poll_interval=0.05,
+                                          shard_size=self.SHARD_SIZE, lambda_client=lambda_client)
+
+        with patch.object(slack_lambda_get_pull_requests, "open_store", return_value=store):
+            pull_requests = runner.pull_requests(github_api, FAKE_ORG, None, None, "minimal")
+
+        self.assertEqual(sorted(pr["number"] for pr in pull_requests), list(range(1, self.SCALE + 1)))
+        # the failed shard was invoked again
+        self.assertEqual(len(lambda_client.invocations), len(planned) + 1)
+        self.assertEqual(store.list_keys("shards/"), [])
+
+        runner.retries = 0
+        lambda_client.fail = {planned[0]["created"]}
+        with self.assertRaises(shards.ShardError):
+            runner.run(planned[:1], "minimal")
+
+    def test_lambda_shards_without_store(self):
+        with self.assertRaises(ValueError):
+            shards.LambdaShardRunner("get_pull_requests", None, "token", lambda_client=FakeLambdaClient(None))
+        # the worker doesn't crash
+        with patch.object(slack_lambda_get_pull_requests, "open_store", return_value=None), \
+                patch.object(slack_lambda_get_pull_requests, "run_shard_event") as run_shard_event:
+            slack_lambda_get_pull_requests._handle_event({"shard": {"org": FAKE_ORG}, "shard_key": "shards/x/0"})
+        run_shard_event.assert_not_called()
+
+
+class TestDeadlineBenchmark(BenchmarkTestCase):
+
+    def test_backoff_skipped(self):
+        # every other `pulls.get` is rate limited, the 2 seconds backoff doesn't fit
+        server = self.fake_server(10, rate_limit_every=2)
+        data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", deadline=Deadline(1))
+        result = run_scenario(server, "DataProcessor.process (deadline)", 10, data_processor.process)
+
+        self.assertTrue(data_processor.partial)
+        self.assertEqual(len(data_processor.with_jira) + len(data_processor.without_jira), 1)
+        self.assertLess(result["wall_time"], 1)
+
+    def test_partial_report(self):
+        server = self.fake_server(10, latency=0.2)
+        event = TestSlackReportBenchmark.event
+
+        def process():
+            process.message = slack_lambda_get_pull_requests._process(event, deadline=Deadline(1))
+
+        result = run_scenario(server, "slack_lambda_get_pull_requests._process (deadline)", 10, process)
+        self.assertIn("Work from your", process.message)
+        self.assertTrue(process.message.endswith(slack_lambda_get_pull_requests.PARTIAL_MARKER))
+        self.assertLess(result["wall_time"], 1.5)
+
+        process.message = slack_lambda_get_pull_requests._process(event, deadline=Deadline(60))
+        self.assertNotIn("Partial report", process.message)
+
+    def test_partial_sprint_section(self):
+        self.fake_server(10, latency=0.2)
+        updates = []
+        # Jira fails fast, e.g. its breaker is open
+        with patch.object(slack_lambda_get_pull_requests, "_fetch_issues",
+                          return_value=(None, slack_lambda_get_pull_requests.NO_ISSUES)):
+            slack_lambda_get_pull_requests._process(TestSlackReportBenchmark.event, on_update=updates.append,
+                                                    deadline=Deadline(60))
+        self.assertIn(":waittime: Fetching your PRs", updates[0])
+        self.assertTrue(updates[0].endswith(slack_lambda_get_pull_requests.PARTIAL_MARKER))
+
+
+    def test_jira_backoff_skipped(self):
+        # the second search (the backlog) is rate limited for a minute
+        server = self.fake_server(10, rate_limit_every=2, retry_after=60)
+        jira_data_processor = get_jira_sprint.JiraDataProcessor("token", None, FAKE_BOARD_ID, deadline=Deadline(5))
+
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            jira_data_processor.get_issue_overview()
+        self.assertLess(time.perf_counter() - start, 5)
+        # neither the session nor `_retry_on_rate_limit` tried again
+        self.assertEqual(server.requests["GET /rest/api/2/search"], 2)
+
+    def test_slow_jira(self):
+        # every answer takes longer than the deadline
+        server = self.fake_server(10, latency=3)
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            get_jira_sprint.JiraDataProcessor("token", None, FAKE_BOARD_ID, deadline=Deadline(1))
+        self.assertLess(time.perf_counter() - start, 2)
+
+        # Jira slows down after connecting
+        server.latency = 0
+        jira_data_processor = get_jira_sprint.JiraDataProcessor("token", None, FAKE_BOARD_ID, deadline=Deadline(1))
+        server.latency = 3
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            jira_data_processor.get_issues(["HMS-1"])
+        self.assertLess(time.perf_counter() - start, 2)
+
+
+class TestMultipleSourcesBenchmark(BenchmarkTestCase):
+    # the fake server has the same pull requests and issues in every organisation and board
+
+    def test_organisations(self):
+        scale = min(BENCHMARK_SCALES)
+        server = self.fake_server(scale, latency=0.3)
+        data_processor = get_pull_requests.DataProcessor([FAKE_ORG, "other-org"], None, None, "token",
+                                                         fields="minimal")
+        result = run_scenario(server, "DataProcessor.process (2 orgs)", scale, data_processor.process)
+        self.assertEqual(len(data_processor.with_jira) + len(data_processor.without_jira), scale)
+        self.assertEqual(result["requests"], 2)
+        # concurrently
+        self.assertLess(result["wall_time"], 2 * 0.3)
+
+    def test_boards(self):
+        scale = min(BENCHMARK_SCALES)
+        server = self.fake_server(scale)
+
+        def overview():
+            jira_data_processor = get_jira_sprint.JiraDataProcessor(
+                "token", None, [FAKE_BOARD_ID, "2"], any_assignee=True)
+            overview.result = jira_data_processor.get_issue_overview()
+
+        run_scenario(server, "JiraDataProcessor.get_issue_overview (2 boards)", scale, overview)
+        self.assertEqual(server.requests["GET /rest/agile/1.0/board/{board_id}/configuration"], 2)
+        self.assertEqual(server.requests["GET /rest/api/2/search"], 4)
+        self.assertEqual(len(overview.result["current_sprint"]), len(server.data.issues) // 2)
+        keys = [issue["key"] for issue in overview.result["current_sprint"] + overview.result["backlog"]]
+        self.assertEqual(len(keys), len(set(keys)))
+
+
+class TestJiraDataProcessorBenchmark(BenchmarkTestCase):
+
+    def test_issue_overview(self):
+        for scale in BENCHMARK_SCALES:
+            with self.subTest(scale=scale):
+                server = self.fake_server(scale)
+
+                def overview():
+                    jira_data_processor = get_jira_sprint.JiraDataProcessor(
+                        "token", None, FAKE_BOARD_ID, any_assignee=True)
+                    overview.result = jira_data_processor.get_issue_overview()
+
+                result = run_scenario(server, "JiraDataProcessor.get_issue_overview", scale, overview)
+                self.assertEqual(len(overview.result["current_sprint"]), len(server.data.issues) // 2)
+                # server info, fields, board, sprint and backlog pages (100 issues per page)
+                self.assertBudget(result,
+                                  max_requests=3 + 2 * (math.ceil(len(server.data.issues) / 100) + 1),
+                                  max_seconds=5 + scale * 0.01,
+                                  max_memory=20 * 2**20 + scale * 50 * 2**10)
+
+
+class TestSlackReportBenchmark(BenchmarkTestCase):
+    event = {
+        "jira_user": "bcl",
+        "args": "bcl",
+        "github_organization": FAKE_ORG,
+        "github_token": "token",
+        "jira_token": "token",
+        "jira_board_id": FAKE_BOARD_ID,
+        "response_url": "http://response_url",
+    }
+
+    def test_process(self):
+        for scale in BENCHMARK_SCALES:
+            with self.subTest(scale=scale):
+                server = self.fake_server(scale)
+                event = self.event
+
+                def process():
+                    process.message = slack_lambda_get_pull_requests._process(event)
+
+                result = run_scenario(server, "slack_lambda_get_pull_requests._process", scale, process)
+                self.assertIn("Happy", process.message)
+                processed = min(scale, get_pull_requests.SEARCH_MAX_RESULTS)
+                # the report only needs the search results, no requests per pull request
+                self.assertBudget(result,
+                                  max_requests=math.ceil(processed / 100) + 10,
+                                  max_seconds=5 + processed * 0.05,
+                                  max_memory=20 * 2**20 + processed * 100 * 2**10)
+
+    def test_progressive_process(self):
+        # the pull requests of the user take longer than their Jira issues
+        scale = 100
+        server = self.fake_server(scale, latency=0.02)
+        search_pull_requests = get_pull_requests.search_pull_requests
+
+        def slow_search(*args, **kwargs):
+            time.sleep(1.5)
+            yield from search_pull_requests(*args, **kwargs)
+        response_url = slack_lambda_get_pull_requests.ResponseUrl(self.event["response_url"], replace_original=True)
+        posted = []
+
+        def post(method, url, json):
+            posted.append((time.perf_counter(), json))
+            return MagicMock(status_code=200, url=url, content=b"ok")
+
+        def process():
+            process.start = time.perf_counter()
+            message = slack_lambda_get_pull_requests._process(self.event, on_update=response_url.post)
+            response_url.post(message)
+
+        with patch.object(slack_lambda_get_pull_requests.http_transport, "request", side_effect=post), \
+             patch.object(get_pull_requests, "search_pull_requests", slow_search):
+            result = run_scenario(server, "slack_lambda_get_pull_requests._process (progressive)", scale, process)
+
+        self.assertLessEqual(len(posted), 3)
+        first_post, first_message = posted[0]
+        self.assertIn("Work from your current sprint", first_message["text"])
+        self.assertIn(":waittime:", first_message["text"])
+        self.assertNotIn("PRs not tracked in Jira", first_message["text"])
+        self.assertIn("PRs not tracked in Jira", posted[-1][1]["text"])
+        self.assertTrue(all(message["replace_original"] for _, message in posted))
+        # the sprint section doesn't wait for the pull requests
+        self.assertLess(first_post - process.start, result["wall_time"] / 2)
+
+    def test_process_team(self):
+        scale = 120
+        requests = {}
+        for users in (FAKE_USERS[:2], FAKE_USERS):
+            with self.subTest(users=len(users)):
+                server = self.fake_server(scale)
+                tmp_dir = tempfile.TemporaryDirectory()
+                self.addCleanup(tmp_dir.cleanup)
+                user_map_file = os.path.join(tmp_dir.name, "usermap.yaml")
+                with open(user_map_file, "w", encoding="utf-8") as f:
+                    yaml.safe_dump({"assignees": [{"github": user, "jira": user} for user in users]}, f)
+                event = dict(self.event, team=True, user_map_file=user_map_file)
+
+                def process():
+                    process.reports = slack_lambda_get_pull_requests._process_team(event)
+
+                result = run_scenario(server, f"slack_lambda_get_pull_requests._process_team ({len(users)} users)",
+                                      scale, process)
+                self.assertEqual(sorted(process.reports), sorted(users))
+                for user, report in process.reports.items():
+                    # every user only gets the links of their own pull requests
+                    linked = {int(number) for number in re.findall(r":github: repo-\d+#(\d+)>", report)}
+                    self.assertEqual(linked, {pr["number"] for pr in server.data.pull_requests
+                                              if pr["author"] == user})
+                requests[len(users)] = result["requests"]
+        # one search for the whole team, no requests per user
+        self.assertEqual(requests[len(FAKE_USERS)], requests[2])
+
+
+def synthetic_report_input(scale):
+    """
+    Return the arguments of `_render_report` for `scale` pull requests and as many
+    issues: half of them in the sprint, a quarter in the backlog and a quarter
+    elsewhere. Every fifth pull request has no Jira key.
+    """
+    columns = [{"name": name, "sort_id": sort_id}
+               for sort_id, name in enumerate(["To Do", "In Progress", "Review", "Done"])]
+    issues = [{"key": f"HMS-{i}", "summary": f"Issue {i}", "url": f"https://jira.example.com/browse/HMS-{i}",
+               "sprint_column": columns[i % len(columns)]} for i in range(scale)]
+    processed_issues = {"current_sprint": issues[:scale // 2], "backlog": issues[scale // 2:scale * 3 // 4]}
+    other_issues = {issue["key"]: issue for issue in issues[scale * 3 // 4:]}
+
+    with_jira, without_jira = [], []
+    for i in range(scale):
+        pr = {"repo": f"repo-{i % 10}", "number": i, "title": f"Pull request {i}",
+              "html_url": f"https://github.com/{FAKE_ORG}/repo-{i % 10}/pull/{i}"}
+        if i % 5 == 4:
+            without_jira.append(pr)
+        else:
+            # reversed, so the sprint issues of the first pull requests have none
+            key = f"HMS-{scale - 1 - i}"
+            with_jira.append({**pr, "jira_key": key, "jira_url": f"https://jira.example.com/browse/{key}"})
+    return "bcl", with_jira, without_jira, processed_issues, other_issues
+
+
+class TestRenderingBenchmark(unittest.TestCase):
+
+    def test_render_report(self):
+        results = {}
+        for scale in RENDER_SCALES:
+            args = synthetic_report_input(scale)
+
+            def render():
+                render.message = slack_lambda_get_pull_requests._render_report(*args)
+
+            results[scale] = run_scenario(None, "_render_report", scale, render)
+            _, with_jira, without_jira, processed_issues, _ = args
+            sprint_keys = {issue["key"] for issue in processed_issues["current_sprint"]}
+            # one line per sprint issue and per pull request outside of the sprint
+            self.assertEqual(render.message.count(" • "),
+                             len(sprint_keys) + len(without_jira) +
+                             len([pr for pr in with_jira if pr["jira_key"] not in sprint_keys]))
+
+        smallest, largest = RENDER_SCALES[-2], RENDER_SCALES[-1]
+        growth = largest / smallest
+        # linear with some headroom, quadratic would be `growth` times more
+        self.assertLess(results[largest]["wall_time"], 3 * growth * results[smallest]["wall_time"])
+        self.assertLess(results[largest]["peak_memory"], 3 * growth * results[smallest]["peak_memory"])
+        self.assertLess(results[largest]["wall_time"], 2)
+
+
+def tearDownModule():
+    print(f"\n{'scenario':45} {'scale':>6} {'requests':>9} {'time [s]':>9} {'peak [MiB]':>11}", file=sys.stderr)
+    for r in RESULTS:
+        print(f"{r['scenario']:45} {r['scale']:6} {r['requests']:9} {r['wall_time']:9.2f} "
+              f"{r['peak_memory'] / 2**20:11.1f}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import time
+import unittest
+
+from unittest.mock import patch
+
+import circuit_breaker
+import get_jira_sprint
+import get_pull_requests
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from fake_server import FakeServer, FakeData, FAKE_BOARD_ID, FAKE_ORG
+from pr_index import PullRequestIndex
+from state_store import MemoryStore
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_states(self):
+        breaker = CircuitBreaker("jira GET /rest/api/2/search", failure_threshold=3, reset_seconds=0.1)
+        for _ in range(2):
+            breaker.before_request()
+            breaker.record(503)
+        breaker.before_request()
+        breaker.record(404)
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+
+        for _ in range(3):
+            breaker.before_request()
+            breaker.record(None)
+        self.assertTrue(breaker.is_open())
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        # one probe at a time, its failure opens the breaker again
+        time.sleep(0.1)
+        breaker.before_request()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record(429)
+        self.assertTrue(breaker.is_open())
+
+        time.sleep(0.1)
+        with breaker.guard():
+            pass
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+        breaker.before_request()
+
+    def test_endpoint(self):
+        self.assertEqual(circuit_breaker.endpoint("jira", "get", "https://jira/rest/agile/1.0/board/42/configuration"),
+                         "jira GET /rest/agile/1.0/board/{id}/configuration")
+        self.assertEqual(circuit_breaker.endpoint("jira", "GET", "https://jira/rest/api/2/issue/HMS-1?x=1"),
+                         "jira GET /rest/api/2/issue/{key}")
+
+
+class TestGitHubCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+
+    def fake_server(self, **kwargs):
+        server = FakeServer(FakeData(10), **kwargs).start()
+        self.addCleanup(server.stop)
+        github_api = get_pull_requests.InstrumentedGhApi(owner=FAKE_ORG, token="token", gh_host=server.url)
+        return server, github_api
+
+    def test_pull_request_details(self):
+        # every request is rate limited
+        server, github_api = self.fake_server(rate_limit_every=1)
+        # `GhApi` fills in the owner
+        endpoint = f"GET /repos/{FAKE_ORG}/{{repo}}/pulls/{{pull_number}}"
+        pull_request = {"number": 1, "html_url": "https://github.com/osbuild/repo-1/pull/1"}
+
+        with patch.object(get_pull_requests.time, "sleep"):
+            with self.assertRaises(Exception) as raised:
+                get_pull_requests.get_pull_request_details(github_api, "repo-1", pull_request)
+            self.assertNotIsInstance(raised.exception, CircuitOpenError)
+            self.assertRaises(CircuitOpenError, get_pull_requests.get_pull_request_details,
+                              github_api, "repo-1", pull_request)
+            self.assertRaises(CircuitOpenError, get_pull_requests.get_pull_request_details,
+                              github_api, "repo-1", pull_request)
+        self.assertEqual(server.requests["GET /repos/{owner}/{repo}/pulls/{number}"],
+                         circuit_breaker.CIRCUIT_FAILURE_THRESHOLD)
+        self.assertTrue(circuit_breaker.get(f"github {endpoint}").is_open())
+
+    def test_outdated_index(self):
+        server, github_api = self.fake_server()
+        index = PullRequestIndex(MemoryStore())
+        with patch("pr_index.time.time", return_value=time.time() - 86400):
+            index.replace(FAKE_ORG, get_pull_requests.get_pull_request_list(github_api, FAKE_ORG, None, None,
+                                                                            fields="minimal"))
+
+        with patch.object(get_pull_requests, "GITHUB_API_URL", server.url):
+            breaker = circuit_breaker.get("github GET /search/issues")
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+            server.reset()
+            data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", index=index,
+                                                             fields="minimal")
+            data_processor.process()
+
+        self.assertEqual(len(data_processor.with_jira) + len(data_processor.without_jira), 10)
+        self.assertFalse(data_processor.partial)
+        self.assertEqual(server.total_requests(), 0)
+
+
+class TestJiraCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+
+    def test_every_attempt_counts(self):
+        server = FakeServer(FakeData(10)).start()
+        self.addCleanup(server.stop)
+        with patch.object(get_jira_sprint, "JIRA_HOST", server.url):
+            jira_data_processor = get_jira_sprint.JiraDataProcessor("token", None, FAKE_BOARD_ID)
+            # loads the fields of the client once
+            jira_data_processor.get_issues(["HMS-1"])
+
+        # Jira is rate limiting everything from now on
+        server.rate_limit_every = 1
+        server.reset()
+        with patch.object(get_pull_requests.time, "sleep") as sleep:
+            with self.assertRaises(CircuitOpenError):
+                jira_data_processor.get_issues(["HMS-1"])
+        # the session doesn't retry by itself, the breaker opened after the threshold
+        self.assertEqual(server.requests["GET /rest/api/2/search"], circuit_breaker.CIRCUIT_FAILURE_THRESHOLD)
+        self.assertEqual(sleep.call_count, circuit_breaker.CIRCUIT_FAILURE_THRESHOLD)
+        self.assertTrue(circuit_breaker.get("jira GET /rest/api/2/search").is_open())
+
+    def test_failures_retried(self):
+        # every other request fails, also connecting to the server
+        server = FakeServer(FakeData(10), fail_every=2).start()
+        self.addCleanup(server.stop)
+        with patch.object(get_jira_sprint, "JIRA_HOST", server.url), \
+                patch.object(get_pull_requests.time, "sleep") as sleep:
+            jira_data_processor = get_jira_sprint.JiraDataProcessor("token", None, FAKE_BOARD_ID)
+            issues = jira_data_processor.get_issues(["HMS-1", "HMS-3"])
+        self.assertEqual(sorted(issue["key"] for issue in issues), ["HMS-1", "HMS-3"])
+        self.assertGreater(server.requests["503"], 0)
+        self.assertEqual(sleep.call_count, server.requests["503"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest.mock import patch
+
+import slack_lambda
+import state_store
+
+from coalesce import RequestCoalescer, job_id
+from state_store import FileStore, MemoryStore
+
+
+class TestRequestCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = RequestCoalescer(MemoryStore())
+        self.job = job_id("/pr2jira", "octocat", "jdoe", False)
+
+    def test_job_id(self):
+        self.assertEqual(self.job, job_id("/pr2jira", "octocat", "jdoe", False))
+        self.assertNotEqual(self.job, job_id("/pr2jira", "octocat", "jdoe", True))
+
+    def test_duplicates_attach(self):
+        self.assertTrue(self.coalescer.claim(self.job, "https://hooks/1"))
+        self.assertFalse(self.coalescer.claim(self.job, "https://hooks/2"))
+        self.assertFalse(self.coalescer.claim(self.job, "https://hooks/3"))
+        self.assertEqual(sorted(self.coalescer.finish(self.job)), ["https://hooks/2", "https://hooks/3"])
+
+        # a new command after the job is done runs again
+        self.assertTrue(self.coalescer.claim(self.job, "https://hooks/4"))
+        self.assertEqual(self.coalescer.finish(self.job), [])
+
+    def test_other_jobs_run(self):
+        self.assertTrue(self.coalescer.claim(self.job, "https://hooks/1"))
+        self.assertTrue(self.coalescer.claim(job_id("/pr2jira", "other", "jdoe", False), "https://hooks/2"))
+
+    def test_lost_job(self):
+        coalescer = RequestCoalescer(MemoryStore(), window=-1)
+        self.assertTrue(coalescer.claim(self.job, "https://hooks/1"))
+        # the first job is older than the window
+        self.assertTrue(coalescer.claim(self.job, "https://hooks/2"))
+        self.assertEqual(coalescer.finish(self.job), [])
+
+
+    def test_concurrent_claims(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        coalescer = RequestCoalescer(FileStore(tmp_dir.name))
+        claimed = []
+
+        def claim(i):
+            claimed.append(coalescer.claim(self.job, f"https://hooks/{i}"))
+
+        def slow_dump(value, f, **kwargs):
+            text = json.dumps(value, **kwargs)
+            f.write(text[:1])
+            f.flush()
+            time.sleep(0.05)
+            f.write(text[1:])
+
+        threads = [threading.Thread(target=claim, args=(i,)) for i in range(8)]
+        with patch.object(state_store.json, "dump", slow_dump):
+            for thread in threads:
+                thread.start()
+                time.sleep(0.01)
+            for thread in threads:
+                thread.join()
+        # one runs the job, the others are attached, nobody read a partial file
+        self.assertEqual(sorted(claimed), [False] * 7 + [True])
+        self.assertEqual(len(coalescer.finish(self.job)), 7)
+        self.assertFalse([name for _, _, files in os.walk(tmp_dir.name) for name in files])
+
+    def test_failed_dispatch_releases_job(self):
+        coalescer = RequestCoalescer(MemoryStore())
+        params = {"command": ["/pr2jira"], "text": ["refresh octocat jdoe"], "user_name": ["octocat"],
+                  "response_url": ["https://hooks/1"]}
+
+        def dispatch(payload, staging):
+            raise ConnectionError("AWS Lambda is down")
+
+        with patch.object(slack_lambda, "open_coalescer", return_value=coalescer):
+            with self.assertRaises(ConnectionError):
+                slack_lambda._handle_request(params, dispatch=dispatch)
+            dispatched = []
+            response = slack_lambda._handle_request(params, dispatch=lambda payload, staging: dispatched.append(payload))
+        self.assertIn(":waittime: I will check", response["body"]["text"])
+        self.assertEqual(len(dispatched), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from unittest.mock import patch
+
+import get_jira_sprint
+
+from fake_server import FakeServer, FakeData, FAKE_BOARD_ID
+from jira_issue_store import JiraIssueStore
+from state_store import MemoryStore
+
+
+class TestJiraIssueStore(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(FakeData(40)).start()
+        self.addCleanup(self.server.stop)
+        patcher = patch.object(get_jira_sprint, "JIRA_HOST", self.server.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.issue_store = JiraIssueStore(MemoryStore())
+
+    def overview(self, **kwargs):
+        jira_data_processor = get_jira_sprint.JiraDataProcessor(
+            "token", None, FAKE_BOARD_ID, any_assignee=True, issue_store=self.issue_store)
+        self.server.reset()
+        overview = jira_data_processor.get_issue_overview(**kwargs)
+        return ({issue["key"] for issue in overview["current_sprint"]},
+                {issue["key"] for issue in overview["backlog"]})
+
+    def search_requests(self):
+        return self.server.requests["GET /rest/api/2/search"]
+
+    def test_incremental_sync(self):
+        data = self.server.data
+        sprint, backlog = self.overview()
+        self.assertEqual(sprint, {k for k, i in data.issues.items() if i["in_sprint"]})
+        self.assertEqual(backlog, {k for k, i in data.issues.items() if not i["in_sprint"]})
+
+        # nothing changed: one query for changed issues and one for issues which left, per section
+        self.assertEqual(self.overview(), (sprint, backlog))
+        self.assertEqual(self.search_requests(), 4)
+
+        moved = sorted(sprint)[0]
+        data.update_issue(moved, in_sprint=False)
+        data.update_issue("HMS-1000", in_sprint=True, summary="A new issue")
+        data.update_issue(sorted(backlog)[0], summary="A new summary")
+
+        new_sprint, new_backlog = self.overview()
+        self.assertEqual(self.search_requests(), 4)
+        self.assertEqual(new_sprint, sprint - {moved} | {"HMS-1000"})
+        self.assertEqual(new_backlog, backlog | {moved})
+
+        stored = self.issue_store.store.get_json(f"jira_issues/{FAKE_BOARD_ID}/backlog/any")
+        self.assertEqual(stored["issues"][sorted(backlog)[0]]["summary"], "A new summary")
+
+    def test_current_user(self):
+        for token in ("token-1", "token-2"):
+            get_jira_sprint.JiraDataProcessor(token, None, FAKE_BOARD_ID,
+                                              issue_store=self.issue_store).get_issue_overview()
+        # every user has their own issues
+        self.assertEqual(self.issue_store.store.list_keys(f"jira_issues/{FAKE_BOARD_ID}/backlog/"),
+                         [f"jira_issues/{FAKE_BOARD_ID}/backlog/token-1",
+                          f"jira_issues/{FAKE_BOARD_ID}/backlog/token-2"])
+
+    def test_full_sync(self):
+        self.overview()
+        self.overview(full_sync=True)
+        # no queries for changes
+        self.assertEqual(self.search_requests(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
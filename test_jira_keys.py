@@ -0,0 +1,50 @@
+import unittest
+
+from jira_keys import JiraKeyMatcher, find_all_jira_keys
+from extract_jira_key import extract_jira_issue_key
+
+
+class TestJiraKeyMatcher(unittest.TestCase):
+
+    def test_find_all(self):
+        self.assertEqual(find_all_jira_keys("HMS-123: fix it (RHEL9-42)"), ["HMS-123", "RHEL9-42"])
+        self.assertEqual(find_all_jira_keys("no key in here"), [])
+        self.assertEqual(find_all_jira_keys(None), [])
+
+    def test_digits_in_project_key(self):
+        """
+        All modules have to agree on project keys containing digits.
+        """
+        self.assertEqual(find_all_jira_keys("RHEL9-42"), ["RHEL9-42"])
+        # project keys have to start with a letter
+        self.assertEqual(find_all_jira_keys("9RHEL-42"), [])
+
+    def test_allow_list(self):
+        matcher = JiraKeyMatcher(["hms"])
+        self.assertEqual(matcher.find_all("HMS-1 uses SHA-256 and UTF-8"), ["HMS-1"])
+        self.assertEqual(matcher.find_first("SHA-256 for HMS-2"), "HMS-2")
+        self.assertIsNone(matcher.match_prefix("SHA-256: checksum"))
+
+    def test_match_prefix(self):
+        self.assertEqual(JiraKeyMatcher().match_prefix("HMS-123: fix it"), ("HMS-123", ": ", "fix it"))
+        self.assertIsNone(JiraKeyMatcher().match_prefix("fix HMS-123"))
+
+    def test_scan_spans(self):
+        texts = ["HMS-1 first", "", "second HMS-2 and COMPOSER-3", None, "RHEL-4"]
+        result = JiraKeyMatcher().scan(texts)
+        self.assertEqual(len(result), len(texts))
+        self.assertEqual([m.key for m in result[0]], ["HMS-1"])
+        self.assertEqual(result[1], [])
+        self.assertEqual([m.key for m in result[2]], ["HMS-2", "COMPOSER-3"])
+        self.assertEqual(result[3], [])
+        for text, matches in zip(texts, result):
+            for match in matches:
+                self.assertEqual(text[match.start:match.end], match.key)
+
+    def test_extract_jira_issue_key(self):
+        self.assertEqual(extract_jira_issue_key("please /jira-epic hms-5279 thanks"), "HMS-5279")
+        self.assertIsNone(extract_jira_issue_key("no command"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import time
+import unittest
+
+from unittest.mock import MagicMock
+
+from metrics import Metrics, endpoint_name
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name("get", "https://issues.redhat.com/rest/api/2/issue/HMS-123?fields=key"),
+                         "GET /rest/api/2/issue/{key}")
+        self.assertEqual(endpoint_name("HEAD", "https://issues.redhat.com/browse/HMS-1"), "HEAD /browse/{key}")
+        self.assertEqual(endpoint_name("GET", "https://example.com/rest/agile/1.0/board/42/configuration"),
+                         "GET /rest/agile/1.0/board/{id}/configuration")
+
+    def test_summary(self):
+        metrics = Metrics()
+        metrics.record_request("GET /search/issues", 200, 1000, 0.5)
+        metrics.record_request("GET /search/issues", 429, 10, 0.1)
+        metrics.record_backoff(2)
+        with metrics.stage("search"):
+            time.sleep(0.01)
+        with metrics.stage("search"):
+            pass
+
+        summary = metrics.summary()
+        self.assertEqual(summary["requests"], 2)
+        self.assertEqual(summary["requests_by_endpoint"], {"GET /search/issues": 2})
+        self.assertEqual(summary["rate_limited"], 1)
+        self.assertEqual(summary["retries"], 1)
+        self.assertEqual(summary["backoff_seconds"], 2)
+        self.assertEqual(summary["bytes_received"], 1010)
+        self.assertGreaterEqual(summary["stages"]["search"], 0.01)
+
+        metrics.reset()
+        self.assertEqual(metrics.summary()["requests"], 0)
+
+    def test_stage_breakdown(self):
+        metrics = Metrics()
+        with metrics.stage("search"):
+            metrics.record_request("GET /search/issues", 200, 1000, 0.5)
+            metrics.record_backoff(2)
+            with metrics.stage("enrich"):
+                metrics.record_request("GET /repos/{owner}/{repo}/pulls/{pull_number}", 200, 100, 0.25)
+        metrics.record_request("GET /outside", 200, 100, 1)
+
+        breakdown = metrics.stage_breakdown()
+        self.assertEqual(breakdown["search"]["network"], 0.5)
+        self.assertEqual(breakdown["search"]["backoff"], 2)
+        self.assertEqual(breakdown["enrich"]["network"], 0.25)
+        self.assertGreaterEqual(breakdown["search"]["wall"], breakdown["enrich"]["wall"])
+
+    def test_record_response(self):
+        metrics = Metrics()
+        response = MagicMock(status_code=200, url="https://issues.redhat.com/browse/HMS-1", content=b"abc")
+        response.request.method = "HEAD"
+        response.elapsed.total_seconds.return_value = 0.25
+        metrics.record_response(response)
+        self.assertEqual(metrics.summary()["requests_by_endpoint"], {"HEAD /browse/{key}": 1})
+        self.assertEqual(metrics.summary()["bytes_received"], 3)
+
+    def test_emf(self):
+        metrics = Metrics()
+        metrics.record_request("GET /search/issues", 200)
+        with metrics.stage("render"):
+            pass
+        emf = json.loads(json.dumps(metrics.emf("get_pull_requests")))
+        names = [m["Name"] for m in emf["_aws"]["CloudWatchMetrics"][0]["Metrics"]]
+        self.assertIn("Requests", names)
+        self.assertIn("Stage_render_Seconds", names)
+        for name in names:
+            self.assertIn(name, emf)
+        self.assertEqual(emf["Requests"], 1)
+        self.assertEqual(emf["FunctionName"], "get_pull_requests")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -47,7 +47,7 @@ class TestPRChecks(unittest.TestCase):
         self.assertTrue(check_pr_description_not_empty("This is a PR description"))
         self.assertFalse(check_pr_description_not_empty(""))
 
-    @patch('requests.post')
+    @patch('http_transport.request')
     def test_add_best_practice_label(self, mock_post):
         """
         Test whether the function adds the 'best-practice' label to a PR successfully.
@@ -0,0 +1,179 @@
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+import circuit_breaker
+import get_pull_requests
+import github_webhook_lambda
+
+from fake_server import FakeServer, FakeData, FAKE_ORG
+from pr_index import PullRequestIndex, reconcile
+from state_store import FileStore, MemoryStore
+
+
+def pull_request_event(action, number, repo="pr-best-practices", author="bcl", state="open", title=None):
+    return {
+        "action": action,
+        "organization": {"login": FAKE_ORG},
+        "repository": {"name": repo, "owner": {"login": FAKE_ORG}},
+        "pull_request": {
+            "number": number,
+            "html_url": f"https://github.com/{FAKE_ORG}/{repo}/pull/{number}",
+            "title": title or f"HMS-{number}: change {number}",
+            "user": {"login": author},
+            "state": state,
+            "created_at": "2025-01-01T00:00:00Z",
+            "updated_at": f"2025-01-{number:02}T00:00:00Z",
+            "requested_reviewers": [],
+            "additions": 1,
+            "deletions": 2,
+            "draft": False,
+            "mergeable": True,
+            "rebaseable": True,
+            "mergeable_state": "clean",
+            "body": "description",
+        },
+    }
+
+
+class TestStateStore(unittest.TestCase):
+
+    def check_store(self, store):
+        self.assertIsNone(store.get_json("a/b"))
+        store.put_json("a/b", {"x": 1})
+        self.assertEqual(store.get_json("a/b"), {"x": 1})
+        self.assertFalse(store.put_json_if_absent("a/b", {"x": 2}))
+        self.assertTrue(store.put_json_if_absent("a/c", {"x": 3}))
+        self.assertEqual(store.get_json("a/b"), {"x": 1})
+        self.assertEqual(store.list_keys("a/"), ["a/b", "a/c"])
+        store.delete("a/b")
+        store.delete("a/b")
+        self.assertEqual(store.list_keys(), ["a/c"])
+
+    def test_memory_store(self):
+        self.check_store(MemoryStore())
+
+    def test_file_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check_store(FileStore(directory))
+
+
+class TestPullRequestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PullRequestIndex(MemoryStore())
+
+    def test_webhooks(self):
+        self.assertEqual(self.index.apply_webhook("pull_request", pull_request_event("opened", 2)), "updated")
+        self.assertEqual(self.index.apply_webhook("pull_request", pull_request_event("opened", 1, author="ochosi")),
+                         "updated")
+        self.index.apply_webhook("pull_request", pull_request_event("edited", 2, title="HMS-2: new title"))
+
+        self.assertEqual([pr["number"] for pr in self.index.pull_requests(FAKE_ORG)], [1, 2])
+        pull_requests = self.index.pull_requests(FAKE_ORG, author="bcl")
+        self.assertEqual(len(pull_requests), 1)
+        self.assertEqual(pull_requests[0]["title"], "HMS-2: new title")
+        self.assertEqual(pull_requests[0]["additions"], 1)
+
+        self.assertEqual(self.index.apply_webhook("pull_request", pull_request_event("closed", 2, state="closed")),
+                         "removed")
+        self.assertEqual(self.index.apply_webhook("pull_request", pull_request_event("closed", 2, state="closed")),
+                         "ignored")
+        self.assertEqual(self.index.apply_webhook("repository", {
+            "action": "archived", "repository": {"name": "pr-best-practices", "owner": {"login": FAKE_ORG}}}),
+            "removed")
+        self.assertEqual(self.index.pull_requests(FAKE_ORG), [])
+        self.assertFalse(self.index.is_fresh(FAKE_ORG))
+
+    def test_data_processor_reads_fresh_index(self):
+        with FakeServer(FakeData(20)) as server, \
+                patch.object(get_pull_requests, "GITHUB_API_URL", server.url):
+            data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", index=self.index)
+            reconcile(self.index, data_processor.github_api, FAKE_ORG)
+            self.assertTrue(self.index.is_fresh(FAKE_ORG))
+            # only the search results are indexed
+            self.assertEqual(dict(server.requests), {"GET /search/issues": 1})
+
+            server.reset()
+            with patch.object(self.index.store, "get_json", wraps=self.index.store.get_json) as get_json:
+                data_processor.process()
+            self.assertEqual(get_json.call_count, 1)
+            self.assertEqual(server.total_requests(), 0)
+            self.assertEqual(len(data_processor.with_jira) + len(data_processor.without_jira), 20)
+            self.assertTrue(all(pr["jira_key"] for pr in data_processor.with_jira))
+
+            # the commit messages are still fetched on demand
+            self.assertTrue(data_processor.with_jira[0]["commit_messages"])
+            self.assertEqual(server.total_requests(), 1)
+
+
+    def test_reconcile_large_organisation(self):
+        # more pull requests than one search returns
+        scale = get_pull_requests.SEARCH_MAX_RESULTS + 100
+        with FakeServer(FakeData(scale)) as server:
+            github_api = get_pull_requests.InstrumentedGhApi(owner=FAKE_ORG, token="token", gh_host=server.url)
+            self.assertEqual(reconcile(self.index, github_api, FAKE_ORG), scale)
+        self.assertTrue(self.index.is_fresh(FAKE_ORG))
+        self.assertEqual(len(self.index.pull_requests(FAKE_ORG)), scale)
+
+        # a single day with too many pull requests can't be scanned completely
+        shard = {"org": FAKE_ORG, "repo": None, "author": None, "created": "2008-01-01..2026-01-01", "count": scale}
+        with FakeServer(FakeData(scale)) as server, patch("pr_index.plan_shards", return_value=[shard]):
+            github_api = get_pull_requests.InstrumentedGhApi(owner=FAKE_ORG, token="token", gh_host=server.url)
+            reconcile(self.index, github_api, FAKE_ORG)
+        self.assertFalse(self.index.is_fresh(FAKE_ORG))
+
+    def test_failed_reconcile_keeps_index(self):
+        self.addCleanup(circuit_breaker.reset)
+        with FakeServer(FakeData(20)) as server:
+            github_api = get_pull_requests.InstrumentedGhApi(owner=FAKE_ORG, token="token", gh_host=server.url)
+            reconcile(self.index, github_api, FAKE_ORG)
+            reconciled_at = self.index.reconciled_at(FAKE_ORG)
+
+            # the search fails
+            server.rate_limit_every = 1
+            with self.assertRaises(Exception):
+                reconcile(self.index, github_api, FAKE_ORG)
+        self.assertEqual(self.index.reconciled_at(FAKE_ORG), reconciled_at)
+        self.assertEqual(len(self.index.pull_requests(FAKE_ORG)), 20)
+
+class TestGithubWebhookLambda(unittest.TestCase):
+
+    def invoke(self, body, secret="secret", event_name="pull_request"):
+        signature = "sha256=" + hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+        event = {"body": body, "headers": {"x-github-event": event_name, "x-hub-signature-256": signature}}
+        with patch.dict(os.environ, {"GITHUB_WEBHOOK_SECRET": "secret"}), \
+                patch.object(github_webhook_lambda, "open_store", return_value=self.store):
+            return github_webhook_lambda.lambda_handler(event, None)
+
+    def setUp(self):
+        self.store = MemoryStore()
+
+    def test_signature(self):
+        self.assertEqual(self.invoke("{}", secret="wrong")["statusCode"], 401)
+
+    def test_pull_request(self):
+        response = self.invoke(json.dumps(pull_request_event("opened", 1)))
+        self.assertEqual(response["statusCode"], 200)
+        self.assertEqual(json.loads(response["body"]), {"result": "updated"})
+        self.assertEqual(len(PullRequestIndex(self.store).pull_requests(FAKE_ORG)), 1)
+
+
+    def test_reconcile_organisations(self):
+        with FakeServer(FakeData(5)) as server, \
+                patch.object(github_webhook_lambda, "GITHUB_API_URL", server.url), \
+                patch.object(github_webhook_lambda, "open_store", return_value=self.store), \
+                patch.dict(os.environ, {"GITHUB_ORGANIZATION": f"{FAKE_ORG},containers", "GITHUB_TOKEN": "token"}):
+            response = github_webhook_lambda.lambda_handler({"reconcile": True}, None)
+        self.assertEqual(response, {"reconciled": {FAKE_ORG: 5, "containers": 5}})
+        index = PullRequestIndex(self.store)
+        self.assertTrue(index.is_fresh(FAKE_ORG))
+        self.assertTrue(index.is_fresh("containers"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import pickle
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from records import PullRequest, Issue, Sprint
+from utils import json_default
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_dict_compatibility(self):
+        pr = PullRequest(number=1, title="HMS-1: fix it", repo="pr-best-practices")
+        pr["jira_key"] = "HMS-1"
+        self.assertEqual(pr["title"], "HMS-1: fix it")
+        self.assertEqual(pr.get("jira_key"), "HMS-1")
+        self.assertIsNone(pr.get("description"))
+        self.assertIn("repo", pr)
+        self.assertNotIn("description", pr)
+        self.assertEqual({**pr}, {"number": 1, "repo": "pr-best-practices", "title": "HMS-1: fix it",
+                                  "jira_key": "HMS-1"})
+        with self.assertRaises(KeyError):
+            pr["description"]
+        with self.assertRaises(KeyError):
+            pr["unknown_field"] = 1
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(PullRequest(), "__dict__"))
+        self.assertFalse(hasattr(Issue(), "__dict__"))
+        self.assertFalse(hasattr(Sprint(), "__dict__"))
+
+    def test_lazy_field(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"commit_messages": ["first", "second"]}
+
+        pr = PullRequest(number=1)
+        pr.set_lazy(["commit_messages"], loader)
+        self.assertEqual(pr.to_dict(load=False), {"number": 1})
+        self.assertEqual(calls, [])
+        self.assertEqual(pr["commit_messages"], ["first", "second"])
+        self.assertEqual(pr.commit_messages, ["first", "second"])
+        self.assertEqual(calls, [1])
+
+    def test_copy_does_not_load(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"commit_messages": ["msg"]}
+
+        pr = PullRequest(number=1)
+        pr.set_lazy(["commit_messages"], loader)
+        self.assertIn("commit_messages", pr)
+        self.assertEqual({**pr}, {"number": 1})
+        self.assertEqual(dict(pr), {"number": 1})
+        self.assertEqual(pr.to_dict(), {"number": 1})
+        self.assertEqual(json.loads(json.dumps(pr, default=json_default)), {"number": 1})
+        self.assertEqual(calls, [])
+        self.assertEqual(pr.to_dict(load=True), {"number": 1, "commit_messages": ["msg"]})
+        self.assertEqual(calls, [1])
+
+    def test_concurrent_load(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return {"additions": 1, "deletions": 2}
+
+        pr = PullRequest(number=1)
+        pr.set_lazy(["additions", "deletions"], loader)
+        barrier = threading.Barrier(8)
+
+        def read(i):
+            barrier.wait()
+            return pr["additions"] if i % 2 else pr["deletions"]
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(read, range(8)))
+        self.assertEqual(results, [2, 1] * 4)
+        self.assertEqual(calls, [1])
+
+    def test_pickle_loads_lazy_fields(self):
+        pr = PullRequest(number=1)
+        pr.set_lazy(["commit_messages"], lambda: {"commit_messages": ["msg"]})
+        restored = pickle.loads(pickle.dumps(pr))
+        self.assertEqual(restored.to_dict(), {"number": 1, "commit_messages": ["msg"]})
+
+    def test_json(self):
+        issue = Issue(key="HMS-1", sprint=[Sprint(id="1", state="ACTIVE")])
+        self.assertEqual(json.loads(json.dumps([issue], default=json_default)),
+                         [{"key": "HMS-1", "sprint": [{"id": "1", "state": "ACTIVE"}]}])
+
+
+if __name__ == '__main__':
+    unittest.main()
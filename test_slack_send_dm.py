@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest.mock import patch
+
+import yaml
+
+from snapshots import SnapshotStore
+from state_store import MemoryStore
+
+try:
+    from slack_sdk.errors import SlackApiError
+    import slack_send_dm
+    from slack_send_dm import DirectMessenger
+except ImportError:
+    # slack_sdk is only needed by slack_send_dm.py
+    SlackApiError = None
+
+
+class FakeSlackClient:
+    def __init__(self, latency=0.1, members=()):
+        self.latency = latency
+        self.members = list(members)
+        self.listed = 0
+        self.retry_handlers = []
+        self.opened = []
+        self.posted = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def users_list(self, cursor=None, limit=200):
+        # one member per page
+        self.listed += 1
+        index = int(cursor or 0)
+        next_cursor = str(index + 1) if index + 1 < len(self.members) else ""
+        return {"members": self.members[index:index + 1], "response_metadata": {"next_cursor": next_cursor}}
+
+    def conversations_open(self, users):
+        self.opened.append(users[0])
+        return {"channel": {"id": f"D{users[0]}"}}
+
+    def chat_postMessage(self, channel, text):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.latency)
+        with self._lock:
+            self.running -= 1
+        if channel == "Dgone":
+            raise SlackApiError("error", {"ok": False, "error": "channel_not_found"})
+        if channel == "Dtimeout":
+            raise TimeoutError("The read operation timed out")
+        self.posted.append((channel, text))
+        return {"ok": True}
+
+
+@unittest.skipIf(SlackApiError is None, "slack_sdk is not installed")
+class TestDirectMessenger(unittest.TestCase):
+
+    def test_send_many(self):
+        store = MemoryStore()
+        client = FakeSlackClient()
+        messages = [(f"U{i}", f"Hello {i}") for i in range(12)]
+
+        start = time.monotonic()
+        errors = DirectMessenger("token", store=store, max_workers=4, client=client).send_many(messages)
+        duration = time.monotonic() - start
+
+        self.assertEqual(errors, {})
+        self.assertEqual(sorted(client.posted), sorted((f"D{u}", m) for u, m in messages))
+        self.assertEqual(client.max_running, 4)
+        self.assertLess(duration, 12 * client.latency / 2)
+
+        # the channels are reused by the next run
+        client = FakeSlackClient(latency=0)
+        DirectMessenger("token", store=store, client=client).send_many(messages)
+        self.assertEqual(client.opened, [])
+        self.assertEqual(len(client.posted), 12)
+
+    def test_stale_channel(self):
+        store = MemoryStore()
+        store.put_json("slack_dm_channels", {"gone": "Dgone"})
+        client = FakeSlackClient(latency=0)
+        messenger = DirectMessenger("token", store=store, client=client)
+
+        self.assertEqual(messenger.send_many([("gone", "Hello")]), {"gone": "channel_not_found"})
+        self.assertEqual(store.get_json("slack_dm_channels"), {})
+
+    def test_send_dm(self):
+        store = MemoryStore()
+        client = FakeSlackClient(latency=0)
+        with patch.object(slack_send_dm, "open_store", return_value=store), \
+                patch.object(slack_send_dm, "WebClient", return_value=client):
+            slack_send_dm.send_dm("token", "U1", "Hello")
+        self.assertEqual(store.get_json("slack_dm_channels"), {"U1": "DU1"})
+
+    def test_connection_error(self):
+        store = MemoryStore()
+        client = FakeSlackClient(latency=0)
+        messages = [("U1", "Hello"), ("timeout", "Hello"), ("U2", "Hello")]
+
+        errors = DirectMessenger("token", store=store, client=client).send_many(messages)
+        self.assertEqual(errors, {"timeout": "The read operation timed out"})
+        self.assertEqual(sorted(channel for channel, _ in client.posted), ["DU1", "DU2"])
+        self.assertEqual(sorted(store.get_json("slack_dm_channels")), ["U1", "U2", "timeout"])
+
+    def test_snapshot_messages(self):
+        store = MemoryStore()
+        SnapshotStore(store).save({github_user: {"jira": github_user, "report": f"Report of {github_user}"}
+                                   for github_user in ("schuellerf", "bcl", "thozza")})
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        user_map_file = os.path.join(tmp_dir.name, "usermap.yaml")
+        with open(user_map_file, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"assignees": [
+                {"github": "schuellerf", "jira": "712020:b952716f", "slack": "fschulle"},
+                {"github": "bcl", "jira": "bcl@example.com"},
+                # the Slack user derived from the Jira account ID doesn't exist
+                {"github": "thozza", "jira": "70121:2f02493a"},
+            ]}, f)
+        members = [{"name": "fschulle", "id": "U01"}, {"name": "bcl", "id": "U02"},
+                   {"name": "gone", "id": "U03", "deleted": True}]
+
+        with patch.object(slack_send_dm, "open_store", return_value=store):
+            client = FakeSlackClient(latency=0, members=members)
+            messenger = DirectMessenger("token", store=store, client=client)
+            messages = slack_send_dm.snapshot_messages(user_map_file, messenger)
+            self.assertEqual(messenger.send_many(messages), {})
+            self.assertEqual(sorted(client.opened), ["U01", "U02"])
+            self.assertEqual(client.listed, 3)
+
+            # the user IDs are reused by the next run
+            client = FakeSlackClient(latency=0, members=members)
+            messages = slack_send_dm.snapshot_messages(user_map_file, DirectMessenger("token", store=store,
+                                                                                      client=client))
+        self.assertEqual(sorted(user_id for user_id, _ in messages), ["U01", "U02"])
+        self.assertEqual(client.listed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+import unittest
+import urllib.parse
+
+from unittest.mock import patch
+
+import requests
+
+import slack_lambda_get_pull_requests
+
+from slack_server import SlackServer
+
+SIGNING_SECRET = "secret"
+
+
+class TestSlackServer(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.dict(os.environ, {"SLACK_SCHUTZBOT_SIGNING_SECRET": SIGNING_SECRET})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start(self, **kwargs):
+        server = SlackServer(("127.0.0.1", 0), **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+        self.addCleanup(stop)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def command(self, url, text, secret=SIGNING_SECRET):
+        body = urllib.parse.urlencode({"command": "/sprint-overview", "text": text, "user_name": "octocat",
+                                       "response_url": "https://hooks.slack.com/commands/1"})
+        timestamp = str(int(time.time()))
+        signature = hmac.new(secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256).hexdigest()
+        return requests.post(url, data=body, timeout=5, headers={
+            "Content-Type": "application/x-www-form-urlencoded",
+            "X-Slack-Request-Timestamp": timestamp,
+            "X-Slack-Signature": f"v0={signature}"})
+
+    def test_dispatch(self):
+        dispatched = []
+        url = self.start(dispatch=lambda payload, staging: dispatched.append(payload))
+
+        response = self.command(url, "octocat jira-octocat")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(":waittime:", response.json()["text"])
+        self.assertEqual([(p["args"], p["jira_user"]) for p in dispatched], [("octocat", "jira-octocat")])
+
+        self.assertEqual(self.command(url, "octocat", secret="wrong").status_code, 401)
+        self.assertEqual(len(dispatched), 1)
+
+    def test_workers(self):
+        handled = threading.Event()
+        with patch.object(slack_lambda_get_pull_requests, "_handle_event", side_effect=lambda e: handled.set()):
+            url = self.start(max_workers=1)
+            self.assertEqual(self.command(url, "octocat jira-octocat").status_code, 200)
+            self.assertTrue(handled.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
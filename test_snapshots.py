@@ -0,0 +1,89 @@
+import time
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+import circuit_breaker
+
+import get_jira_sprint
+import get_pull_requests
+import slack_lambda_get_pull_requests
+
+from fake_server import FakeServer, FakeData, FAKE_ORG, FAKE_BOARD_ID
+from snapshots import SnapshotStore, SNAPSHOTS_KEPT
+from state_store import MemoryStore
+from utils import DEADLINE_RESERVE
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = SnapshotStore(MemoryStore())
+
+    def test_message(self):
+        self.assertIsNone(self.snapshots.message("bcl", "jira-bcl"))
+        self.snapshots.save({"bcl": {"jira": "jira-bcl", "report": "report of bcl"},
+                             "ochosi": {"jira": "jira-ochosi", "report": "report of ochosi"}})
+
+        message = self.snapshots.message("bcl", "jira-bcl")
+        self.assertIn("Happy", message)
+        self.assertIn("report of bcl", message)
+        self.assertIn("refresh", message)
+        # other Jira users aren't in the snapshot
+        self.assertIsNone(self.snapshots.message("bcl", "someone-else"))
+        self.assertIsNone(self.snapshots.message("unknown", "jira-bcl"))
+
+        team = self.snapshots.message(None, None, team=True)
+        self.assertIn("report of bcl", team)
+        self.assertIn("report of ochosi", team)
+
+        self.assertIsNone(self.snapshots.message("bcl", "jira-bcl", max_age=-1))
+
+    def test_versions(self):
+        for i in range(SNAPSHOTS_KEPT + 2):
+            with patch("snapshots.time.time", return_value=1_800_000_000 + i):
+                self.snapshots.save({})
+        self.assertEqual(len(self.snapshots.store.list_keys("snapshots/versions/")), SNAPSHOTS_KEPT)
+
+
+class TestCreateSnapshot(unittest.TestCase):
+
+    def create_snapshot(self, server_kwargs=None, context=None):
+        store = MemoryStore()
+        with FakeServer(FakeData(40), **(server_kwargs or {})) as server, \
+                patch.object(get_pull_requests, "GITHUB_API_URL", server.url), \
+                patch.object(get_pull_requests, "JIRA_HOST", server.url), \
+                patch.object(get_jira_sprint, "JIRA_HOST", server.url), \
+                patch.object(slack_lambda_get_pull_requests, "open_store", return_value=store):
+            slack_lambda_get_pull_requests.lambda_handler({
+                "snapshot": True,
+                "github_organization": FAKE_ORG,
+                "github_token": "token",
+                "jira_token": "token",
+                "jira_board_id": FAKE_BOARD_ID,
+            }, context)
+
+        snapshot = SnapshotStore(store).latest()
+        self.assertTrue(snapshot["reports"])
+        for entry in snapshot["reports"].values():
+            self.assertIn("Work from your current sprint", entry["report"])
+        return snapshot
+
+    def test_create_snapshot(self):
+        for entry in self.create_snapshot()["reports"].values():
+            self.assertNotIn("Partial report", entry["report"])
+
+    def test_partial_snapshot(self):
+        self.addCleanup(circuit_breaker.reset)
+        # one second left for the snapshot, every request takes half a second
+        context = MagicMock(function_name="get_pull_requests")
+        context.get_remaining_time_in_millis.return_value = (DEADLINE_RESERVE + 1) * 1000
+        start = time.perf_counter()
+        snapshot = self.create_snapshot({"latency": 0.5}, context)
+        self.assertLess(time.perf_counter() - start, 2)
+        for entry in snapshot["reports"].values():
+            self.assertIn("Partial report", entry["report"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import circuit_breaker
+import get_pull_requests
+
+from fake_server import FakeServer, FakeData, FAKE_ORG
+from records import Issue, PullRequest, Sprint
+from warehouse import Warehouse
+
+NOW = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def pull_request(number, created_at, jira_keys=(), repo="osbuild", additions=None, deletions=None):
+    pr = PullRequest(number=number, html_url=f"https://github.com/osbuild/{repo}/pull/{number}",
+                     title=f"{jira_keys[0] + ': ' if jira_keys else ''}change {number}", org="osbuild",
+                     repo=repo, author="bcl", created_at=created_at, jira_keys=list(jira_keys),
+                     jira_key=jira_keys[0] if jira_keys else None)
+    if additions is not None:
+        pr["additions"] = additions
+        pr["deletions"] = deletions
+    return pr
+
+
+class TestWarehouse(unittest.TestCase):
+
+    def setUp(self):
+        self.warehouse = Warehouse(":memory:")
+        self.addCleanup(self.warehouse.close)
+
+    def test_pull_requests(self):
+        old = pull_request(1, "2026-01-01T00:00:00Z", additions=10, deletions=5)
+        new = pull_request(2, "2026-02-28T00:00:00Z", additions=1, deletions=1)
+        linked = pull_request(3, "2026-01-01T00:00:00Z", jira_keys=["HMS-3"], repo="images",
+                              additions=100, deletions=0)
+        closed = pull_request(4, "2026-01-01T00:00:00Z")
+        self.warehouse.add_pull_requests([old, new, linked, closed], ["osbuild"], complete=True,
+                                         now="2026-02-28T12:00:00Z")
+
+        # a minimal run without sizes, the key was added to the title in the meantime
+        old = pull_request(1, "2026-01-01T00:00:00Z", jira_keys=["HMS-1"])
+        self.warehouse.add_pull_requests([old, new, linked], ["osbuild"], complete=True,
+                                         now="2026-03-01T00:00:00Z")
+
+        self.assertEqual([pr["number"] for pr in self.warehouse.open_pull_requests_without_jira(7, now=NOW)], [])
+        self.assertEqual([pr["number"] for pr in self.warehouse.open_pull_requests_without_jira(0, now=NOW)], [2])
+
+        link_times = {row["html_url"]: row["seconds"] for row in self.warehouse.time_to_jira_link()}
+        self.assertAlmostEqual(link_times[old["html_url"]], 59 * 86400, places=0)
+        self.assertEqual(link_times[linked["html_url"]], 0)
+
+        sizes = self.warehouse.pull_request_sizes()
+        self.assertEqual(sizes["osbuild"], {"count": 2, "min": 2, "median": 15, "p90": 15, "max": 15})
+        self.assertEqual(sizes["images"]["count"], 1)
+
+    def test_issues(self):
+        sprint = Sprint(id="100", name="Sprint 100", state="ACTIVE")
+        self.warehouse.add_issues([
+            Issue(key="HMS-1", summary="One", status="To Do", epic="HMS-10", sprint=[sprint],
+                  sprint_column={"name": "To Do", "sort_id": 1}),
+            Issue(key="HMS-2", summary="Two", status="Done", sprint=[]),
+        ])
+        db = self.warehouse.db
+        self.assertEqual(db.execute("select key from issues where epic = 'HMS-10'").fetchall()[0]["key"], "HMS-1")
+        self.assertEqual(tuple(db.execute("select key, sprint_id from issue_sprints").fetchone()), ("HMS-1", "100"))
+        self.assertEqual(db.execute("select name from sprints").fetchall()[0]["name"], "Sprint 100")
+
+
+class TestWarehouseSearch(unittest.TestCase):
+
+    def test_failed_search_raises(self):
+        # a swallowed error would look like an organisation without open pull requests
+        self.addCleanup(circuit_breaker.reset)
+        with FakeServer(FakeData(10), rate_limit_every=1) as server, \
+                patch.object(get_pull_requests, "GITHUB_API_URL", server.url):
+            data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", fields="minimal")
+            data_processor.process()
+            self.assertEqual(data_processor.with_jira + data_processor.without_jira, [])
+
+            data_processor = get_pull_requests.DataProcessor(FAKE_ORG, None, None, "token", fields="minimal",
+                                                             raise_errors=True)
+            with self.assertRaises(Exception):
+                data_processor.process()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import argparse
-import requests
 import sys
+import http_transport
+from metrics import metrics
 from utils import format_help_as_md
 
 def process_github_event(comment_url, issue_url, github_token, pr_title, pr_body, jira_key):
@@ -17,11 +18,14 @@ def process_github_event(comment_url, issue_url, github_token, pr_title, pr_body
         # Add a rocket reaction to the comment
         reaction_url = f"{comment_url}/reactions"
         reaction_payload = {"content": "rocket"}
-        reaction_response = requests.post(
-            reaction_url,
-            headers=headers,
-            json=reaction_payload
-        )
+        with metrics.stage("reaction"):
+            reaction_response = http_transport.request(
+                "POST",
+                reaction_url,
+                headers=headers,
+                json=reaction_payload
+            )
+        metrics.record_response(reaction_response)
 
         if reaction_response.status_code >= 200 and reaction_response.status_code < 300:
             print("🟢 Rocket reaction added to the comment.")
@@ -32,11 +36,14 @@ def process_github_event(comment_url, issue_url, github_token, pr_title, pr_body
     new_title = f"{pr_title} ({jira_key})"
     new_body = f"{pr_body}\n\nJIRA: [{jira_key}](https://issues.redhat.com/browse/{jira_key})"
     issue_payload = {"title": new_title, "body": new_body}
-    issue_response = requests.patch(
-        issue_url,
-        headers=headers,
-        json=issue_payload
-    )
+    with metrics.stage("update"):
+        issue_response = http_transport.request(
+            "PATCH",
+            issue_url,
+            headers=headers,
+            json=issue_payload
+        )
+    metrics.record_response(issue_response)
 
     if issue_response.status_code == 200:
         print("🟢 Pull request title and body updated.")
@@ -52,6 +59,8 @@ def main():
     parser.add_argument("--pr-title", required=True, help="Current title of the pull request.")
     parser.add_argument("--pr-body", required=True, help="Current body of the pull request.")
     parser.add_argument("--jira-key", required=True, help="JIRA key to append to the pull request.")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Print request counts and stage timings as JSON to stderr at the end.")
     parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
 
     # workaround that required attribute are not given for --help-md
@@ -70,6 +79,9 @@ def main():
         jira_key=args.jira_key
     )
 
+    if args.metrics:
+        metrics.write_summary()
+
 
 if __name__ == "__main__":
     main()
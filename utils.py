@@ -1,17 +1,31 @@
+import atexit
+import cProfile
+import functools
+import io
+import json
 import logging
+import math
 import pickle
 import os
 import re
 import sys
 import threading
+import time
+import tracemalloc
 
+from contextlib import contextmanager, nullcontext
 from typing import Any
 from collections.abc import Mapping, Callable
 
 import yaml
 
+from metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# set in AWS Lambda to profile every invocation, `1` or the path of the stats file
+PROFILE_ENV = "PR_BEST_PRACTICES_PROFILE"
+
 def format_help_as_md(parser):
     help_text = parser.format_help()
     section = re.compile(r"^([\w ]+):$")
@@ -36,6 +50,87 @@ def format_help_as_md(parser):
                "and running `make docs`")
     return "\n".join(ret)
 
+def add_profile_argument(parser):
+    """
+    Add the `--profile` option, see `Profiler`.
+    """
+    parser.add_argument("--profile", metavar="FILE", nargs="?", const="profile.pstats",
+                        help="Write cProfile stats to FILE (default: profile.pstats) and print "
+                        "the slowest functions, the peak memory and the time per stage to stderr")
+
+class Profiler:
+    """
+    Profile a run with cProfile and tracemalloc. When stopped, the stats are
+    written to `stats_file` (for `python -m pstats` or snakeviz) and a report of
+    the slowest functions, the peak memory and the stages of `metrics`
+    is printed.
+    """
+
+    def __init__(self, stats_file: str, file=None, top: int = 15):
+        self.stats_file = stats_file
+        self.file = file
+        self.top = top
+        self._profile = cProfile.Profile()
+        self._started = False
+
+    def start(self) -> "Profiler":
+        tracemalloc.start()
+        self._profile.enable()
+        self._started = True
+        return self
+
+    def stop(self) -> None:
+        if not self._started:
+            return
+        self._started = False
+        self._profile.disable()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self._profile.dump_stats(self.stats_file)
+        print(self.report(peak_memory), file=self.file or sys.stderr, flush=True)
+
+    def report(self, peak_memory: int) -> str:
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+
+        lines = [f"Profile written to {self.stats_file}",
+                 f"Peak memory: {peak_memory / 2**20:.1f} MiB",
+                 "",
+                 f"{'stage':20} {'wall [s]':>9} {'network [s]':>12} {'backoff [s]':>12} {'cpu [s]':>8}"]
+        for name, times in metrics.stage_breakdown().items():
+            lines.append(f"{name:20} {times['wall']:9.3f} {times['network']:12.3f} "
+                         f"{times['backoff']:12.3f} {times['cpu']:8.3f}")
+        return "\n".join(lines) + "\n\n" + out.getvalue()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def start_profiling(stats_file: str|None) -> Profiler|None:
+    """
+    Profile the rest of the process if `stats_file` is given (e.g. by `--profile`),
+    the report is printed at exit.
+    """
+    if not stats_file:
+        return None
+    profiler = Profiler(stats_file).start()
+    atexit.register(profiler.stop)
+    return profiler
+
+def profile_from_env(default_stats_file: str):
+    """
+    Return a `Profiler` if `PR_BEST_PRACTICES_PROFILE` is set (e.g. to profile
+    every invocation of an AWS Lambda), otherwise a context manager doing nothing.
+    """
+    value = os.getenv(PROFILE_ENV, "")
+    if value.lower() in ("", "0", "false", "no"):
+        return nullcontext()
+    stats_file = default_stats_file if value.lower() in ("1", "true", "yes") else value
+    return Profiler(stats_file)
+
 class Cache:
     def __init__(self, cache_file: str|None = None):
         self.cache_file = cache_file
@@ -104,6 +199,237 @@ class Cache:
 
         return result
 
+def split_list(value: str|None) -> list[str]:
+    """
+    Return the items of a comma separated list, e.g. of an environment variable.
+    """
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+def json_default(o: Any) -> Any:
+    """
+    Serialize objects `json` doesn't know, like the records of `records.py`.
+    """
+    if hasattr(o, "to_dict"):
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def write_json(file_name: str, data: Any, **kwargs) -> None:
+    """
+    Write `data` as JSON to `file_name`.
+    `json.dump()` writes chunk by chunk so the serialized text is never
+    held in memory as a whole.
+    """
+    kwargs.setdefault("default", json_default)
+    with open(file_name, "w") as f:
+        json.dump(data, f, **kwargs)
+
+class JsonLinesWriter:
+    """
+    Write records one by one as JSON Lines (one JSON object per line).
+
+    Every record is flushed right away, so consumers can start reading
+    while the data is still being collected.
+    """
+
+    def __init__(self, file_name: str, **kwargs):
+        self.file_name = file_name
+        kwargs.setdefault("default", json_default)
+        self.json_kwargs = kwargs
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.file_name, "w")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+        self._file = None
+
+    def write(self, record: Any) -> None:
+        self._file.write(json.dumps(record, **self.json_kwargs))
+        self._file.write("\n")
+        self._file.flush()
+        self.count += 1
+
+class TTLCache:
+    """
+    A thread safe key/value cache where entries expire after `ttl` seconds.
+
+    When `cache_file` is given, the entries are persisted with pickle,
+    so they survive between runs. Otherwise the cache lives as long as the
+    process (e.g. a warm AWS Lambda container).
+    """
+
+    def __init__(self, ttl: float, cache_file: str|None = None):
+        self.ttl = ttl
+        self.cache_file = cache_file
+        # key -> (expiry timestamp, value)
+        self.cache = {}
+        self._lock = threading.Lock()
+
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, "rb") as f:
+                    self.cache = pickle.load(f)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.warning(f"Ignoring unreadable cache file '{self.cache_file}': {e}")
+
+    def _save(self) -> None:
+        if self.cache_file:
+            with open(self.cache_file, "wb") as f:
+                pickle.dump(self.cache, f)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Return the cached value or `default` if missing or expired.
+        """
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.time():
+                del self.cache[key]
+                return default
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: Mapping[str, Any]) -> None:
+        """
+        Store several values at once, persisting the cache only once.
+        """
+        if not values:
+            return
+        expires = time.time() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self.cache[key] = (expires, value)
+            self._save()
+
+class RateBudget:
+    """
+    A budget of requests shared by concurrent fetchers of the same API,
+    e.g. for several GitHub organisations or Jira boards at once.
+
+    At most `max_concurrent` requests run at the same time and, with
+    `per_second`, they are started at most that many per second.
+    """
+
+    def __init__(self, max_concurrent: int = 8, per_second: float|None = None):
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._interval = 1 / per_second if per_second else 0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def request(self):
+        """
+        Wait for the budget to allow a request and run it within the `with` block.
+        """
+        with self._semaphore:
+            if self._interval:
+                with self._lock:
+                    now = time.monotonic()
+                    wait = self._next_start - now
+                    self._next_start = max(now, self._next_start) + self._interval
+                if wait > 0:
+                    time.sleep(wait)
+            yield
+
+    def wrap(self, function: Callable) -> Callable:
+        """
+        Return `function` running within the budget, e.g. `session.request`.
+        """
+        @functools.wraps(function)
+        def wrapped(*args, **kwargs):
+            with self.request():
+                return function(*args, **kwargs)
+        return wrapped
+
+
+# seconds kept back from the time of an AWS Lambda invocation to render and send what was fetched
+DEADLINE_RESERVE = float(os.getenv("DEADLINE_RESERVE_SECONDS", "10"))
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of starting a request or backoff which would outlast the `Deadline`
+    """
+
+
+class Deadline:
+    """
+    The time left for a piece of work, e.g. an invocation of an AWS Lambda.
+
+    Requests and backoffs check it, so the work stops early enough to
+    report what it got instead of being killed. Without `seconds` there
+    is no deadline.
+    """
+
+    def __init__(self, seconds: float|None = None):
+        self.expires = time.monotonic() + seconds if seconds is not None else None
+
+    @classmethod
+    def from_lambda_context(cls, context: Any, reserve: float = DEADLINE_RESERVE) -> "Deadline":
+        """
+        Return the deadline `reserve` seconds before the invocation of `context` is killed
+        """
+        get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+        if get_remaining_time is None:
+            return cls()
+        return cls(get_remaining_time() / 1000 - reserve)
+
+    def remaining(self) -> float:
+        if self.expires is None:
+            return math.inf
+        return max(0.0, self.expires - time.monotonic())
+
+    def check(self, what: str) -> None:
+        """
+        Raise `DeadlineExceeded` if there is no time left for `what`
+        """
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"No time left for {what}")
+
+    def timeout(self, timeout: float, what: str) -> float:
+        """
+        Return the timeout of a request for `what`, at most the remaining time
+        """
+        self.check(what)
+        return min(timeout, self.remaining())
+
+    def sleep(self, seconds: float, what: str) -> None:
+        """
+        Sleep `seconds` before retrying `what`, or raise `DeadlineExceeded`
+        right away if the deadline would pass meanwhile.
+        """
+        if seconds >= self.remaining():
+            raise DeadlineExceeded(f"Not waiting {seconds:g}s to retry {what}, {self.remaining():.0f}s left")
+        time.sleep(seconds)
+
+    def wrap(self, function: Callable, timeout: float|None = None) -> Callable:
+        """
+        Return `function` failing fast once the deadline is reached, e.g. `session.request`.
+        With `timeout` (the default of the call) the `timeout` argument is limited to the
+        remaining time as well, e.g. for `session.send`.
+        """
+        @functools.wraps(function)
+        def wrapped(*args, **kwargs):
+            if args and hasattr(args[0], "method"):
+                what = f"{args[0].method} {args[0].url}"
+            else:
+                what = f"{args[0]} {args[1]}" if len(args) >= 2 else "request"
+            if timeout is None:
+                self.check(what)
+            else:
+                kwargs["timeout"] = self.timeout(kwargs.get("timeout") or timeout, what)
+            return function(*args, **kwargs)
+        return wrapped
+
+
 class UserMap:
     """
     A class to map user IDs between tools.
@@ -145,6 +471,13 @@ class UserMap:
                 return ret
         return None
 
+    def users(self) -> list[dict]:
+        """
+        Return all users with their names in all tools.
+        """
+        return [{tool: self._get_value(entry, tool) for tool in ('github', 'jira', 'slack')}
+                for entry in self.user_map]
+
     def jira2github(self, user_name: str) -> str:
         return self._get_user(user_name, 'jira', 'github')
     def jira2slack(self, user_name: str) -> str:
@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+
+"""
+Local SQLite warehouse of the pull requests and Jira issues of every run.
+
+`get_pull_requests.py --warehouse FILE` and `get_jira_sprint.py --warehouse FILE`
+add what they fetched to the database in `FILE`: pull requests, their commit
+messages, the links between pull requests and Jira issues, issues and
+sprints. Nothing is deleted, so the history of the runs can be queried
+locally with indexed queries instead of scanning the whole organisation again.
+
+A pull request is considered closed once a complete run of its organisation
+(without `--repo` and `--author`) doesn't return it anymore.
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+
+from datetime import datetime, timedelta, timezone
+
+from utils import format_help_as_md
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+create table if not exists runs (
+    id integer primary key,
+    kind text not null,
+    scope text,
+    started_at text not null
+);
+create table if not exists pull_requests (
+    html_url text primary key,
+    org text,
+    repo text,
+    number integer,
+    title text,
+    author text,
+    created_at text,
+    updated_at text,
+    additions integer,
+    deletions integer,
+    draft integer,
+    mergeable_state text,
+    jira_key text,
+    first_seen text not null,
+    last_seen text not null,
+    closed_at text
+);
+create index if not exists pull_requests_open on pull_requests (closed_at, jira_key, created_at);
+create index if not exists pull_requests_repo on pull_requests (repo);
+create index if not exists pull_requests_org on pull_requests (org, closed_at);
+create table if not exists commits (
+    html_url text not null,
+    position integer not null,
+    message text,
+    primary key (html_url, position)
+);
+create table if not exists pull_request_issues (
+    html_url text not null,
+    jira_key text not null,
+    first_seen text not null,
+    primary key (html_url, jira_key)
+);
+create index if not exists pull_request_issues_key on pull_request_issues (jira_key);
+create table if not exists issues (
+    key text primary key,
+    summary text,
+    assignee text,
+    assignee_id text,
+    status text,
+    resolution text,
+    issue_type text,
+    epic text,
+    sprint_column text,
+    first_seen text not null,
+    last_seen text not null
+);
+create index if not exists issues_status on issues (status);
+create index if not exists issues_epic on issues (epic);
+create table if not exists sprints (
+    id text primary key,
+    name text,
+    state text,
+    start_date text,
+    end_date text
+);
+create table if not exists issue_sprints (
+    key text not null,
+    sprint_id text not null,
+    primary key (key, sprint_id)
+);
+create index if not exists issue_sprints_sprint on issue_sprints (sprint_id);
+"""
+
+
+def _timestamp(when=None):
+    """
+    Return `when` (default: now) in the format of GitHub's timestamps, which sorts and compares as text
+    """
+    return (when or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Warehouse:
+    def __init__(self, path):
+        """
+        Open (or create) the database in `path`, `:memory:` e.g. for tests
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_run(self, kind, scope, now):
+        return self.db.execute("insert into runs (kind, scope, started_at) values (?, ?, ?)",
+                               (kind, scope, now)).lastrowid
+
+    def add_pull_requests(self, pull_requests, orgs=(), complete=False, now=None):
+        """
+        Add the pull requests (records or dictionaries) of one run of `DataProcessor`.
+        With `complete` the run returned all open pull requests of `orgs`,
+        the ones it didn't return are marked as closed.
+        Fields which weren't fetched (see `--fields`) don't overwrite known values.
+        """
+        now = now or _timestamp()
+        pull_requests = list(pull_requests)
+        with self.db:
+            self._start_run("pull_requests", ",".join(orgs), now)
+            self.db.executemany("""
+                insert into pull_requests (html_url, org, repo, number, title, author, created_at, updated_at,
+                                           additions, deletions, draft, mergeable_state, jira_key,
+                                           first_seen, last_seen)
+                values (:html_url, :org, :repo, :number, :title, :author, :created_at, :updated_at,
+                        :additions, :deletions, :draft, :mergeable_state, :jira_key, :now, :now)
+                on conflict (html_url) do update set
+                    title = excluded.title,
+                    updated_at = excluded.updated_at,
+                    additions = coalesce(excluded.additions, additions),
+                    deletions = coalesce(excluded.deletions, deletions),
+                    draft = coalesce(excluded.draft, draft),
+                    mergeable_state = coalesce(excluded.mergeable_state, mergeable_state),
+                    jira_key = excluded.jira_key,
+                    last_seen = excluded.last_seen,
+                    closed_at = null
+            """, [self._pull_request_row(pr, now) for pr in pull_requests])
+
+            self.db.executemany("""
+                insert or ignore into pull_request_issues (html_url, jira_key, first_seen) values (?, ?, ?)
+            """, [(pr["html_url"], key, now) for pr in pull_requests for key in pr.get("jira_keys") or []])
+
+            commits = [(pr["html_url"], position, message)
+                       for pr in pull_requests if _is_loaded(pr, "commit_messages")
+                       for position, message in enumerate(pr["commit_messages"] or [])]
+            self.db.executemany("insert or replace into commits (html_url, position, message) values (?, ?, ?)",
+                                commits)
+
+            if complete:
+                for org in orgs:
+                    self.db.execute("""
+                        update pull_requests set closed_at = ?
+                        where org = ? and closed_at is null and last_seen < ?
+                    """, (now, org, now))
+        logger.debug(f"Added {len(pull_requests)} pull requests to {self.path}")
+
+    @staticmethod
+    def _pull_request_row(pr, now):
+        row = {name: pr.get(name) if _is_loaded(pr, name) else None
+               for name in ("html_url", "org", "repo", "number", "title", "author", "created_at", "updated_at",
+                            "additions", "deletions", "draft", "mergeable_state", "jira_key")}
+        row["now"] = now
+        return row
+
+    def add_issues(self, issues, now=None):
+        """
+        Add the issues (records or dictionaries) of one run of `JiraDataProcessor`,
+        e.g. both sections of `get_issue_overview()`.
+        """
+        now = now or _timestamp()
+        issues = list(issues)
+        with self.db:
+            self._start_run("issues", None, now)
+            self.db.executemany("""
+                insert into issues (key, summary, assignee, assignee_id, status, resolution, issue_type, epic,
+                                    sprint_column, first_seen, last_seen)
+                values (:key, :summary, :assignee, :assignee_id, :status, :resolution, :issue_type, :epic,
+                        :sprint_column, :now, :now)
+                on conflict (key) do update set
+                    summary = excluded.summary,
+                    assignee = excluded.assignee,
+                    assignee_id = excluded.assignee_id,
+                    status = excluded.status,
+                    resolution = excluded.resolution,
+                    issue_type = coalesce(excluded.issue_type, issue_type),
+                    epic = coalesce(excluded.epic, epic),
+                    sprint_column = excluded.sprint_column,
+                    last_seen = excluded.last_seen
+            """, [{"key": issue["key"], "summary": issue.get("summary"), "assignee": issue.get("assignee"),
+                   "assignee_id": issue.get("assignee_id"), "status": issue.get("status"),
+                   "resolution": issue.get("resolution"), "issue_type": issue.get("issue_type"),
+                   "epic": issue.get("epic"),
+                   "sprint_column": (issue.get("sprint_column") or {}).get("name"), "now": now}
+                  for issue in issues])
+
+            sprints = {sprint["id"]: sprint for issue in issues for sprint in issue.get("sprint") or []
+                       if sprint.get("id")}
+            self.db.executemany("""
+                insert or replace into sprints (id, name, state, start_date, end_date) values (?, ?, ?, ?, ?)
+            """, [(id, sprint.get("name"), sprint.get("state"), sprint.get("startDate"), sprint.get("endDate"))
+                  for id, sprint in sprints.items()])
+            self.db.executemany("insert or ignore into issue_sprints (key, sprint_id) values (?, ?)",
+                                [(issue["key"], sprint["id"]) for issue in issues
+                                 for sprint in issue.get("sprint") or [] if sprint.get("id")])
+        logger.debug(f"Added {len(issues)} issues to {self.path}")
+
+    def open_pull_requests_without_jira(self, older_than_days=0, now=None):
+        """
+        Return the open pull requests without Jira key created more than `older_than_days` days ago
+        """
+        before = _timestamp((now or datetime.now(timezone.utc)) - timedelta(days=older_than_days))
+        rows = self.db.execute("""
+            select html_url, repo, number, title, author, created_at from pull_requests
+            where closed_at is null and jira_key is null and created_at < ?
+            order by created_at
+        """, (before,))
+        return [dict(row) for row in rows]
+
+    def time_to_jira_link(self):
+        """
+        Return the seconds from opening a pull request to the first Jira key in its
+        title, per pull request. A key the pull request already had when it was seen
+        first counts as linked right away (0 seconds), e.g. when it was opened with it.
+        """
+        rows = self.db.execute("""
+            select pr.html_url, pr.repo, pr.jira_key,
+                   case when link.first_seen = pr.first_seen then 0
+                        else (julianday(link.first_seen) - julianday(pr.created_at)) * 86400 end as seconds
+            from pull_requests pr
+            join (select html_url, min(first_seen) as first_seen
+                  from pull_request_issues group by html_url) link on link.html_url = pr.html_url
+            order by seconds desc
+        """)
+        return [dict(row) for row in rows]
+
+    def pull_request_sizes(self):
+        """
+        Return the distribution of the size (additions + deletions) of the pull requests per repository
+        """
+        rows = self.db.execute("""
+            select repo, additions + deletions as size from pull_requests
+            where additions is not null and deletions is not null
+            order by repo, size
+        """)
+        sizes = {}
+        for row in rows:
+            sizes.setdefault(row["repo"], []).append(row["size"])
+        return {repo: {"count": len(values), "min": values[0], "median": _percentile(values, 0.5),
+                       "p90": _percentile(values, 0.9), "max": values[-1]}
+                for repo, values in sizes.items()}
+
+
+def _is_loaded(record, name):
+    # records of `records.py` load lazy fields on access, which would mean requests
+    if hasattr(record, "is_loaded"):
+        return record.is_loaded(name)
+    return name in record
+
+
+def main():
+    """Query the warehouse written with `--warehouse`"""
+    parser = argparse.ArgumentParser(allow_abbrev=False, description=__doc__)
+    parser.add_argument("warehouse", help="SQLite database written by `--warehouse`")
+    parser.add_argument("--stale-days", type=int, metavar="DAYS",
+                        help="List the open pull requests without Jira key older than DAYS days")
+    parser.add_argument("--link-times", action="store_true",
+                        help="List the time from opening a pull request to linking it to Jira")
+    parser.add_argument("--sizes", action="store_true", help="Show the pull request sizes per repository")
+    parser.add_argument("--help-md", help="Show help as Markdown", action="store_true")
+
+    if "--help-md" in sys.argv:
+        print(format_help_as_md(parser))
+        sys.exit(0)
+
+    args = parser.parse_args()
+    with Warehouse(args.warehouse) as warehouse:
+        if args.stale_days is not None:
+            print(json.dumps(warehouse.open_pull_requests_without_jira(args.stale_days), indent=2))
+        if args.link_times:
+            print(json.dumps(warehouse.time_to_jira_link(), indent=2))
+        if args.sizes:
+            print(json.dumps(warehouse.pull_request_sizes(), indent=2))
+
+
+if __name__ == "__main__":
+    main()